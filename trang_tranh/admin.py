@@ -1,5 +1,21 @@
 from django.contrib import admin
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import Count, Min
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _
+from django.utils.translation import ngettext
+
+from .coverage import translation_coverage
+from .cursors import CursorPaginator
+from .forms import ChapterPagesForm, ChapterPageUploadForm
 
 from .models import (
     ChapterPage,
@@ -12,6 +28,9 @@ from .models import (
     User,
     UserProfile,
 )
+from .pages import chapter_pages, delete_pages, insert_pages, reorder_pages
+from .removal import removal_progress, start_removal
+from .search import search, search_available
 
 # Register your models here.
 
@@ -26,6 +45,124 @@ admin.site.register(User, UserAdmin)
 # admin.site.register(UserProfile)
 
 
+class FullTextSearchAdminMixin:
+    """
+    Answer the changelist search box from the full-text search index instead
+    of ``icontains`` lookups on ``search_fields``.
+
+    ``search_models`` are the indexed models searched, and results are
+    matched on their ``search_result_attribute`` (``"object_id"`` for the
+    admin's own model, ``"comic_id"`` to find comics through their
+    translations).
+    """
+
+    search_models = None
+    search_result_attribute = "object_id"
+    search_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not search_available():
+            return super().get_search_results(request, queryset, search_term)
+        results = search(
+            search_term, models=self.search_models, limit=self.search_limit
+        )
+        ids = {getattr(result, self.search_result_attribute) for result in results}
+        return queryset.filter(pk__in=ids), False
+
+
+class CursorChangeList(ChangeList):
+    """
+    Changelist paginated with a ``CursorPaginator`` in the admin's
+    ``cursor_ordering``. The page parameter holds the cursor, and nothing is
+    counted: the result count is the number of rows on the page.
+    """
+
+    def get_results(self, request):
+        paginator = CursorPaginator(
+            self.queryset, self.model_admin.cursor_ordering, self.list_per_page
+        )
+        page = paginator.get_page(request.GET.get(PAGE_VAR))
+        self.paginator = paginator
+        self.result_list = page.object_list
+        self.result_count = len(page)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.previous_page_query = page.has_previous() and self.get_query_string(
+            {PAGE_VAR: page.previous_cursor}
+        )
+        self.next_page_query = page.has_next() and self.get_query_string(
+            {PAGE_VAR: page.next_cursor}
+        )
+
+
+class CursorPaginationAdminMixin:
+    """
+    Paginate the changelist with cursors over ``cursor_ordering``, which
+    must be unique and indexed, instead of OFFSET and a full COUNT(*).
+    Columns can not be sorted, the order is always ``cursor_ordering``.
+    """
+
+    cursor_ordering = ("-pk",)
+    change_list_template = "admin/trang_tranh/cursor_change_list.html"
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_ordering(self, request):
+        return self.cursor_ordering
+
+
+class RemovalAdminMixin:
+    """
+    Add a "Remove with everything under it" action that removes the selected
+    objects, their translations, chapters and pages in the background (see
+    ``removal.py``), and a view reporting the progress of a removal.
+    """
+
+    actions = ["remove_with_contents"]
+
+    def get_urls(self):
+        return [
+            path(
+                "removals/<str:job_id>/",
+                self.admin_site.admin_view(self.removal_progress_view),
+                name="%s_%s_removal" % (self.opts.app_label, self.opts.model_name),
+            ),
+        ] + super().get_urls()
+
+    @admin.action(
+        permissions=["delete"], description=_("Remove with everything under it")
+    )
+    def remove_with_contents(self, request, queryset):
+        job_id = start_removal(queryset)
+        url = reverse(
+            "admin:%s_%s_removal" % (self.opts.app_label, self.opts.model_name),
+            args=[job_id],
+            current_app=self.admin_site.name,
+        )
+        self.message_user(
+            request,
+            format_html(
+                '{} <a href="{}">{}</a>',
+                _("The removal was started in the background."),
+                url,
+                _("Progress"),
+            ),
+        )
+
+    def removal_progress_view(self, request, job_id):
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        progress = removal_progress(job_id)
+        if progress is None:
+            raise Http404
+        return JsonResponse(progress)
+
+
 class ComicTranslationInline(admin.TabularInline):
     model = ComicTranslation
     extra = 0
@@ -39,12 +176,26 @@ class ComicChapterInline(admin.TabularInline):
 
 
 @admin.register(Comic)
-class ComicAdmin(admin.ModelAdmin):
+class ComicAdmin(FullTextSearchAdminMixin, RemovalAdminMixin, admin.ModelAdmin):
     list_display = ("title", "display_author", "publisher", "display_total_chapter")
     list_filter = ("status", "schedule")
     search_fields = ["title"]
+    search_models = (Comic, ComicTranslation)
+    search_result_attribute = "comic_id"
     inlines = [ComicTranslationInline, ComicChapterInline]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("publisher")
+            .prefetch_related("author")
+            .annotate(
+                chapter_total=Count("comicchapter", distinct=True),
+                first_author=Min("author__pen_name"),
+            )
+        )
+
 
 class ComicChapterTranslationInline(admin.TabularInline):
     model = ComicChapterTranslation
@@ -53,14 +204,150 @@ class ComicChapterTranslationInline(admin.TabularInline):
 
 
 @admin.register(ComicTranslation)
-class ComicTranslationAdmin(admin.ModelAdmin):
+class ComicTranslationAdmin(RemovalAdminMixin, admin.ModelAdmin):
     list_display = ("comic", "language")
+    list_select_related = ("comic__publisher",)
     inlines = [ComicChapterTranslationInline]
+    change_list_template = "admin/trang_tranh/comictranslation_change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "coverage/",
+                self.admin_site.admin_view(self.coverage_view),
+                name="%s_%s_coverage" % (self.opts.app_label, self.opts.model_name),
+            ),
+        ] + super().get_urls()
+
+    def coverage_view(self, request):
+        """Missing chapters and page count mismatches of every translation."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        reports = translation_coverage()
+        comics = Comic.objects.in_bulk({report["comic"] for report in reports})
+        for report in reports:
+            report["comic_title"] = comics[report["comic"]].title
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Translation coverage"),
+            "opts": self.opts,
+            "reports": sorted(reports, key=lambda report: report["completeness"]),
+        }
+        return TemplateResponse(
+            request, "admin/trang_tranh/translation_coverage.html", context
+        )
 
 
 @admin.register(ComicAuthor)
-class ComicAuthorAdmin(admin.ModelAdmin):
+class ComicAuthorAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     search_fields = ["pen_name"]
+    search_models = (ComicAuthor,)
+
+
+class PageUploadAdminMixin:
+    """
+    Add to a chapter admin an "Upload pages" view that inserts many page
+    images at once, and a "Reorder pages" view that moves and deletes pages.
+    """
+
+    change_form_template = "admin/trang_tranh/chapter_change_form.html"
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                "<path:object_id>/upload-pages/",
+                self.admin_site.admin_view(self.upload_pages_view),
+                name="%s_%s_upload_pages" % info,
+            ),
+            path(
+                "<path:object_id>/pages/",
+                self.admin_site.admin_view(self.reorder_pages_view),
+                name="%s_%s_reorder_pages" % info,
+            ),
+        ] + super().get_urls()
+
+    def get_chapter_or_deny(self, request, object_id):
+        chapter = self.get_object(request, unquote(object_id))
+        if chapter is not None and not self.has_change_permission(request, chapter):
+            raise PermissionDenied
+        return chapter
+
+    def chapter_change_url(self, chapter):
+        return reverse(
+            "admin:%s_%s_change" % (self.opts.app_label, self.opts.model_name),
+            args=[chapter.pk],
+            current_app=self.admin_site.name,
+        )
+
+    def upload_pages_view(self, request, object_id):
+        chapter = self.get_chapter_or_deny(request, object_id)
+        if chapter is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+
+        form = ChapterPageUploadForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            try:
+                pages = insert_pages(
+                    chapter, form.cleaned_data["images"], form.cleaned_data["position"]
+                )
+            except ValidationError as e:
+                form.add_error(None, e.messages)
+            else:
+                self.message_user(
+                    request,
+                    ngettext(
+                        "%(count)d page was uploaded.",
+                        "%(count)d pages were uploaded.",
+                        len(pages),
+                    )
+                    % {"count": len(pages)},
+                )
+                return redirect(self.chapter_change_url(chapter))
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Upload pages"),
+            "opts": self.opts,
+            "original": chapter,
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/trang_tranh/upload_pages.html", context)
+
+    def reorder_pages_view(self, request, object_id):
+        chapter = self.get_chapter_or_deny(request, object_id)
+        if chapter is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+
+        form = ChapterPagesForm(request.POST or None, pages=chapter_pages(chapter))
+        if request.method == "POST" and form.is_valid():
+            try:
+                with transaction.atomic():
+                    deleted = delete_pages(chapter, form.deleted_page_numbers())
+                    reorder_pages(chapter, form.ordered_page_pks())
+            except ValidationError as e:
+                form.add_error(None, e.messages)
+            else:
+                message = _("The pages were reordered.")
+                if deleted:
+                    message = ngettext(
+                        "The pages were reordered and %(count)d page was deleted.",
+                        "The pages were reordered and %(count)d pages were deleted.",
+                        deleted,
+                    ) % {"count": deleted}
+                self.message_user(request, message)
+                return redirect(self.chapter_change_url(chapter))
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Reorder pages"),
+            "opts": self.opts,
+            "original": chapter,
+            "form": form,
+        }
+        return TemplateResponse(
+            request, "admin/trang_tranh/reorder_pages.html", context
+        )
 
 
 class ChapterPageInline(admin.TabularInline):
@@ -70,7 +357,9 @@ class ChapterPageInline(admin.TabularInline):
 
 
 @admin.register(ComicChapter)
-class ComicChapterAdmin(admin.ModelAdmin):
+class ComicChapterAdmin(
+    FullTextSearchAdminMixin, PageUploadAdminMixin, RemovalAdminMixin, admin.ModelAdmin
+):
     list_display = (
         "comic",
         "chapter_number",
@@ -79,13 +368,18 @@ class ComicChapterAdmin(admin.ModelAdmin):
         "extra_chapter",
     )
     list_filter = ("published_date",)
+    list_select_related = ("comic__publisher",)
     search_fields = ["title"]
+    search_models = (ComicChapter,)
     inlines = [ChapterPageInline]
 
 
 @admin.register(ChapterPage)
-class ChapterPageAdmin(admin.ModelAdmin):
+class ChapterPageAdmin(CursorPaginationAdminMixin, admin.ModelAdmin):
     list_display = ("chapter", "display_chapter_counter", "page_number")
+    # Served by the unique_chapter_page_number index.
+    cursor_ordering = ("chapter", "page_number")
+    list_select_related = ("chapter__comic__publisher",)
     search_fields = [
         "chapter__comic__title",
         "page_number",
@@ -101,7 +395,9 @@ class ChapterPageTranslationInline(admin.TabularInline):
 
 
 @admin.register(ComicChapterTranslation)
-class ComicChapterTranslationAdmin(admin.ModelAdmin):
+class ComicChapterTranslationAdmin(
+    FullTextSearchAdminMixin, PageUploadAdminMixin, RemovalAdminMixin, admin.ModelAdmin
+):
     list_display = (
         "comic_translation",
         "chapter_number",
@@ -110,13 +406,17 @@ class ComicChapterTranslationAdmin(admin.ModelAdmin):
         "extra_chapter",
     )
     search_fields = ["translated_title"]
+    search_models = (ComicChapterTranslation,)
     list_filter = ("published_date",)
+    list_select_related = ("comic_translation__comic__publisher",)
     inlines = [ChapterPageTranslationInline]
 
 
 @admin.register(ChapterPageTranslation)
-class ChapterPageTranslationAdmin(admin.ModelAdmin):
-    pass
+class ChapterPageTranslationAdmin(CursorPaginationAdminMixin, admin.ModelAdmin):
+    # Served by the unique_chapter_translation_page_number index.
+    cursor_ordering = ("chapter_translation", "page_number")
+    list_select_related = ("chapter_translation__comic_translation__comic__publisher",)
 
 
 @admin.register(UserProfile)
@@ -0,0 +1,128 @@
+"""
+Read statistics of publishers.
+
+Summing ``read_count`` over every comic, chapter and translated chapter of a
+publisher scans three tables on each view and only gives all-time totals.
+The flushed read counts (see ``counters.read_counts_flushed``) are therefore
+also added to daily ``PublisherReadBucket`` rows, one per (publisher, day,
+comic, language), with the same upserts as the ranking buckets. The
+dashboard then reads a range of days of a single publisher, which is a range
+scan of the index of the bucket's unique constraint, and never looks at the
+chapter tables.
+
+Reads are credited to the publisher of the comic at the time of the flush.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ComicChapter, ComicChapterTranslation, PublisherReadBucket
+from .rankings import record_reads
+
+
+def flushed_reads(counts):
+    """
+    Return the flushed chapter read ``counts`` (``{model: {pk: n}}``) as a
+    ``Counter`` of ``{(publisher_id, comic_id, language): n}``.
+    """
+    reads = Counter()
+    chapter_counts = counts.get(ComicChapter, {})
+    if chapter_counts:
+        for pk, publisher_id, comic_id, language in ComicChapter.objects.filter(
+            pk__in=chapter_counts
+        ).values_list(
+            "pk", "comic__publisher_id", "comic_id", "comic__default_language"
+        ):
+            reads[publisher_id, comic_id, language] += chapter_counts[pk]
+    translation_counts = counts.get(ComicChapterTranslation, {})
+    if translation_counts:
+        for (
+            pk,
+            publisher_id,
+            comic_id,
+            language,
+        ) in ComicChapterTranslation.objects.filter(
+            pk__in=translation_counts
+        ).values_list(
+            "pk",
+            "comic_translation__comic__publisher_id",
+            "comic_translation__comic_id",
+            "comic_translation__language",
+        ):
+            reads[publisher_id, comic_id, language] += translation_counts[pk]
+    return reads
+
+
+def record_publisher_reads(reads, when=None):
+    """
+    Add ``reads``, a ``{(publisher_id, comic_id, language): count}``
+    mapping, to the buckets of the day of ``when`` (now by default).
+    """
+    rows = [(key, n) for key, n in reads.items() if n > 0]
+    if not rows:
+        return
+    day = connection.ops.adapt_datefield_value(timezone.localdate(when))
+    table = connection.ops.quote_name(PublisherReadBucket._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (publisher_id, day, comic_id, language, reads) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON CONFLICT (publisher_id, day, comic_id, language) "
+            f"DO UPDATE SET reads = {table}.reads + excluded.reads",
+            [
+                (publisher_id, day, comic_id, language, n)
+                for (publisher_id, comic_id, language), n in rows
+            ],
+        )
+
+
+def record_flushed_reads(sender, counts, **kwargs):
+    """
+    ``read_counts_flushed`` receiver turning flushed chapter read counts
+    into ranking and publisher statistics updates.
+    """
+    reads = flushed_reads(counts)
+    by_comic = Counter()
+    for (_publisher_id, comic_id, language), n in reads.items():
+        by_comic[comic_id, language] += n
+    with transaction.atomic():
+        record_reads(by_comic)
+        record_publisher_reads(reads)
+
+
+def publisher_reads(publisher_id, days=30, today=None):
+    """
+    Return the reads of the comics of ``publisher_id`` over the ``days``
+    days up to ``today`` (included), most read first, as a list of
+    ``{"comic", "title", "reads", "languages": {language: reads}}``, and the
+    daily totals as a list of ``(day, reads)`` with every day of the range.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    buckets = PublisherReadBucket.objects.filter(
+        publisher_id=publisher_id, day__range=(start, today)
+    ).order_by()
+
+    comics = {}
+    for comic_id, title, language, reads in buckets.values_list(
+        "comic_id", "comic__title", "language"
+    ).annotate(Sum("reads")):
+        comic = comics.setdefault(
+            comic_id, {"comic": comic_id, "title": title, "reads": 0, "languages": {}}
+        )
+        comic["reads"] += reads
+        comic["languages"][language] = reads
+
+    totals = defaultdict(int, buckets.values_list("day").annotate(Sum("reads")))
+    daily = [
+        (start + timedelta(days=i), totals[start + timedelta(days=i)])
+        for i in range(days)
+    ]
+    ranked = sorted(
+        comics.values(), key=lambda comic: (-comic["reads"], comic["comic"])
+    )
+    return ranked, daily
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TrangTranhConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trang_tranh'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import async_views, urls
+
+# The async views shadow their sync versions under the same URL names, the
+# remaining views are shared with ``urls.py``.
+urlpatterns = [
+    path("", async_views.catalog, name="catalog"),
+    path("comics/<int:pk>/", async_views.comic_detail, name="comic-detail"),
+    path(
+        "comics/<int:pk>/chapters/<int:chapter_counter>/",
+        async_views.chapter_reader,
+        name="chapter-reader",
+    ),
+    path(
+        "translations/<int:pk>/chapters/<int:chapter_counter>/",
+        async_views.chapter_translation_reader,
+        name="chapter-translation-reader",
+    ),
+] + urls.urlpatterns
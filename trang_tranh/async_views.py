@@ -0,0 +1,231 @@
+"""
+Async versions of the catalog, comic and chapter reader views for ASGI.
+
+They are routed by ``async_urls.py``, which ``trangtranhdemo/asgi.py`` uses
+for every ASGI request, under the same URL names as their sync versions in
+``views.py``. Independent queries are awaited together with
+``asyncio.gather()`` and the reader streams its pages straight from
+``aiterator()`` after the page header, so a waiting request holds no thread.
+
+The async ORM of Django 4.2 still runs each query in the single thread that
+owns the database connection, so gathered queries do not overlap on the
+database. What the views save is the thread per request: a worker can keep
+many more readers waiting on the network or on their queries.
+"""
+
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+
+from .conf import get_setting
+from .counters import record_chapter_read, record_chapter_translation_read
+from .db import read_from_replica
+from .localization import current_language, localize_comics
+from .models import Comic, ComicChapter, ComicChapterTranslation
+from .rankings import top_comics
+from .strips import current_strips, reader_strips
+from .views import (
+    catalog_paginator,
+    chapter_etag,
+    chapter_list_paginator,
+    neighbour_urls,
+    preload_links,
+    with_neighbours,
+)
+
+# Placeholder, rendered by the reader template, where the pages are streamed.
+PAGE_STREAM_MARKER = "<!-- trang-tranh:pages -->"
+
+
+def require_safe(view):
+    """``django.views.decorators.http.require_safe`` for async views."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@require_safe
+@read_from_replica
+async def catalog(request):
+    """Newest or most read comics, with localized titles and thumbnail covers."""
+    paginator, sort = catalog_paginator(request)
+    language = current_language()
+    page, trends = await asyncio.gather(
+        paginator.aget_page(request.GET.get("cursor")),
+        sync_to_async(top_comics)("w", language),
+    )
+    comics, trending = await asyncio.gather(
+        sync_to_async(localize_comics)(page.object_list, language),
+        sync_to_async(localize_comics)([trend.comic for trend in trends], language),
+    )
+    return TemplateResponse(
+        request,
+        "trang_tranh/catalog.html",
+        {"page_obj": page, "sort": sort, "comics": comics, "trending": trending},
+    )
+
+
+@require_safe
+@read_from_replica
+async def comic_detail(request, pk):
+    """Comic page with its authors, translations and a page of its chapters."""
+    try:
+        comic = await Comic.objects.select_related("publisher").aget(pk=pk)
+    except Comic.DoesNotExist:
+        raise Http404
+    chapters_page, comic.translations, comic.authors, _ = await asyncio.gather(
+        chapter_list_paginator(comic.comicchapter_set.all()).aget_page(
+            request.GET.get("cursor")
+        ),
+        alist(comic.comictranslation_set.all()),
+        alist(comic.author.all()),
+        sync_to_async(localize_comics)([comic]),
+    )
+    comic.chapters = chapters_page.object_list
+    return TemplateResponse(
+        request,
+        "trang_tranh/comic_detail.html",
+        {"object": comic, "comic": comic, "chapters_page": chapters_page},
+    )
+
+
+async def get_chapter_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+@require_safe
+@read_from_replica
+async def chapter_reader(request, pk, chapter_counter):
+    """Read a chapter of a comic in its default language."""
+    chapter = await get_chapter_or_404(
+        with_neighbours(
+            ComicChapter.objects.select_related("comic__publisher", "chapterstrip"),
+            "comic",
+        ),
+        comic_id=pk,
+        chapter_counter=chapter_counter,
+    )
+    return await _stream_reader(
+        request,
+        chapter,
+        comic=chapter.comic,
+        title=chapter.title,
+        pages=chapter.chapterpage_set,
+        parent_pk=pk,
+        url_name="chapter-reader",
+        record_read=record_chapter_read,
+    )
+
+
+@require_safe
+@read_from_replica
+async def chapter_translation_reader(request, pk, chapter_counter):
+    """Read a chapter of a comic translation."""
+    chapter = await get_chapter_or_404(
+        with_neighbours(
+            ComicChapterTranslation.objects.select_related(
+                "comic_translation__comic__publisher", "chapterstrip"
+            ),
+            "comic_translation",
+        ),
+        comic_translation_id=pk,
+        chapter_counter=chapter_counter,
+    )
+    return await _stream_reader(
+        request,
+        chapter,
+        comic=chapter.comic_translation.comic,
+        title=chapter.translated_title,
+        pages=chapter.chapterpagetranslation_set,
+        parent_pk=pk,
+        url_name="chapter-translation-reader",
+        record_read=record_chapter_translation_read,
+    )
+
+
+async def _stream_reader(
+    request, chapter, comic, title, pages, parent_pk, url_name, record_read
+):
+    strip = current_strips(chapter, comic)
+    etag = chapter_etag(chapter, comic, title, strip)
+    last_modified = int(chapter.modified_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # A revalidation (304) is not a new read.
+        if request.method == "GET":
+            record_read(chapter)
+        # Pin the database now: the pages are read after the view returned.
+        pages = pages.order_by("page_number")
+        pages = pages.using(pages.db)
+        previous_url, next_url = neighbour_urls(chapter, url_name, parent_pk)
+        strips = reader_strips(strip) if strip else []
+        preloaded = pages.none() if strip else pages
+        first_pages, frame = await asyncio.gather(
+            alist(preloaded[: get_setting("READER_PRELOAD_PAGES")]),
+            sync_to_async(render_to_string)(
+                "trang_tranh/chapter_reader.html",
+                {
+                    "comic": comic,
+                    "chapter": chapter,
+                    "title": title,
+                    "pages": [],
+                    "strips": strips,
+                    "previous_url": previous_url,
+                    "next_url": next_url,
+                    "page_stream_marker": mark_safe(PAGE_STREAM_MARKER),
+                },
+                request,
+            ),
+        )
+        head, tail = frame.split(PAGE_STREAM_MARKER)
+        response = StreamingHttpResponse(
+            (
+                _page_stream(head, None if strip else pages, tail)
+                if request.method == "GET"
+                else []
+            ),
+            content_type="text/html; charset=utf-8",
+        )
+        if strip:
+            urls = [segment["url"] for segment in strips]
+        else:
+            urls = [page.page_image.url for page in first_pages]
+        links = preload_links(urls, next_url)
+        if links:
+            response.headers["Link"] = links
+
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    # Let clients keep the page but revalidate it, which is a cheap 304.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def _page_stream(head, pages, tail):
+    yield head
+    if pages is not None:
+        template = get_template("trang_tranh/reader_page.html")
+        first = True
+        async for page in pages.aiterator():
+            yield template.render({"page": page, "first": first})
+            first = False
+    yield tail
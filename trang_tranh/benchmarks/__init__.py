@@ -0,0 +1,11 @@
+"""
+Benchmarks of the comic data model, admin and views.
+
+``dataset.generate()`` fills the database with a deterministic synthetic
+dataset, ``suite.run()`` times the registered benchmarks and counts their
+queries, and ``manage.py benchmark`` runs them on a throwaway database,
+writes the results as JSON and fails on regressions against a stored
+baseline, such as ``baseline.json``, the results on the default dataset.
+Query counts are compared exactly, times only make sense against a baseline
+recorded on the same machine.
+"""
@@ -0,0 +1,187 @@
+"""
+Deterministic synthetic dataset for the benchmarks.
+
+Every row is created with ``bulk_create()``, so no signal handler runs (the
+search index, renditions and chapter sequences are left alone), and every
+image field points at the same tiny placeholder image.
+"""
+
+import io
+import random
+from dataclasses import asdict, dataclass
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from ..models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    Comic,
+    ComicAuthor,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+    User,
+    UserProfile,
+)
+
+PLACEHOLDER_NAME = "benchmark/placeholder.png"
+
+WORDS = (
+    "dragon moon sword river night garden shadow storm blade star academy "
+    "spirit ember frost crown empire hunter song mirror tower"
+).split()
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    comics: int = 50
+    authors: int = 20
+    publishers: int = 5
+    chapters_per_comic: int = 10
+    pages_per_chapter: int = 20
+    # Share of comics that have a translation, with all their chapters and
+    # pages translated.
+    translated_ratio: float = 0.5
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def placeholder_image():
+    """Store the 1x1 placeholder image once and return its name."""
+    if not default_storage.exists(PLACEHOLDER_NAME):
+        buffer = io.BytesIO()
+        Image.new("RGB", (1, 1), "white").save(buffer, "PNG")
+        default_storage.save(PLACEHOLDER_NAME, ContentFile(buffer.getvalue()))
+    return PLACEHOLDER_NAME
+
+
+def _phrase(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate(size=DatasetSize(), seed=0, batch_size=1000):
+    """
+    Fill the database with a dataset of ``size`` and return the number of
+    rows created per model. The same ``size`` and ``seed`` always produce
+    the same rows.
+    """
+    rng = random.Random(seed)
+    image = placeholder_image()
+    created = {}
+
+    def bulk_create(model, objects):
+        objects = model.objects.bulk_create(objects, batch_size=batch_size)
+        created[model._meta.label] = created.get(model._meta.label, 0) + len(objects)
+        return objects
+
+    users = bulk_create(
+        User,
+        [User(username=f"benchmark-{n}") for n in range(size.publishers)],
+    )
+    publishers = bulk_create(
+        UserProfile,
+        [
+            UserProfile(user=user, name=f"Publisher {n}", bio=_phrase(rng, 8))
+            for n, user in enumerate(users)
+        ],
+    )
+    authors = bulk_create(
+        ComicAuthor,
+        [ComicAuthor(pen_name=f"{_phrase(rng, 2)} {n}") for n in range(size.authors)],
+    )
+    comics = bulk_create(
+        Comic,
+        [
+            Comic(
+                title=f"{_phrase(rng, 3)} {n}",
+                summary=_phrase(rng, 30),
+                publisher=publishers[n % len(publishers)],
+                vertical_cover=image,
+                horizontal_cover=image,
+                read_count=rng.randrange(100000),
+                default_language="en",
+            )
+            for n in range(size.comics)
+        ],
+    )
+    through = Comic.author.through
+    bulk_create(
+        through,
+        [
+            through(comic_id=comic.pk, comicauthor_id=author.pk)
+            for comic in comics
+            for author in rng.sample(authors, min(len(authors), rng.randint(1, 3)))
+        ],
+    )
+
+    chapters = bulk_create(
+        ComicChapter,
+        [
+            ComicChapter(
+                comic=comic,
+                title=_phrase(rng, 4),
+                cover=image,
+                chapter_number=counter,
+                chapter_counter=counter,
+                read_count=rng.randrange(10000),
+            )
+            for comic in comics
+            for counter in range(1, size.chapters_per_comic + 1)
+        ],
+    )
+    _create_pages(
+        bulk_create, ChapterPage, "chapter", chapters, size.pages_per_chapter, image
+    )
+
+    translated = comics[: round(len(comics) * size.translated_ratio)]
+    translations = bulk_create(
+        ComicTranslation,
+        [
+            ComicTranslation(
+                comic=comic,
+                language="vi",
+                translated_title=f"{_phrase(rng, 3)} {comic.pk}",
+                translated_summary=_phrase(rng, 30),
+            )
+            for comic in translated
+        ],
+    )
+    chapter_translations = bulk_create(
+        ComicChapterTranslation,
+        [
+            ComicChapterTranslation(
+                comic_translation=translation,
+                translated_title=_phrase(rng, 4),
+                chapter_number=counter,
+                chapter_counter=counter,
+            )
+            for translation in translations
+            for counter in range(1, size.chapters_per_comic + 1)
+        ],
+    )
+    _create_pages(
+        bulk_create,
+        ChapterPageTranslation,
+        "chapter_translation",
+        chapter_translations,
+        size.pages_per_chapter,
+        image,
+    )
+    return created
+
+
+def _create_pages(bulk_create, model, parent_field, chapters, count, image):
+    # Pages are the bulk of the rows, create them one chapter batch at a time.
+    step = max(1, 5000 // max(count, 1))
+    for start in range(0, len(chapters), step):
+        bulk_create(
+            model,
+            [
+                model(**{parent_field: chapter}, page_image=image, page_number=number)
+                for chapter in chapters[start : start + step]
+                for number in range(1, count + 1)
+            ],
+        )
@@ -0,0 +1,185 @@
+"""
+The benchmarks and their runner.
+
+A benchmark is a function registered with ``@benchmark`` that performs one
+iteration against the generated dataset. The runner calls it once while
+counting queries, which also warms caches and templates, then times
+``repeat`` more calls without query capture.
+"""
+
+import platform
+import sqlite3
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from ..models import ChapterPage, Comic, ComicChapter, User
+
+BENCHMARKS = {}
+
+# Results of every benchmark on the default dataset, checked in so that
+# changes can be compared to them with ``manage.py benchmark --baseline``.
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def benchmark(name):
+    """Register the decorated function as benchmark ``name``."""
+
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+@dataclass
+class BenchmarkContext:
+    """Objects of the dataset the benchmarks work on."""
+
+    client: Client
+    comic: Comic
+    chapter: ComicChapter
+
+    @classmethod
+    def create(cls):
+        user = User.objects.create_superuser("benchmark-admin", "", "benchmark")
+        client = Client()
+        client.force_login(user)
+        # A comic in the middle of the catalog and its middle chapter.
+        comics = Comic.objects.order_by("pk")
+        comic = comics[comics.count() // 2]
+        chapters = comic.comicchapter_set.order_by("chapter_counter")
+        return cls(client, comic, chapters[chapters.count() // 2])
+
+    def get(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        if response.status_code >= 400:
+            raise AssertionError(f"GET {url} returned {response.status_code}")
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+
+@benchmark("admin-comic-changelist")
+def admin_comic_changelist(context):
+    context.get(reverse("admin:trang_tranh_comic_changelist"))
+
+
+@benchmark("admin-chapter-changelist")
+def admin_chapter_changelist(context):
+    context.get(reverse("admin:trang_tranh_comicchapter_changelist"))
+
+
+@benchmark("admin-page-changelist")
+def admin_page_changelist(context):
+    context.get(reverse("admin:trang_tranh_chapterpage_changelist"))
+
+
+@benchmark("admin-chapter-change")
+def admin_chapter_change(context):
+    context.get(
+        reverse("admin:trang_tranh_comicchapter_change", args=[context.chapter.pk])
+    )
+
+
+@benchmark("page-validation")
+def page_validation(context):
+    """``full_clean()`` of every page of a chapter, as saving them would."""
+    for page in ChapterPage.objects.filter(chapter=context.chapter):
+        page.full_clean()
+
+
+@benchmark("catalog")
+def catalog(context):
+    context.get(reverse("catalog"))
+
+
+@benchmark("comic-detail")
+def comic_detail(context):
+    context.get(context.comic.get_absolute_url())
+
+
+@benchmark("reader")
+def reader(context):
+    context.get(context.chapter.get_absolute_url())
+
+
+@benchmark("reader-not-modified")
+def reader_not_modified(context):
+    url = context.chapter.get_absolute_url()
+    etag = context.get(url).headers["ETag"]
+    context.get(url, if_none_match=etag)
+
+
+def run(names=None, repeat=5):
+    """
+    Run the benchmarks ``names`` (all by default) and return their results,
+    ``{name: {"seconds": median, "best": minimum, "queries": count}}``.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise KeyError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    results = {}
+    with translation.override("en"):
+        context = BenchmarkContext.create()
+        for name in names:
+            function = BENCHMARKS[name]
+            with CaptureQueriesContext(connection) as queries:
+                function(context)
+            # Captured queries are read from the connection lazily.
+            query_count = len(queries)
+            times = []
+            for _ in range(repeat):
+                start = perf_counter()
+                function(context)
+                times.append(perf_counter() - start)
+            results[name] = {
+                "seconds": statistics.median(times),
+                "best": min(times),
+                "queries": query_count,
+            }
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare ``results`` to ``baseline`` (both as written by ``manage.py
+    benchmark``) and return the regressions as messages.
+
+    A benchmark regresses when it makes more queries than in the baseline, or
+    when its median time grows by more than ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for name, base in baseline["benchmarks"].items():
+        result = results["benchmarks"].get(name)
+        if result is None:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(
+                f"{name}: {result['queries']} queries, baseline {base['queries']}"
+            )
+        if result["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['seconds'] * 1000:.1f} ms, "
+                f"baseline {base['seconds'] * 1000:.1f} ms "
+                f"(+{result['seconds'] / base['seconds'] - 1:.0%})"
+            )
+    return regressions
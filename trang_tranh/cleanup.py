@@ -0,0 +1,210 @@
+"""
+Garbage collection of orphaned media files.
+
+Django never deletes the file of a replaced ``ImageField``, and files
+uploaded by a request that failed afterwards are left behind as well.
+``collect_garbage()`` walks every media directory the app writes to (the
+``upload_to`` directories of its file fields, the blobs and the renditions)
+with ``os.scandir``, one directory per worker thread. Files are streamed in
+batches of ``batch_size`` and each batch is checked against the database
+with one ``IN`` lookup per file field, so neither the paths nor the stored
+names are ever all held in memory.
+
+A file is an orphan when:
+
+- no file field holds its name, for uploaded files;
+- no file field holds its name, for blobs (and the temporary files of
+  interrupted uploads in the blob directory), whatever their ``MediaBlob``
+  row says: replacing the image of a saved row does not release its old
+  blob. The ``MediaBlob`` rows of collected blobs are deleted, and the
+  ``references`` of the others are recounted from the file fields first;
+- no ``MediaBlob`` has the digest it is keyed by, for renditions. As the
+  digest of an original that is not a blob is only known by reading it,
+  renditions are only collected once every original is a blob (see
+  ``manage.py dedupe_media``);
+- no ``ChapterStrip`` has the version it is named after, for strips.
+
+Files modified less than ``grace`` ago are never collected: an upload is
+written before the row that holds it is committed.
+"""
+
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from .conf import get_setting
+from .storage import (
+    BLOB_ROOT,
+    file_fields,
+    recount_references,
+    referenced_names,
+)
+
+# The digest in ``rendition_name()``, and the version in ``strip_name()``.
+RENDITION_DIGEST_RE = re.compile(r"^[^/]+/[0-9a-f]{2}/([0-9a-f]{64})/[^/]+$")
+
+
+def _blobs():
+    from .models import MediaBlob
+
+    return MediaBlob.objects
+
+
+def _strips():
+    from .models import ChapterStrip
+
+    return ChapterStrip.objects
+
+
+def media_directories():
+    """Return the top-level media directories the app stores files in."""
+    directories = {
+        model._meta.get_field(field).upload_to.split("/")[0]
+        for model, field in file_fields()
+    }
+    directories.update(
+        [BLOB_ROOT, get_setting("RENDITION_ROOT"), get_setting("STRIP_ROOT")]
+    )
+    return sorted(directories)
+
+
+def scan(root, directory):
+    """
+    Yield the ``(name, path, size, mtime)`` of every file under
+    ``directory`` of ``root``, walking it with ``os.scandir`` without
+    listing it all first.
+    """
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(root, current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f"{current}/{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield name, entry.path, stat.st_size, stat.st_mtime
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _has_non_blob_originals():
+    return any(
+        model._base_manager.exclude(**{field: ""})
+        .exclude(**{f"{field}__isnull": True})
+        .exclude(**{f"{field}__startswith": BLOB_ROOT + "/"})
+        .exists()
+        for model, field in file_fields()
+    )
+
+
+def _live_names(directory, names):
+    """Return the names among ``names`` of ``directory`` that are in use."""
+    if directory in (get_setting("RENDITION_ROOT"), get_setting("STRIP_ROOT")):
+        matches = {name: RENDITION_DIGEST_RE.match(name) for name in names}
+        digests = {match.group(1) for match in matches.values() if match}
+        if directory == get_setting("STRIP_ROOT"):
+            live = _strips().filter(version__in=digests).values_list("version")
+        else:
+            live = _blobs().filter(digest__in=digests).values_list("digest")
+        live = {digest for (digest,) in live}
+        # Files not named like renditions or strips are left alone.
+        return {
+            name
+            for name, match in matches.items()
+            if match is None or match.group(1) in live
+        }
+    return referenced_names(names)
+
+
+def collect_directory(
+    root, directory, dry_run=False, grace=None, batch_size=1000, now=None
+):
+    """
+    Delete the orphaned files under ``directory`` of ``root`` and return a
+    ``Counter`` of ``files`` (scanned), ``recent`` (kept for the grace
+    period), ``orphans`` and ``freed`` (their bytes). With ``dry_run``, the
+    orphans are counted but not deleted.
+    """
+    grace = get_setting("MEDIA_GC_GRACE_PERIOD") if grace is None else grace
+    cutoff = (now or time.time()) - grace.total_seconds()
+    stats = Counter()
+    if directory == get_setting("RENDITION_ROOT") and _has_non_blob_originals():
+        stats["skipped"] = 1
+        return stats
+    for batch in _batches(scan(root, directory), batch_size):
+        stats["files"] += len(batch)
+        old = [entry for entry in batch if entry[3] < cutoff]
+        stats["recent"] += len(batch) - len(old)
+        if not old:
+            continue
+        live = _live_names(directory, [entry[0] for entry in old])
+        removed = []
+        for name, path, size, _mtime in old:
+            if name in live:
+                continue
+            stats["orphans"] += 1
+            stats["freed"] += size
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                removed.append(name)
+        if directory == BLOB_ROOT and removed:
+            _blobs().filter(name__in=removed).delete()
+    return stats
+
+
+def _collect_in_thread(*args):
+    try:
+        return collect_directory(*args)
+    finally:
+        # Each worker thread has a database connection of its own.
+        connection.close()
+
+
+def collect_garbage(
+    storage=None, dry_run=False, grace=None, batch_size=1000, jobs=None
+):
+    """
+    Collect the orphaned files of every media directory of ``storage``
+    (the default storage), ``jobs`` directories at a time (all of them by
+    default, ``1`` runs in the calling thread). Return a
+    ``{directory: Counter}`` of what ``collect_directory`` reports.
+    """
+    storage = storage or default_storage
+    try:
+        root = storage.path("")
+    except NotImplementedError:
+        raise TypeError("Orphaned media can only be collected on a local file system")
+    directories = media_directories()
+    args = (dry_run, grace, batch_size, time.time())
+    if not dry_run:
+        recount_references()
+    if jobs == 1:
+        return {
+            directory: collect_directory(root, directory, *args)
+            for directory in directories
+        }
+    with ThreadPoolExecutor(max_workers=jobs or len(directories)) as executor:
+        results = {
+            directory: executor.submit(_collect_in_thread, root, directory, *args)
+            for directory in directories
+        }
+        return {directory: future.result() for directory, future in results.items()}
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+# Default values for the ``TRANG_TRANH_*`` settings. Any of them can be
+# overridden in the project settings module.
+DEFAULTS = {
+    # Seconds between two flushes of the buffered read counters.
+    "READ_COUNT_FLUSH_INTERVAL": 5.0,
+    # Flush as soon as this many distinct rows are pending, even if the
+    # interval has not elapsed yet.
+    "READ_COUNT_MAX_PENDING": 1000,
+    # Size of the process pool used for image work. ``None`` uses one
+    # process per CPU, ``0`` runs the work inline in the calling process.
+    "WORKER_PROCESSES": None,
+    # Threads available for jobs that run in the background of a request.
+    "BACKGROUND_THREADS": 2,
+    # Rendition names mapped to their maximum width in pixels.
+    "RENDITION_SIZES": {"thumb": 240, "small": 480, "medium": 960, "large": 1600},
+    # Formats generated for every rendition size. The first one is the default.
+    "RENDITION_FORMATS": ("webp", "jpeg"),
+    "RENDITION_QUALITY": 80,
+    # Storage directory holding the generated renditions.
+    "RENDITION_ROOT": "renditions",
+    # Generate all renditions in the background as soon as an image is saved
+    # instead of on first request.
+    "RENDITIONS_EAGER": True,
+    # Storage directory holding the strips stitched from the pages of the
+    # chapters of comics with ``stitch_pages`` set.
+    "STRIP_ROOT": "strips",
+    # Width in pixels every page is scaled to in a strip.
+    "STRIP_WIDTH": 800,
+    # Height in pixels a strip does not exceed, unless a single page does.
+    # WebP strips are at most 16383 pixels high, a page taller than that is
+    # stitched as JPEG.
+    "STRIP_MAX_HEIGHT": 8000,
+    # Longest side in pixels of the blurred placeholder stored with every
+    # cover and page image.
+    "PLACEHOLDER_SIZE": 16,
+    # Number of leading pages announced with ``Link: rel=preload`` by the
+    # chapter reader.
+    "READER_PRELOAD_PAGES": 3,
+    # Seconds a resolved comic translation stays cached (``None`` = forever,
+    # entries are invalidated when the comic or its translations change).
+    "LOCALIZATION_CACHE_TIMEOUT": None,
+    # Seconds the translation coverage of a comic stays cached (``None`` =
+    # forever, entries are dropped whenever the coverage of the comic changes).
+    "COVERAGE_CACHE_TIMEOUT": None,
+    # Seconds the page manifest of a chapter stays cached (``None`` = forever,
+    # entries are keyed by the chapter's ``modified_at`` and never stale).
+    "MANIFEST_CACHE_TIMEOUT": 7 * 24 * 60 * 60,
+    # Most chapters and translated chapters one manifest request can ask for.
+    "MANIFEST_BATCH_SIZE": 50,
+    # Rows deleted per transaction when removing a comic, a translation or
+    # a chapter with everything under it.
+    "REMOVAL_BATCH_SIZE": 500,
+    # Days of reads shown by the publisher dashboard.
+    "PUBLISHER_DASHBOARD_DAYS": 30,
+    # Comics per catalog page.
+    "CATALOG_PAGE_SIZE": 24,
+    # Chapters per page of the chapter list of a comic or comic translation.
+    "CHAPTER_LIST_PAGE_SIZE": 100,
+    # How media files are sent: ``None`` streams them from Django (with
+    # ``os.sendfile`` when the WSGI server supports it), ``"x-accel-redirect"``
+    # (nginx) or ``"x-sendfile"`` (Apache, lighttpd) only emit a header and
+    # let the front proxy send the file.
+    "MEDIA_OFFLOAD": None,
+    # Internal location that nginx maps to MEDIA_ROOT for X-Accel-Redirect.
+    "MEDIA_ACCEL_PREFIX": "/protected-media/",
+    # Cache lifetime in seconds of media files that may change.
+    "MEDIA_MAX_AGE": 60 * 60,
+    # Media paths matching this pattern contain a content hash and are
+    # cached for a year as immutable.
+    "MEDIA_IMMUTABLE_PATTERN": r"(^|/)[0-9a-f]{64}(/|\.|$)",
+    # Media files modified more recently than this are never collected by
+    # ``manage.py gc_media``, as their row may not be committed yet.
+    "MEDIA_GC_GRACE_PERIOD": timedelta(days=1),
+    # Half-life of a read in each ComicTrend period (``None`` = no decay).
+    "RANKING_HALF_LIVES": {
+        "d": timedelta(days=1),
+        "w": timedelta(days=7),
+        "a": None,
+    },
+    # PRAGMAs set on every new SQLite connection. WAL lets readers and the
+    # writer work at the same time, and busy_timeout (milliseconds) makes a
+    # writer wait for the lock instead of failing with "database is locked".
+    "SQLITE_PRAGMAS": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        # Negative sizes are in KiB.
+        "cache_size": -64 * 1024,
+    },
+    # Database aliases of read-only replicas that the reads of the reader
+    # and catalog views are routed to by ``trang_tranh.db.ReplicaRouter``.
+    "DATABASE_REPLICAS": (),
+    # Share of the requests measured by InstrumentationMiddleware, from 0 to 1.
+    # Their statistics are kept in the default cache, per process unless the
+    # cache is shared.
+    "INSTRUMENTATION_SAMPLE_RATE": 0.05,
+    # Number of the slowest statements of a measured request that staff
+    # users see in its Server-Timing header.
+    "INSTRUMENTATION_SLOW_QUERIES": 3,
+}
+
+
+def get_setting(name):
+    """Return ``settings.TRANG_TRANH_<name>`` or its default value."""
+    return getattr(settings, f"TRANG_TRANH_{name}", DEFAULTS[name])
@@ -0,0 +1,164 @@
+"""
+Write-behind buffering of ``read_count`` increments.
+
+Bumping ``read_count`` on every page view means one locked row write per
+request, which serializes all readers of a popular comic. Increments are
+collected in process memory instead and written back periodically as a few
+``UPDATE ... SET read_count = read_count + n`` statements.
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+from .conf import get_setting
+from .models import Comic, ComicChapter, ComicChapterTranslation
+
+logger = logging.getLogger(__name__)
+
+# Sent after a flush has been committed. ``counts`` maps each model class
+# to a ``{pk: increment}`` dict of what has just been written.
+read_counts_flushed = Signal()
+
+FLUSH_BATCH_SIZE = 500
+
+
+class ReadCounterBuffer:
+    """
+    Collect ``read_count`` increments in memory and write them in bulk.
+
+    A daemon thread flushes the buffer every ``flush_interval`` seconds
+    (``TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL``) and once more when the
+    process exits. With an interval of ``None`` no thread is started and
+    ``flush()`` has to be called explicitly.
+    """
+
+    def __init__(self, flush_interval=None, max_pending=None):
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return get_setting("READ_COUNT_FLUSH_INTERVAL")
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return get_setting("READ_COUNT_MAX_PENDING")
+
+    def increment(self, model, pk, n=1):
+        """Add ``n`` to the buffered ``read_count`` of ``model`` row ``pk``."""
+        if pk is None or n <= 0:
+            return
+        with self._lock:
+            self._pending[model][pk] += n
+            pending = sum(len(rows) for rows in self._pending.values())
+        self._ensure_started()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self):
+        """Return a copy of the increments that have not been written yet."""
+        with self._lock:
+            return {model: dict(rows) for model, rows in self._pending.items()}
+
+    def flush(self):
+        """
+        Write every pending increment to the database.
+
+        Rows sharing the same increment are updated with a single statement,
+        so a flush costs one query per distinct increment value and model
+        rather than one per row. Return the counts that were written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                counts = {model: dict(rows) for model, rows in self._pending.items()}
+                self._pending.clear()
+            if not counts:
+                return {}
+            try:
+                with transaction.atomic():
+                    for model, rows in counts.items():
+                        _apply_increments(model, rows)
+            except Exception:
+                # Put the increments back so they are retried next time.
+                with self._lock:
+                    for model, rows in counts.items():
+                        for pk, n in rows.items():
+                            self._pending[model][pk] += n
+                raise
+        read_counts_flushed.send(sender=self.__class__, counts=counts)
+        return counts
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still pending."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping or not self.flush_interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="read-count-flush", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Failed to flush buffered read counts")
+        finally:
+            connections.close_all()
+
+
+def _apply_increments(model, rows):
+    by_increment = defaultdict(list)
+    for pk, n in rows.items():
+        by_increment[n].append(pk)
+    for n, pks in by_increment.items():
+        for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+            model._base_manager.filter(
+                pk__in=pks[start : start + FLUSH_BATCH_SIZE]
+            ).update(read_count=F("read_count") + n)
+
+
+read_counter = ReadCounterBuffer()
+
+
+def record_chapter_read(chapter, n=1):
+    """Count a read of ``chapter`` and of its comic."""
+    read_counter.increment(ComicChapter, chapter.pk, n)
+    read_counter.increment(Comic, chapter.comic_id, n)
+
+
+def record_chapter_translation_read(chapter_translation, n=1):
+    """Count a read of ``chapter_translation`` and of its comic."""
+    read_counter.increment(ComicChapterTranslation, chapter_translation.pk, n)
+    read_counter.increment(Comic, chapter_translation.comic_translation.comic_id, n)
@@ -0,0 +1,166 @@
+"""
+Translation coverage: which chapters of each comic translation are missing,
+and which translated chapters do not have as many pages as the original.
+
+A ``ComicChapterTranslation`` translates the ``ComicChapter`` with the same
+``chapter_counter`` in the translated comic. The coverage of any number of
+comics is computed with three grouped queries per ``BATCH_SIZE`` comics
+(the original chapters with their page counts, the translated chapters with
+theirs, and the translations) and cached per comic. Every change that can alter a comic's
+coverage drops only that comic's entry, once the transaction commits: the
+signal handlers in ``signals.py`` cover chapters and translations, and
+``pages.touch_chapters``, which every page change goes through, covers
+pages.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .conf import get_setting
+from .models import (
+    Comic,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+)
+
+CACHE_PREFIX = "trang_tranh:coverage:"
+
+# Comics whose coverage is computed together, which keeps the ``IN`` lists
+# of the queries below the bound parameter limit of SQLite.
+BATCH_SIZE = 500
+
+
+def cache_key(comic_id):
+    return f"{CACHE_PREFIX}{comic_id}"
+
+
+def _compute(comic_ids):
+    """Return ``{comic_id: [translation report, ...]}`` for ``comic_ids``."""
+    originals = defaultdict(dict)
+    for comic_id, counter, number, pages in (
+        ComicChapter.objects.filter(comic_id__in=comic_ids)
+        .values_list("comic_id", "chapter_counter", "chapter_number")
+        .annotate(pages=Count("chapterpage"))
+        .order_by()
+    ):
+        originals[comic_id][counter] = (number, pages)
+
+    translated = defaultdict(dict)
+    for translation_id, counter, pages in (
+        ComicChapterTranslation.objects.filter(
+            comic_translation__comic_id__in=comic_ids
+        )
+        .values_list("comic_translation_id", "chapter_counter")
+        .annotate(pages=Count("chapterpagetranslation"))
+        .order_by()
+    ):
+        translated[translation_id][counter] = pages
+
+    reports = {comic_id: [] for comic_id in comic_ids}
+    for translation_id, comic_id, language, title in (
+        ComicTranslation.objects.filter(comic_id__in=comic_ids)
+        .values_list("pk", "comic_id", "language", "translated_title")
+        .order_by("pk")
+    ):
+        chapters = originals[comic_id]
+        done = translated[translation_id]
+        mismatches = [
+            {
+                "chapter_counter": counter,
+                "chapter_number": number,
+                "pages": pages,
+                "translated_pages": done[counter],
+            }
+            for counter, (number, pages) in sorted(chapters.items())
+            if counter in done and done[counter] != pages
+        ]
+        complete = sum(
+            1
+            for counter, (_number, pages) in chapters.items()
+            if done.get(counter) == pages
+        )
+        reports[comic_id].append(
+            {
+                "translation": translation_id,
+                "comic": comic_id,
+                "language": language,
+                "title": title,
+                "chapters": len(chapters),
+                "translated_chapters": len(done.keys() & chapters.keys()),
+                "complete_chapters": complete,
+                "completeness": complete / len(chapters) if chapters else 1.0,
+                "missing": [
+                    {"chapter_counter": counter, "chapter_number": number}
+                    for counter, (number, _pages) in sorted(chapters.items())
+                    if counter not in done
+                ],
+                "page_mismatches": mismatches,
+                # Translated chapters without an original chapter.
+                "orphans": sorted(done.keys() - chapters.keys()),
+            }
+        )
+    return reports
+
+
+def comic_coverage(comic_ids=None):
+    """
+    Return the coverage reports of the translations of ``comic_ids`` (every
+    comic by default) as ``{comic_id: [report, ...]}``.
+
+    Each report gives the translation's ``chapters`` (original chapters),
+    ``translated_chapters``, ``complete_chapters`` (translated with as many
+    pages as the original), ``completeness`` (their share), the ``missing``
+    chapters, the ``page_mismatches`` and the ``orphans`` (counters of
+    translated chapters that have no original).
+    """
+    if comic_ids is None:
+        comic_ids = list(Comic.objects.order_by("pk").values_list("pk", flat=True))
+    keys = {comic_id: cache_key(comic_id) for comic_id in comic_ids}
+    cached = cache.get_many(keys.values())
+    reports = {comic_id: cached[key] for comic_id, key in keys.items() if key in cached}
+    missing = [comic_id for comic_id in comic_ids if comic_id not in reports]
+    for start in range(0, len(missing), BATCH_SIZE):
+        computed = _compute(missing[start : start + BATCH_SIZE])
+        cache.set_many(
+            {keys[comic_id]: value for comic_id, value in computed.items()},
+            get_setting("COVERAGE_CACHE_TIMEOUT"),
+        )
+        reports.update(computed)
+    return {comic_id: reports[comic_id] for comic_id in comic_ids}
+
+
+def translation_coverage(comic_ids=None):
+    """Return the coverage reports of ``comic_ids`` as a flat list."""
+    return [
+        report for reports in comic_coverage(comic_ids).values() for report in reports
+    ]
+
+
+def invalidate_comics(comic_ids):
+    """Drop the cached coverage of ``comic_ids`` once the transaction commits."""
+    keys = [cache_key(comic_id) for comic_id in set(comic_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_translations(translation_ids):
+    invalidate_comics(
+        ComicTranslation._base_manager.filter(pk__in=translation_ids).values_list(
+            "comic_id", flat=True
+        )
+    )
+
+
+def invalidate_chapters(model, pks):
+    """Drop the cached coverage of the comics of the ``model`` chapters ``pks``."""
+    if model is ComicChapter:
+        comic_path = "comic_id"
+    else:
+        comic_path = "comic_translation__comic_id"
+    invalidate_comics(
+        model._base_manager.filter(pk__in=pks).values_list(comic_path, flat=True)
+    )
@@ -0,0 +1,156 @@
+"""
+Keyset (cursor) pagination.
+
+OFFSET pagination reads and throws away every row before the page, so deep
+pages get slower, and rows published or deleted while a reader scrolls
+shift the pages under them: entries show up twice or are skipped. A
+``CursorPaginator`` orders the queryset on a tuple of columns that is
+unique, such as ``("-published_date", "-pk")``, and fetches the rows after
+(or before) the last row shown. With an index on those columns, every page
+costs a single index range scan whatever its depth.
+
+Cursors hold the ordering values of that row and are signed with
+``SECRET_KEY``, so clients can neither read them as anything meaningful nor
+forge one to start at an arbitrary position. An invalid cursor restarts
+from the first page, as ``Paginator.get_page`` does with an invalid number.
+"""
+
+from django.core import signing
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """A page of a ``CursorPaginator``, with the cursors of its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` in ``ordering`` order, ``per_page`` objects at a
+    time.
+
+    ``ordering`` names concrete fields of the model (``"pk"`` included),
+    each optionally prefixed with ``-``, whose values are never ``NULL`` and
+    which together are unique. Cursors are only valid for the paginator
+    ``salt`` they were made with, by default the model and the ordering.
+    """
+
+    def __init__(self, queryset, ordering, per_page, salt=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = int(per_page)
+        opts = queryset.model._meta
+        self.fields = [
+            (opts.pk if name.lstrip("-") == "pk" else opts.get_field(name.lstrip("-")))
+            for name in self.ordering
+        ]
+        self.descending = [name.startswith("-") for name in self.ordering]
+        self.salt = salt or "trang_tranh.cursors:%s:%s" % (
+            opts.label,
+            ",".join(self.ordering),
+        )
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps([values, backwards], salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Return the ordering values and direction stored in ``cursor``."""
+        try:
+            values, backwards = signing.loads(cursor, salt=self.salt)
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                field.to_python(value) for field, value in zip(self.fields, values)
+            ], bool(backwards)
+        except (signing.BadSignature, TypeError, ValueError) as e:
+            raise InvalidCursor(str(e))
+
+    def _keyset(self, values, backwards):
+        """``Q`` of the rows after the row of ``values`` in the ordering."""
+        condition = Q()
+        equal = Q()
+        for field, descending, value in zip(self.fields, self.descending, values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= equal & Q(**{f"{field.attname}__{lookup}": value})
+            equal &= Q(**{field.attname: value})
+        return condition
+
+    def _query(self, cursor):
+        """Return the queryset of the page after ``cursor`` and its direction."""
+        if not cursor:
+            values, backwards = None, False
+        else:
+            values, backwards = self.decode_cursor(cursor)
+        ordering = [
+            ("-" if descending != backwards else "") + field.attname
+            for field, descending in zip(self.fields, self.descending)
+        ]
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._keyset(values, backwards))
+        # One more row tells whether there is another page.
+        return queryset.order_by(*ordering)[: self.per_page + 1], cursor, backwards
+
+    def _page(self, rows, cursor, backwards):
+        rows = list(rows)
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage([], None, None)
+        has_next, has_previous = (True, more) if backwards else (more, bool(cursor))
+        return CursorPage(
+            rows,
+            self.encode_cursor(rows[-1]) if has_next else None,
+            self.encode_cursor(rows[0], backwards=True) if has_previous else None,
+        )
+
+    def page(self, cursor=None):
+        """Return the page at ``cursor``, raise ``InvalidCursor`` if it is not valid."""
+        return self._page(*self._query(cursor))
+
+    def get_page(self, cursor=None):
+        """Return the page at ``cursor``, or the first page if it is not valid."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    async def aget_page(self, cursor=None):
+        """Async version of ``get_page``."""
+        try:
+            queryset, cursor, backwards = self._query(cursor)
+        except InvalidCursor:
+            queryset, cursor, backwards = self._query(None)
+        return self._page([obj async for obj in queryset], cursor, backwards)
@@ -0,0 +1,98 @@
+"""
+Database connection tuning and read replica routing.
+
+``configure_connection`` runs on every new connection (see ``signals.py``)
+and applies the ``SQLITE_PRAGMAS`` setting to SQLite databases.
+
+``ReplicaRouter`` sends the reads made inside ``replica_reads()`` (which the
+``read_from_replica`` view decorator enters for GET and HEAD requests) to one
+of the ``DATABASE_REPLICAS`` aliases, picked once per block so a request
+reads a single snapshot. Every other query, and every read made inside a
+transaction on the primary, goes to the primary so a request always reads
+its own writes.
+"""
+
+import random
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .conf import get_setting
+
+_replica = ContextVar("trang_tranh_replica", default=None)
+
+
+def configure_connection(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in get_setting("SQLITE_PRAGMAS").items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+@contextmanager
+def replica_reads():
+    """Route the reads made inside the block to a replica, if any."""
+    replicas = get_setting("DATABASE_REPLICAS")
+    token = _replica.set(random.choice(replicas) if replicas else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def read_from_replica(view):
+    """
+    Decorator for read-only views, sync or async, whose GET and HEAD
+    requests can read from a replica. Template responses of sync views are
+    rendered inside the block too, as their querysets are only evaluated
+    then.
+    """
+
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await view(request, *args, **kwargs)
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_setting("DATABASE_REPLICAS")}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_setting("DATABASE_REPLICAS"):
+            return False
+        return None
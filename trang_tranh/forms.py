@@ -0,0 +1,82 @@
+from django import forms
+from django.utils.translation import gettext_lazy as _
+
+from .pages import natural_sort_key
+
+
+class MultipleImageInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.ImageField):
+    """Image field accepting several files, each validated with Pillow."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", MultipleImageInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_image_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_image_clean(image, initial) for image in data]
+        return [single_image_clean(data, initial)]
+
+
+class ChapterPageUploadForm(forms.Form):
+    images = MultipleImageField(
+        label=_("page images"),
+        help_text=_("Pages are added in natural file name order"),
+    )
+    position = forms.IntegerField(
+        label=_("insert at page"),
+        min_value=1,
+        required=False,
+        help_text=_("Leave empty to append the pages after the last page"),
+    )
+
+    def clean_images(self):
+        return sorted(
+            self.cleaned_data["images"], key=lambda f: natural_sort_key(f.name)
+        )
+
+
+class ChapterPagesForm(forms.Form):
+    """
+    Reorder and delete the pages of a chapter, with a position and a delete
+    field for every page.
+    """
+
+    def __init__(self, *args, pages, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = list(pages)
+        for page in self.pages:
+            self.fields[f"position-{page.pk}"] = forms.IntegerField(
+                label=_("position"), min_value=1, initial=page.page_number
+            )
+            self.fields[f"delete-{page.pk}"] = forms.BooleanField(
+                label=_("delete"), required=False
+            )
+
+    def rows(self):
+        for page in self.pages:
+            yield page, self[f"position-{page.pk}"], self[f"delete-{page.pk}"]
+
+    def deleted_page_numbers(self):
+        return [
+            page.page_number
+            for page in self.pages
+            if self.cleaned_data[f"delete-{page.pk}"]
+        ]
+
+    def ordered_page_pks(self):
+        """Kept pages by new position, ties keeping their current order."""
+        kept = [
+            page for page in self.pages if not self.cleaned_data[f"delete-{page.pk}"]
+        ]
+        kept.sort(
+            key=lambda page: (
+                self.cleaned_data[f"position-{page.pk}"],
+                page.page_number,
+            )
+        )
+        return [page.pk for page in kept]
@@ -0,0 +1,169 @@
+"""
+Import of chapters from CBZ/ZIP archives.
+
+Archives are never extracted to disk. Entries are listed from the central
+directory, sorted naturally, decoded and verified by Pillow in the shared
+process pool (each worker reads its entries straight from the archive), and
+finally streamed from the archive into the storage while the chapter and
+its pages are created in one transaction.
+"""
+
+import io
+import os
+import posixpath
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils.translation import gettext as _
+from PIL import Image
+
+from .models import Comic, ComicTranslation
+from .pages import (
+    bulk_create_chapter_page_translations,
+    bulk_create_chapter_pages,
+    natural_sort_key,
+)
+from .sequences import publish_chapter, reserve_chapters
+from .workers import pool_map
+
+ARCHIVE_EXTENSIONS = (".cbz", ".zip")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+
+def archive_page_names(archive):
+    """Return the image entries of ``archive`` in natural order."""
+    names = []
+    for info in archive.infolist():
+        name = info.filename
+        parts = name.split("/")
+        if info.is_dir() or parts[0] == "__MACOSX" or parts[-1].startswith("."):
+            continue
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            names.append(name)
+    return sorted(names, key=natural_sort_key)
+
+
+def verify_archive_entry(path, name):
+    """
+    Decode entry ``name`` of archive ``path`` and return an error message,
+    or ``None`` when it is a valid image. Runs in a worker process.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            data = archive.read(name)
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except (OSError, zipfile.BadZipFile, Image.DecompressionBombError) as e:
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def verify_archives(paths):
+    """
+    Verify every page of every archive in ``paths`` in parallel.
+
+    Return a ``{path: page names}`` dict, or raise ``ValidationError``
+    listing every invalid archive and page.
+    """
+    pages = {}
+    errors = []
+    for path in paths:
+        try:
+            with zipfile.ZipFile(path) as archive:
+                pages[path] = archive_page_names(archive)
+        except (OSError, zipfile.BadZipFile) as e:
+            errors.append(f"{path}: {e}")
+            continue
+        if not pages[path]:
+            errors.append(_("%(path)s: no page images found") % {"path": path})
+
+    entries = [(path, name) for path, names in pages.items() for name in names]
+    results = pool_map(
+        verify_archive_entry,
+        [path for path, _name in entries],
+        [name for _path, name in entries],
+    )
+    errors.extend(
+        f"{path}: {name}: {error}"
+        for (path, name), error in zip(entries, results)
+        if error is not None
+    )
+    if errors:
+        raise ValidationError(errors)
+    return pages
+
+
+def import_chapter_archive(path, parent, **fields):
+    """
+    Create a chapter of ``parent`` from the archive at ``path``.
+
+    ``parent`` is a ``Comic`` (creating a ``ComicChapter``) or a
+    ``ComicTranslation`` (creating a ``ComicChapterTranslation``). ``fields``
+    are set on the new chapter; the title defaults to the archive name and
+    the chapter counter and number follow the last chapter.
+    """
+    names = verify_archives([path])[path]
+    return _create_chapter(path, names, parent, fields)
+
+
+def import_chapter_directory(directory, parent, **fields):
+    """
+    Import every archive of ``directory`` as consecutive chapters of
+    ``parent``, in natural file name order.
+
+    The pages of all archives are verified in parallel first, so nothing is
+    created when one of them is broken. Each chapter is then created in its
+    own transaction, with counters and numbers reserved up front.
+    """
+    paths = sorted(
+        (
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.lower().endswith(ARCHIVE_EXTENSIONS)
+        ),
+        key=natural_sort_key,
+    )
+    pages = verify_archives(paths)
+    slots = reserve_chapters(
+        parent, len(paths), numbered=not fields.get("extra_chapter")
+    )
+    return [
+        _create_chapter(
+            path,
+            pages[path],
+            parent,
+            {**fields, "chapter_counter": counter, "chapter_number": number},
+        )
+        for path, (counter, number) in zip(paths, slots)
+    ]
+
+
+def _create_chapter(path, names, parent, fields):
+    fields = dict(fields)
+    fields.setdefault("title", os.path.splitext(os.path.basename(path))[0])
+    with zipfile.ZipFile(path) as archive, transaction.atomic():
+        if isinstance(parent, Comic):
+            if "cover" not in fields:
+                fields["cover"] = _archive_file(archive, names[0])
+            chapter = publish_chapter(parent, **fields)
+            bulk_create_chapter_pages(
+                chapter, [_archive_file(archive, name) for name in names]
+            )
+        elif isinstance(parent, ComicTranslation):
+            fields["translated_title"] = fields.pop("title")
+            chapter = publish_chapter(parent, **fields)
+            bulk_create_chapter_page_translations(
+                chapter, [_archive_file(archive, name) for name in names]
+            )
+        else:
+            raise TypeError(f"Can not import chapters into {parent!r}")
+    return chapter
+
+
+def _archive_file(archive, name):
+    """Wrap an archive entry as a ``File`` that is read only when stored."""
+    file = File(archive.open(name), name=posixpath.basename(name))
+    file.size = archive.getinfo(name).file_size
+    return file
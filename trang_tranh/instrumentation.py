@@ -0,0 +1,243 @@
+"""
+Per-request SQL and timing instrumentation.
+
+A sample of the requests (``INSTRUMENTATION_SAMPLE_RATE``) is measured by
+``middleware.InstrumentationMiddleware``. While a request is measured, its
+``RequestStats`` is the current one and the ``QueryTimer`` installed on
+every database connection (see ``signals.py``) adds each query's duration to
+it; otherwise the timer only checks a context variable. Context variables
+follow the request into the threads of async views, so their queries are
+counted too.
+
+The measures are sent back in a ``Server-Timing`` header and added to
+per-URL-name histograms in the default cache, with one atomic ``incr()`` per
+counter once it exists and no read-modify-write. The statistics cover every
+process of a deployment only if that cache is shared (Memcached, Redis,
+database): with ``LocMemCache`` each process keeps, and reports, its own.
+The URL names are read from the URLconf, so that no list of names has to be
+kept in the cache.
+"""
+
+import heapq
+import random
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.core.cache import cache
+from django.urls import URLResolver, get_resolver
+
+from .conf import get_setting
+
+CACHE_PREFIX = "trang_tranh:timing:"
+
+# Upper bounds, in milliseconds, of the request duration histogram buckets.
+# The last bucket counts every slower request.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Fields added up per URL name, all integers so that they can be incr()-ed.
+# The request count is the sum of the buckets.
+COUNTERS = ("total_us", "view_us", "db_us", "queries")
+FIELDS = COUNTERS + tuple(f"bucket:{i}" for i in range(len(BUCKETS) + 1))
+
+# Names the requests to URLs that do not resolve, or resolve to a pattern
+# without a name, are recorded under.
+UNRESOLVED = "<unresolved>"
+UNNAMED = "<unnamed>"
+
+_current = ContextVar("trang_tranh_request_stats", default=None)
+
+
+class RequestStats:
+    """Measures of one request."""
+
+    def __init__(self, slow_query_count=None):
+        self.started = perf_counter()
+        self.view_started = None
+        self.view_time = 0.0
+        self.total_time = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.slow_query_count = (
+            get_setting("INSTRUMENTATION_SLOW_QUERIES")
+            if slow_query_count is None
+            else slow_query_count
+        )
+        # Min-heap of the (duration, sql) of the slowest queries.
+        self.slowest = []
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.slowest) < self.slow_query_count:
+            heapq.heappush(self.slowest, (duration, sql))
+        elif self.slowest and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, sql))
+
+    def slowest_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def finish(self):
+        now = perf_counter()
+        self.total_time = now - self.started
+        if self.view_started is not None:
+            self.view_time = now - self.view_started
+
+    def server_timing(self, include_sql=False):
+        """
+        ``Server-Timing`` header value of the measures. The text of the
+        slowest statements is only included with ``include_sql``.
+        """
+        metrics = [
+            f"total;dur={self.total_time * 1000:.1f}",
+            f"view;dur={self.view_time * 1000:.1f}",
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if include_sql:
+            metrics.extend(
+                f'sql;dur={duration * 1000:.1f};desc="{_quote(sql)}"'
+                for duration, sql in self.slowest_queries()
+            )
+        return ", ".join(metrics)
+
+
+def _quote(text, length=200):
+    """Make ``text`` a short single-line quoted-string."""
+    text = " ".join(text.split())[:length]
+    return text.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def start_request():
+    """
+    Start measuring the current request if it is sampled. Return the new
+    ``RequestStats`` and the token to pass to ``finish_request``, or
+    ``(None, None)``.
+    """
+    if random.random() >= get_setting("INSTRUMENTATION_SAMPLE_RATE"):
+        return None, None
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(stats, token):
+    stats.finish()
+    _current.reset(token)
+
+
+class QueryTimer:
+    """Database ``execute_wrapper`` adding queries to the current request."""
+
+    def __call__(self, execute, sql, params, many, context):
+        stats = _current.get()
+        if stats is None:
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.record_query(sql, perf_counter() - start)
+
+
+query_timer = QueryTimer()
+
+
+def instrument_connection(connection):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, query_timer)
+
+
+def _key(name, field):
+    return f"{CACHE_PREFIX}{name}:{field}"
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # First request of the name, or the counter was evicted. If another
+        # process created it in the meantime, add() fails and incr() works.
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def _view_names(resolver=None, prefix=""):
+    """Yield the namespaced names of the URL patterns of ``resolver``."""
+    if resolver is None:
+        resolver = get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            namespace = pattern.namespace
+            yield from _view_names(
+                pattern, f"{prefix}{namespace}:" if namespace else prefix
+            )
+        elif pattern.name:
+            yield prefix + pattern.name
+
+
+def url_names():
+    """Return every name ``record`` can be called with for the URLconf."""
+    return sorted(set(_view_names())) + [UNNAMED, UNRESOLVED]
+
+
+def record(name, stats):
+    """
+    Add the measures of a request to the histogram of URL name ``name``, one
+    of ``url_names()``.
+    """
+    total_ms = stats.total_time * 1000
+    bucket = next(
+        (i for i, bound in enumerate(BUCKETS) if total_ms <= bound), len(BUCKETS)
+    )
+    for field, value in (
+        ("total_us", stats.total_time * 1e6),
+        ("view_us", stats.view_time * 1e6),
+        ("db_us", stats.db_time * 1e6),
+        ("queries", stats.queries),
+        (f"bucket:{bucket}", 1),
+    ):
+        _incr(_key(name, field), round(value))
+
+
+def _quantile(buckets, count, q):
+    """Upper bound in milliseconds of the bucket holding quantile ``q``."""
+    seen = 0
+    for bound, n in zip(BUCKETS + (None,), buckets):
+        seen += n
+        if seen >= q * count:
+            return bound
+    return None
+
+
+def request_statistics():
+    """
+    Return the aggregated statistics per URL name: request count, mean
+    total, view and database times in milliseconds, mean query count,
+    median and 95th percentile (as histogram bucket bounds, ``None`` above
+    the last one) and the histogram itself.
+    """
+    names = url_names()
+    values = cache.get_many([_key(name, field) for name in names for field in FIELDS])
+    result = {}
+    for name in names:
+        value = {field: values.get(_key(name, field), 0) for field in FIELDS}
+        buckets = [value[f"bucket:{i}"] for i in range(len(BUCKETS) + 1)]
+        count = sum(buckets)
+        if not count:
+            continue
+        result[name] = {
+            "count": count,
+            "mean_ms": value["total_us"] / count / 1000,
+            "view_mean_ms": value["view_us"] / count / 1000,
+            "db_mean_ms": value["db_us"] / count / 1000,
+            "mean_queries": value["queries"] / count,
+            "p50_ms": _quantile(buckets, count, 0.5),
+            "p95_ms": _quantile(buckets, count, 0.95),
+            "histogram": {
+                (f"<={bound}" if bound is not None else f">{BUCKETS[-1]}"): n
+                for bound, n in zip(BUCKETS + (None,), buckets)
+            },
+        }
+    return result
+
+
+def reset():
+    cache.delete_many([_key(name, field) for name in url_names() for field in FIELDS])
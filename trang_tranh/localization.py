@@ -0,0 +1,77 @@
+"""
+Per-language titles and summaries of comics.
+
+A localized title or summary is the ``ComicTranslation`` of the comic in the
+active language, falling back to ``Comic.title``/``summary``. The resolver
+fetches the translations of a whole batch of comics in one query and caches
+them per (comic, language); the cache entries are dropped by the signal
+handlers in ``signals.py`` whenever a comic or one of its translations is
+saved or deleted.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language, get_supported_language_variant
+
+from .conf import get_setting
+from .models import ComicTranslation
+
+CACHE_PREFIX = "trang_tranh:comic-l10n:"
+
+# Cached for comics that have no translation in the language, so that they
+# are not looked up again.
+NO_TRANSLATION = ()
+
+
+def current_language():
+    """Return the active language as one of ``settings.LANGUAGES``."""
+    return get_supported_language_variant(get_language())
+
+
+def cache_key(comic_pk, language):
+    return f"{CACHE_PREFIX}{comic_pk}:{language}"
+
+
+def localize_comics(comics, language=None):
+    """
+    Set ``localized_title`` and ``localized_summary`` on every comic of
+    ``comics`` and return them as a list.
+
+    Cache misses are resolved with a single query for the whole batch.
+    """
+    comics = list(comics)
+    language = language or current_language()
+    keys = {
+        comic.pk: cache_key(comic.pk, language)
+        for comic in comics
+        if comic.default_language != language
+    }
+    cached = cache.get_many(keys.values())
+    resolved = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+    missing = [pk for pk in keys if pk not in resolved]
+    if missing:
+        found = {
+            comic_id: (title, summary)
+            for comic_id, title, summary in ComicTranslation.objects.filter(
+                comic__in=missing, language=language
+            ).values_list("comic_id", "translated_title", "translated_summary")
+        }
+        fetched = {pk: found.get(pk, NO_TRANSLATION) for pk in missing}
+        cache.set_many(
+            {keys[pk]: value for pk, value in fetched.items()},
+            get_setting("LOCALIZATION_CACHE_TIMEOUT"),
+        )
+        resolved.update(fetched)
+
+    for comic in comics:
+        translation = resolved.get(comic.pk) or (comic.title, comic.summary)
+        comic.localized_title, comic.localized_summary = translation
+    return comics
+
+
+def invalidate_comic(comic_pk, languages=None):
+    """Drop the cached translations of a comic."""
+    if languages is None:
+        languages = [code for code, _name in settings.LANGUAGES]
+    cache.delete_many([cache_key(comic_pk, language) for language in languages])
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from trang_tranh.metadata import backfill
+from trang_tranh.models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    Comic,
+    ComicChapter,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the dimensions, file size and placeholder of the covers and "
+        "page images saved before they were computed at upload."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Images read and decoded in parallel at a time",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recompute the metadata of every image",
+        )
+
+    def handle(self, *args, batch_size, force, **options):
+        for model in (Comic, ComicChapter, ChapterPage, ChapterPageTranslation):
+            for field_name in model.rendition_fields:
+                total = backfill(model, field_name, batch_size, force)
+                self.stdout.write(
+                    f"{model._meta.verbose_name} {field_name}: {total} images"
+                )
@@ -0,0 +1,116 @@
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from trang_tranh.benchmarks import suite
+from trang_tranh.benchmarks.dataset import DatasetSize, generate
+from trang_tranh.counters import read_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmarks on a throwaway database filled with a synthetic "
+        "dataset, print the results as JSON and compare them to a baseline."
+    )
+
+    def add_arguments(self, parser):
+        defaults = DatasetSize()
+        parser.add_argument("names", nargs="*", help="Benchmarks to run (all)")
+        parser.add_argument("--list", action="store_true", help="List benchmarks")
+        parser.add_argument("--comics", type=int, default=defaults.comics)
+        parser.add_argument("--chapters", type=int, default=defaults.chapters_per_comic)
+        parser.add_argument("--pages", type=int, default=defaults.pages_per_chapter)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--output", help="Write the results to this file")
+        parser.add_argument(
+            "--baseline",
+            nargs="?",
+            const=str(suite.BASELINE),
+            help="Fail on regressions against this results file "
+            "(the checked-in baseline without a value)",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed slowdown against the baseline, as a fraction",
+        )
+
+    def handle(self, *args, names, **options):
+        if options["list"]:
+            for name in suite.BENCHMARKS:
+                self.stdout.write(name)
+            return
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        size = DatasetSize(
+            comics=options["comics"],
+            chapters_per_comic=options["chapters"],
+            pages_per_chapter=options["pages"],
+        )
+        try:
+            results = {
+                "dataset": {**size.as_dict(), "seed": options["seed"]},
+                "environment": suite.environment(),
+                "benchmarks": self.run(size, options["seed"], names, options),
+            }
+        except KeyError as e:
+            raise CommandError(e.args[0])
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            if baseline["dataset"] != results["dataset"]:
+                raise CommandError(
+                    "The baseline was recorded with another dataset: "
+                    f"{baseline['dataset']}"
+                )
+            regressions = suite.compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stderr.write(self.style.SUCCESS("No regression"))
+
+    def run(self, size, seed, names, options):
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+                TRANG_TRANH_INSTRUMENTATION_SAMPLE_RATE=0,
+                TRANG_TRANH_WORKER_PROCESSES=0,
+            ):
+                counts = generate(size, seed=seed)
+                self.stderr.write(
+                    "Generated "
+                    + ", ".join(f"{n} {label}" for label, n in counts.items())
+                )
+                results = suite.run(names or None, repeat=options["repeat"])
+                # Reads counted by the reader benchmarks belong to this
+                # database, write them before it goes away.
+                read_counter.flush()
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
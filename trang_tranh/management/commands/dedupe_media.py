@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from trang_tranh.storage import ContentAddressedStorage, dedupe
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the existing media files into the content-addressed storage, "
+        "keeping a single copy of identical files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be moved and freed",
+        )
+
+    def handle(self, *args, dry_run, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError(
+                "The default storage is not a ContentAddressedStorage. Set the "
+                "default backend of STORAGES to "
+                "trang_tranh.storage.ContentAddressedStorage first."
+            )
+        stats = dedupe(dry_run=dry_run, log=self.stderr.write)
+        verb = "Would move" if dry_run else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {stats['files']} files into {stats['blobs']} new blobs, "
+                f"freeing {filesizeformat(stats['freed'])}"
+            )
+        )
+        if stats["missing"]:
+            self.stdout.write(
+                self.style.WARNING(f"{stats['missing']} files were missing")
+            )
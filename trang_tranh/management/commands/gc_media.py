@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from trang_tranh.cleanup import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the media files that no object refers to any more: replaced "
+        "or deleted images, blobs no object holds and their renditions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be deleted",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=float,
+            default=None,
+            metavar="HOURS",
+            help="Keep the files modified in the last HOURS hours "
+            "(TRANG_TRANH_MEDIA_GC_GRACE_PERIOD by default)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Files checked against the database at a time",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=None,
+            help="Directories collected in parallel (all of them by default)",
+        )
+
+    def handle(self, *args, dry_run, grace_period, batch_size, jobs, **options):
+        grace = None if grace_period is None else timedelta(hours=grace_period)
+        try:
+            default_storage.path("")
+        except NotImplementedError:
+            raise CommandError(
+                "Orphaned media can only be collected on a local file system"
+            )
+        results = collect_garbage(
+            dry_run=dry_run, grace=grace, batch_size=batch_size, jobs=jobs
+        )
+        verb = "Would delete" if dry_run else "Deleted"
+        for directory, stats in results.items():
+            if stats["skipped"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{directory}: skipped, some originals are not blobs yet "
+                        "(run dedupe_media first)"
+                    )
+                )
+                continue
+            self.stdout.write(
+                f"{directory}: {stats['files']} files, {verb.lower()} "
+                f"{stats['orphans']} ({filesizeformat(stats['freed'])}), "
+                f"{stats['recent']} too recent"
+            )
+        orphans = sum(stats["orphans"] for stats in results.values())
+        freed = sum(stats["freed"] for stats in results.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {orphans} orphaned files, reclaiming {filesizeformat(freed)}"
+            )
+        )
@@ -0,0 +1,59 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from trang_tranh.importers import import_chapter_archive, import_chapter_directory
+from trang_tranh.models import Comic, ComicTranslation
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a chapter from a CBZ/ZIP archive, or every archive of a "
+        "directory as consecutive chapters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archive or directory of archives")
+        parent = parser.add_mutually_exclusive_group(required=True)
+        parent.add_argument("--comic", type=int, help="Comic ID")
+        parent.add_argument("--translation", type=int, help="Comic translation ID")
+        parser.add_argument(
+            "--title", help="Chapter title (defaults to the archive name)"
+        )
+        parser.add_argument("--chapter-number", type=int)
+        parser.add_argument("--chapter-counter", type=int)
+        parser.add_argument(
+            "--extra", action="store_true", help="Import as extra chapters"
+        )
+
+    def handle(self, *args, path, **options):
+        if options["comic"] is not None:
+            model, pk = Comic, options["comic"]
+        else:
+            model, pk = ComicTranslation, options["translation"]
+        try:
+            parent = model.objects.get(pk=pk)
+        except model.DoesNotExist:
+            raise CommandError(f"{model._meta.verbose_name} {pk} does not exist")
+
+        fields = {"extra_chapter": options["extra"]}
+        for option in ("title", "chapter_number", "chapter_counter"):
+            if options[option] is not None:
+                fields[option] = options[option]
+
+        try:
+            if os.path.isdir(path):
+                if {"title", "chapter_number", "chapter_counter"} & fields.keys():
+                    raise CommandError(
+                        "--title, --chapter-number and --chapter-counter can "
+                        "only be used with a single archive"
+                    )
+                chapters = import_chapter_directory(path, parent, **fields)
+            else:
+                chapters = [import_chapter_archive(path, parent, **fields)]
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+
+        for chapter in chapters:
+            self.stdout.write(self.style.SUCCESS(f"Imported {chapter}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trang_tranh.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of comics, chapters and authors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        if not search_available():
+            raise CommandError("The search index requires SQLite with FTS5")
+        with transaction.atomic():
+            total = rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} documents"))
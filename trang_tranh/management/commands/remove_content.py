@@ -0,0 +1,62 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trang_tranh.models import (
+    Comic,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+)
+from trang_tranh.removal import remove
+
+MODELS = {
+    "comic": Comic,
+    "translation": ComicTranslation,
+    "chapter": ComicChapter,
+    "chapter-translation": ComicChapterTranslation,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove comics, comic translations or chapters with their chapters, "
+        "pages and image files, in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(MODELS))
+        parser.add_argument("pks", nargs="+", type=int, metavar="pk")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Rows deleted per transaction",
+        )
+
+    def handle(self, *args, model, pks, batch_size, **options):
+        model = MODELS[model]
+        objects = model._base_manager.in_bulk(pks)
+        missing = sorted(set(pks) - set(objects))
+        if missing:
+            raise CommandError(
+                f"No {model._meta.verbose_name} with ID "
+                + ", ".join(str(pk) for pk in missing)
+            )
+
+        def progress(deleted_model, count):
+            self.stdout.write(
+                f"  {count} {deleted_model._meta.verbose_name_plural} deleted"
+            )
+
+        for pk in dict.fromkeys(pks):
+            obj = objects[pk]
+            self.stdout.write(f"Removing {obj}")
+            deleted, futures = remove(obj, batch_size, progress)
+            wait(futures)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Removed {obj}: {sum(deleted.values())} rows, "
+                    f"{sum(future.result() for future in futures)} files released"
+                )
+            )
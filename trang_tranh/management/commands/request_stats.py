@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from trang_tranh.instrumentation import request_statistics, reset
+
+
+class Command(BaseCommand):
+    help = "Show the timings and query counts of the sampled requests per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Output JSON")
+        parser.add_argument(
+            "--reset", action="store_true", help="Clear the statistics afterwards"
+        )
+
+    def handle(self, *args, **options):
+        statistics = request_statistics()
+        if options["json"]:
+            self.stdout.write(json.dumps(statistics, indent=2, sort_keys=True))
+        elif not statistics:
+            self.stdout.write("No request was sampled yet.")
+        else:
+            self.stdout.write(
+                f"{'view':<50} {'count':>7} {'mean ms':>9} {'db ms':>8} "
+                f"{'queries':>8} {'p50 ms':>7} {'p95 ms':>7}"
+            )
+            rows = sorted(
+                statistics.items(),
+                key=lambda item: item[1]["mean_ms"] * item[1]["count"],
+                reverse=True,
+            )
+            for name, row in rows:
+                self.stdout.write(
+                    f"{name:<50} {row['count']:>7} {row['mean_ms']:>9.1f} "
+                    f"{row['db_mean_ms']:>8.1f} {row['mean_queries']:>8.1f} "
+                    f"{_bound(row['p50_ms']):>7} {_bound(row['p95_ms']):>7}"
+                )
+        if options["reset"]:
+            reset()
+
+
+def _bound(value):
+    return "-" if value is None else f"<={value}"
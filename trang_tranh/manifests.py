@@ -0,0 +1,125 @@
+"""
+Page manifests of chapters, for readers that prefetch their pages.
+
+The manifest of a chapter or translated chapter lists its pages in order,
+with the URL, dimensions (see ``metadata.py``) and file size of each, as
+rows of ``MANIFEST_COLUMNS`` to keep it small. The manifests of any number
+of chapters are built with one query per model and cached under the
+``modified_at`` of their chapter. As every page change bumps it (see
+``pages.touch_chapters``), a cached manifest is never stale and nothing has
+to be invalidated: ``touch_chapters`` builds the manifests of the changed
+chapters again once the change commits.
+
+The ``version`` of a manifest is a hash of its content. Manifests are also
+cached under their version, so that ``versioned_manifest`` can serve them at
+URLs whose content never changes, which clients cache as immutable.
+"""
+
+import json
+from collections import defaultdict
+from hashlib import sha256
+
+from django.core.cache import cache
+
+from .conf import get_setting
+from .models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    ComicChapter,
+    ComicChapterTranslation,
+)
+
+CACHE_PREFIX = "trang_tranh:manifest:"
+
+MANIFEST_COLUMNS = ["page", "url", "width", "height", "size"]
+
+
+def _options(model):
+    """Return the page model of a chapter model and its chapter field."""
+    if model is ComicChapter:
+        return ChapterPage, "chapter"
+    if model is ComicChapterTranslation:
+        return ChapterPageTranslation, "chapter_translation"
+    raise TypeError(f"{model.__name__} has no manifest")
+
+
+def cache_key(chapter):
+    return "%s%s:%s:%s" % (
+        CACHE_PREFIX,
+        chapter._meta.label_lower,
+        chapter.pk,
+        chapter.modified_at.timestamp(),
+    )
+
+
+def version_key(model, pk, version):
+    return f"{CACHE_PREFIX}{model._meta.label_lower}:{pk}:v{version}"
+
+
+def _build(model, chapter_ids):
+    """Return ``{chapter_id: manifest}`` for the ``model`` chapters ``chapter_ids``."""
+    page_model, chapter_field = _options(model)
+    storage = page_model._meta.get_field("page_image").storage
+    rows = defaultdict(list)
+    for chapter_id, number, name, width, height, size in (
+        page_model._base_manager.filter(**{f"{chapter_field}__in": chapter_ids})
+        .order_by(chapter_field, "page_number")
+        .values_list(
+            chapter_field,
+            "page_number",
+            "page_image",
+            "page_image_width",
+            "page_image_height",
+            "page_image_size",
+        )
+    ):
+        url = storage.url(name) if name else None
+        rows[chapter_id].append([number, url, width, height, size])
+
+    manifests = {}
+    for chapter_id in chapter_ids:
+        content = {"columns": MANIFEST_COLUMNS, "pages": rows[chapter_id]}
+        version = sha256(
+            json.dumps(content, separators=(",", ":")).encode()
+        ).hexdigest()[:32]
+        manifests[chapter_id] = {"version": version, **content}
+    return manifests
+
+
+def chapter_manifests(model, chapters):
+    """
+    Return the manifests of ``chapters``, instances of ``model`` with their
+    ``modified_at``, as ``{chapter.pk: manifest}``.
+
+    A manifest is a ``version`` and the ``pages`` of the chapter in order,
+    each a row of the ``columns`` (``MANIFEST_COLUMNS``). Cache misses are
+    built with a single query for the whole batch.
+    """
+    chapters = list(chapters)
+    keys = {chapter.pk: cache_key(chapter) for chapter in chapters}
+    cached = cache.get_many(keys.values())
+    manifests = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in manifests]
+    if missing:
+        built = _build(model, missing)
+        entries = {}
+        for pk, manifest in built.items():
+            entries[keys[pk]] = manifest
+            entries[version_key(model, pk, manifest["version"])] = manifest
+        cache.set_many(entries, get_setting("MANIFEST_CACHE_TIMEOUT"))
+        manifests.update(built)
+    return {chapter.pk: manifests[chapter.pk] for chapter in chapters}
+
+
+def versioned_manifest(model, pk, version):
+    """
+    Return the manifest ``version`` of the ``model`` chapter ``pk``, or
+    ``None`` if it is neither cached nor the current one of the chapter.
+    """
+    manifest = cache.get(version_key(model, pk, version))
+    if manifest is None:
+        chapter = model._base_manager.only("modified_at").filter(pk=pk).first()
+        if chapter is None:
+            return None
+        manifest = chapter_manifests(model, [chapter])[pk]
+    return manifest if manifest["version"] == version else None
@@ -0,0 +1,173 @@
+"""
+Serving of uploaded media in production.
+
+``django.conf.urls.static.static()`` only works with ``DEBUG`` and streams
+files through Python. ``serve_media`` answers conditional and byte range
+requests, sets long-lived caching headers on content-hashed files and either
+hands the open file to the WSGI server (which sends it with ``os.sendfile``
+when it provides a ``wsgi.file_wrapper`` such as gunicorn's), or only emits an
+``X-Accel-Redirect``/``X-Sendfile`` header so the front proxy sends the bytes.
+"""
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from .conf import get_setting
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+OFFLOAD_HEADERS = {
+    "x-accel-redirect": "X-Accel-Redirect",
+    "x-sendfile": "X-Sendfile",
+}
+
+
+class RangeFile:
+    """
+    Read-only view on ``length`` bytes of ``file`` starting at ``start``.
+
+    The underlying file is positioned at ``start`` and ``fileno()`` is
+    exposed, so a ``wsgi.file_wrapper`` can still ``sendfile()`` the range
+    using the response ``Content-Length``.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte positions (inclusive) requested by a
+    single-range ``Range`` header, ``None`` when the header should be
+    ignored, or ``False`` when the range can not be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges or other units: serve the whole file.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def is_content_hashed(path):
+    return re.search(get_setting("MEDIA_IMMUTABLE_PATTERN"), path) is not None
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(
+            request, path, fullpath, stat.st_size, etag, last_modified
+        )
+
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    if is_content_hashed(path):
+        patch_cache_control(
+            response, public=True, max_age=365 * 24 * 60 * 60, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=get_setting("MEDIA_MAX_AGE"))
+    return response
+
+
+def _file_response(request, path, fullpath, size, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    offload = get_setting("MEDIA_OFFLOAD")
+    if offload:
+        # The proxy reads the file itself and handles Range requests.
+        response = HttpResponse(content_type=content_type)
+        if offload == "x-accel-redirect":
+            target = get_setting("MEDIA_ACCEL_PREFIX") + path
+        else:
+            target = fullpath
+        response.headers[OFFLOAD_HEADERS[offload]] = target
+        return response
+
+    byte_range = None
+    if "Range" in request.headers and _if_range_passes(request, etag, last_modified):
+        byte_range = parse_range(request.headers["Range"], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(fullpath, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response.headers["Content-Length"] = end - start + 1
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _if_range_passes(request, etag, last_modified):
+    """Whether the ``If-Range`` validator, if any, still matches the file."""
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and if_range_date >= last_modified
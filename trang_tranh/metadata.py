@@ -0,0 +1,160 @@
+"""
+Dimensions, byte size and placeholders of covers and page images.
+
+Laying out a vertical reader without reflow needs the size of every page
+before it loads, and opening each image with Pillow on every request is far
+too slow. Every field listed in ``rendition_fields`` is therefore stored
+with four columns computed once, when a new file is saved (see
+``RenditionMixin.save`` and ``pages._bulk_create_pages``):
+``<field>_width`` and ``<field>_height`` as displayed (after EXIF rotation),
+``<field>_size`` in bytes and ``<field>_placeholder``, a blurry JPEG of at
+most ``PLACEHOLDER_SIZE`` pixels as a ``data:`` URI to show while the image
+loads. ``manage.py backfill_image_metadata`` fills them for existing images.
+"""
+
+import base64
+import io
+import logging
+
+from PIL import ExifTags, Image, ImageFilter, ImageOps
+
+from .conf import get_setting
+from .renditions import flatten
+from .workers import pool_map
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_QUALITY = 40
+
+# Images read and decoded at a time, which bounds the image bytes held in
+# memory while a large upload or archive is imported.
+PARALLEL_IMAGES = 16
+
+
+def metadata_fields(field_name):
+    """Return the names of the metadata fields of image field ``field_name``."""
+    return [
+        f"{field_name}_{suffix}"
+        for suffix in ("width", "height", "size", "placeholder")
+    ]
+
+
+def read_metadata(data, placeholder_size):
+    """
+    Return the ``(width, height, placeholder)`` of image ``data``, or
+    ``None`` when it can not be decoded.
+
+    Runs in a worker process, so it only deals with bytes.
+    """
+    box = (placeholder_size, placeholder_size)
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            width, height = original.size
+            if original.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                width, height = height, width
+            # Let JPEG decode at a fraction of its size.
+            original.draft("RGB", box)
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail(box)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    image = flatten(image, keep_alpha=False).convert("RGB")
+    image = image.filter(ImageFilter.GaussianBlur(0.5))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=PLACEHOLDER_QUALITY)
+    placeholder = "data:image/jpeg;base64," + base64.b64encode(
+        output.getvalue()
+    ).decode("ascii")
+    return width, height, placeholder
+
+
+def _read(fieldfile):
+    """Return the bytes of a saved or a not yet saved ``fieldfile``."""
+    if not fieldfile._committed:
+        file = fieldfile.file
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        return data
+    with fieldfile.storage.open(fieldfile.name, "rb") as f:
+        return f.read()
+
+
+def set_image_metadata(instances, field_names):
+    """
+    Compute the metadata of the ``field_names`` images of ``instances`` in
+    parallel and set it on the instances, without saving them.
+
+    Empty fields get empty metadata. Images that can not be read or decoded
+    are logged and also get empty metadata. Return the number of images
+    whose metadata was set.
+    """
+    images = []
+    for instance in instances:
+        for field_name in field_names:
+            fieldfile = getattr(instance, field_name)
+            fields = metadata_fields(field_name)
+            _assign(instance, fields, (None, None, None, ""))
+            if fieldfile:
+                images.append((instance, fields, fieldfile))
+
+    size = get_setting("PLACEHOLDER_SIZE")
+    done = 0
+    for start in range(0, len(images), PARALLEL_IMAGES):
+        jobs = []
+        for instance, fields, fieldfile in images[start : start + PARALLEL_IMAGES]:
+            try:
+                data = _read(fieldfile)
+            except OSError:
+                logger.warning("Can not read %s", fieldfile.name)
+                continue
+            jobs.append((instance, fields, fieldfile.name, data))
+        results = pool_map(read_metadata, [job[3] for job in jobs], [size] * len(jobs))
+        for (instance, fields, name, data), result in zip(jobs, results):
+            if result is None:
+                logger.warning("Can not decode %s", name)
+                continue
+            width, height, placeholder = result
+            _assign(instance, fields, (width, height, len(data), placeholder))
+            done += 1
+    return done
+
+
+def _assign(instance, fields, values):
+    for field, value in zip(fields, values):
+        setattr(instance, field, value)
+
+
+def new_image_fields(instance):
+    """Return the image fields of ``instance`` holding a file not saved yet."""
+    return [
+        field_name
+        for field_name in instance.rendition_fields
+        if getattr(instance, field_name)
+        and not getattr(instance, field_name)._committed
+    ]
+
+
+def backfill(model, field_name, batch_size=50, force=False):
+    """
+    Compute the missing metadata of the ``field_name`` images of ``model``
+    (or all of it with ``force``), ``batch_size`` images at a time spread
+    over the process pool. Return the number of images processed.
+    """
+    fields = metadata_fields(field_name)
+    queryset = model._base_manager.exclude(**{field_name: ""}).exclude(
+        **{f"{field_name}__isnull": True}
+    )
+    if not force:
+        queryset = queryset.filter(**{f"{fields[0]}__isnull": True})
+    queryset = queryset.only("pk", field_name).order_by("pk")
+    total, last_pk = 0, None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return total
+        set_image_metadata(batch, [field_name])
+        model._base_manager.bulk_update(batch, fields)
+        total += len(batch)
+        last_pk = batch[-1].pk
@@ -0,0 +1,75 @@
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import empty
+
+from .instrumentation import UNNAMED, UNRESOLVED, finish_request, record, start_request
+
+
+class InstrumentationMiddleware:
+    """
+    Measure a sample of the requests: total, view and database time, query
+    count and slowest statements. The measures are sent in a
+    ``Server-Timing`` header (with the SQL of the slowest statements for
+    staff users only, on views that load the user) and added to the
+    statistics of the view's URL name in the cache, which only cover every
+    process when the cache is shared (see ``instrumentation.py``).
+
+    Place it first in ``MIDDLEWARE`` so that the total covers the other
+    middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_request()
+        if stats is None:
+            return self.get_response(request)
+        request._request_stats = stats
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(stats, token)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = start_request()
+        if stats is None:
+            return await self.get_response(request)
+        request._request_stats = stats
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(stats, token)
+        return self.report(request, response, stats)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = getattr(request, "_request_stats", None)
+        if stats is not None:
+            stats.view_started = perf_counter()
+
+    def report(self, request, response, stats):
+        # Only look at a user the request already loaded: loading it here
+        # would add session and user queries to every sampled request.
+        user = getattr(request, "user", None)
+        include_sql = (
+            user is not None
+            and getattr(user, "_wrapped", user) is not empty
+            and user.is_staff
+        )
+        response.headers["Server-Timing"] = stats.server_timing(include_sql)
+        match = request.resolver_match
+        if match is None:
+            name = UNRESOLVED
+        else:
+            name = match.view_name if match.url_name else UNNAMED
+        record(name, stats)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trang_tranh', '0003_comictranslation_unique_comic_translation_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comicchapter',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change to the chapter or any of its pages', verbose_name='modified at'),
+        ),
+        migrations.AddField(
+            model_name='comicchaptertranslation',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change to the chapter or any of its pages', verbose_name='modified at'),
+        ),
+    ]
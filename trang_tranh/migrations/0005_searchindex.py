@@ -0,0 +1,70 @@
+from django.db import migrations
+
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE trang_tranh_searchindex USING fts5(
+    comic_id UNINDEXED,
+    language UNINDEXED,
+    title,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# The rowid of a document is (primary key << 3) | kind code, see
+# trang_tranh.search.KINDS.
+POPULATE_INDEX = [
+    """
+    INSERT INTO trang_tranh_searchindex (rowid, comic_id, language, title, body)
+    SELECT (id << 3) | 0, id, default_language, title, summary
+    FROM trang_tranh_comic
+    """,
+    """
+    INSERT INTO trang_tranh_searchindex (rowid, comic_id, language, title, body)
+    SELECT (id << 3) | 1, comic_id, language, translated_title, translated_summary
+    FROM trang_tranh_comictranslation
+    """,
+    """
+    INSERT INTO trang_tranh_searchindex (rowid, comic_id, language, title, body)
+    SELECT (chapter.id << 3) | 2, chapter.comic_id, comic.default_language,
+           chapter.title, ''
+    FROM trang_tranh_comicchapter chapter
+    JOIN trang_tranh_comic comic ON comic.id = chapter.comic_id
+    """,
+    """
+    INSERT INTO trang_tranh_searchindex (rowid, comic_id, language, title, body)
+    SELECT (chapter.id << 3) | 3, translation.comic_id, translation.language,
+           chapter.translated_title, ''
+    FROM trang_tranh_comicchaptertranslation chapter
+    JOIN trang_tranh_comictranslation translation
+        ON translation.id = chapter.comic_translation_id
+    """,
+    """
+    INSERT INTO trang_tranh_searchindex (rowid, comic_id, language, title, body)
+    SELECT (id << 3) | 4, NULL, '', pen_name, ''
+    FROM trang_tranh_comicauthor
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_INDEX)
+    for sql in POPULATE_INDEX:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE trang_tranh_searchindex")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0004_chapter_modified_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
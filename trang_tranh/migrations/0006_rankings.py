@@ -0,0 +1,116 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0005_searchindex"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ComicReadBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        choices=[("en", "English"), ("vi", "Vietnamese")],
+                        max_length=10,
+                        verbose_name="language",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="day")),
+                ("reads", models.PositiveIntegerField(default=0, verbose_name="reads")),
+                (
+                    "comic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comic",
+                        verbose_name="comic",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ComicTrend",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        blank=True,
+                        help_text="Empty for the ranking across all languages",
+                        max_length=10,
+                        verbose_name="language",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("d", "Daily"), ("w", "Weekly"), ("a", "All time")],
+                        max_length=1,
+                        verbose_name="ranking period",
+                    ),
+                ),
+                (
+                    "score",
+                    models.FloatField(
+                        help_text="Logarithm of the decayed read count, scaled to a fixed epoch",
+                        verbose_name="score",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+                (
+                    "comic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comic",
+                        verbose_name="comic",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["period", "language", "-score"],
+                        name="comic_trend_rank_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="comictrend",
+            constraint=models.UniqueConstraint(
+                fields=("comic", "language", "period"), name="unique_comic_trend"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="comicreadbucket",
+            constraint=models.UniqueConstraint(
+                fields=("comic", "language", "day"), name="unique_comic_read_bucket"
+            ),
+        ),
+    ]
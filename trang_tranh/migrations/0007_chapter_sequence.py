@@ -0,0 +1,75 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0006_rankings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChapterSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "next_counter",
+                    models.PositiveIntegerField(
+                        default=1, verbose_name="next chapter counter"
+                    ),
+                ),
+                (
+                    "next_number",
+                    models.PositiveIntegerField(
+                        default=1, verbose_name="next chapter number"
+                    ),
+                ),
+                (
+                    "comic",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comic",
+                        verbose_name="comic",
+                    ),
+                ),
+                (
+                    "comic_translation",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comictranslation",
+                        verbose_name="comic translation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="chaptersequence",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(
+                        ("comic__isnull", True), ("comic_translation__isnull", False)
+                    ),
+                    models.Q(
+                        ("comic__isnull", False), ("comic_translation__isnull", True)
+                    ),
+                    _connector="OR",
+                ),
+                name="chapter_sequence_has_one_parent",
+            ),
+        ),
+    ]
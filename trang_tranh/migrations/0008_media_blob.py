@@ -0,0 +1,47 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0007_chapter_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="SHA-256 digest"
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="storage name")),
+                ("size", models.PositiveBigIntegerField(verbose_name="size in bytes")),
+                (
+                    "references",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of saves that returned this file",
+                        verbose_name="references",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created at"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,220 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0008_media_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chapterpage",
+            name="page_image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="page image height"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpage",
+            name="page_image_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="page image placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpage",
+            name="page_image_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="page image file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpage",
+            name="page_image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="page image width"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpagetranslation",
+            name="page_image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="page image height"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpagetranslation",
+            name="page_image_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="page image placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpagetranslation",
+            name="page_image_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="page image file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chapterpagetranslation",
+            name="page_image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="page image width"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="horizontal_cover_height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="horizontal cover height",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="horizontal_cover_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="horizontal cover placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="horizontal_cover_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="horizontal cover file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="horizontal_cover_width",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="horizontal cover width",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="square_cover_height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="square cover height",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="square_cover_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="square cover placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="square_cover_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="square cover file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="square_cover_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="square cover width"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="vertical_cover_height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="vertical cover height",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="vertical_cover_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="vertical cover placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="vertical_cover_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="vertical cover file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comic",
+            name="vertical_cover_width",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="vertical cover width",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comicchapter",
+            name="cover_height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="chapter cover height",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comicchapter",
+            name="cover_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="chapter cover placeholder"
+            ),
+        ),
+        migrations.AddField(
+            model_name="comicchapter",
+            name="cover_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="chapter cover file size",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comicchapter",
+            name="cover_width",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="chapter cover width",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0009_image_metadata"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comic",
+            index=models.Index(
+                fields=["-published_date", "-id"], name="comic_published_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comic",
+            index=models.Index(
+                fields=["-read_count", "-id"], name="comic_read_count_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_from_comic_buckets(apps, schema_editor):
+    """Credit the reads recorded so far to the current publisher of each comic."""
+    ComicReadBucket = apps.get_model("trang_tranh", "ComicReadBucket")
+    PublisherReadBucket = apps.get_model("trang_tranh", "PublisherReadBucket")
+    buckets = ComicReadBucket.objects.values_list(
+        "comic_id", "comic__publisher_id", "language", "day", "reads"
+    ).order_by("pk")
+    PublisherReadBucket.objects.bulk_create(
+        (
+            PublisherReadBucket(
+                publisher_id=publisher_id,
+                comic_id=comic_id,
+                language=language,
+                day=day,
+                reads=reads,
+            )
+            for comic_id, publisher_id, language, day, reads in buckets.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0010_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PublisherReadBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "language",
+                    models.CharField(
+                        choices=[("en", "English"), ("vi", "Vietnamese")],
+                        max_length=10,
+                        verbose_name="language",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="day")),
+                ("reads", models.PositiveIntegerField(default=0, verbose_name="reads")),
+                (
+                    "comic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comic",
+                        verbose_name="comic",
+                    ),
+                ),
+                (
+                    "publisher",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.userprofile",
+                        verbose_name="publisher",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="publisherreadbucket",
+            constraint=models.UniqueConstraint(
+                fields=("publisher", "day", "comic", "language"),
+                name="unique_publisher_read_bucket",
+            ),
+        ),
+        migrations.RunPython(seed_from_comic_buckets, migrations.RunPython.noop),
+    ]
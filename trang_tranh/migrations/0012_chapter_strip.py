@@ -0,0 +1,99 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trang_tranh", "0011_publisher_read_bucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comic",
+            name="stitch_pages",
+            field=models.BooleanField(
+                default=False,
+                help_text="Serve the chapters of this vertical-scroll comic as a few tall strips instead of one image per page",
+                verbose_name="stitch pages into strips",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ChapterStrip",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "version",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Hash of the pages and of the strip settings",
+                        max_length=64,
+                        verbose_name="version",
+                    ),
+                ),
+                (
+                    "chapter_modified_at",
+                    models.DateTimeField(
+                        help_text="Modification time of the chapter the strips were made for",
+                        verbose_name="chapter modified at",
+                    ),
+                ),
+                ("width", models.PositiveIntegerField(verbose_name="width")),
+                (
+                    "segments",
+                    models.JSONField(
+                        default=list,
+                        help_text="Storage name and height of each strip, with the page number, offset and height of its pages",
+                        verbose_name="segments",
+                    ),
+                ),
+                (
+                    "chapter",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comicchapter",
+                        verbose_name="comic chapter",
+                    ),
+                ),
+                (
+                    "chapter_translation",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="trang_tranh.comicchaptertranslation",
+                        verbose_name="comic chapter translation",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="chapterstrip",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(
+                        ("chapter__isnull", True),
+                        ("chapter_translation__isnull", False),
+                    ),
+                    models.Q(
+                        ("chapter__isnull", False),
+                        ("chapter_translation__isnull", True),
+                    ),
+                    _connector="OR",
+                ),
+                name="chapter_strip_has_one_chapter",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trang_tranh', '0012_chapter_strip'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comictranslation',
+            name='language',
+            field=models.CharField(choices=[('en', 'English'), ('vi', 'Vietnamese')], default='en', max_length=10, verbose_name='translation language'),
+        ),
+    ]
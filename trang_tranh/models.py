@@ -4,13 +4,44 @@ from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.db.models import CheckConstraint
-from django.db.models.functions import Lower
-from django.db.models import Q
+from django.db.models.functions import Coalesce, Lower
+from django.db.models import OuterRef, Q, Subquery
 from django.db.models import UniqueConstraint
 from django.core.exceptions import ValidationError
+
+from .metadata import metadata_fields, new_image_fields, set_image_metadata
+from .renditions import rendition_url
 # Create your models here.
 
 
+class RenditionMixin:
+    """
+    Give access to the resized renditions of the image fields listed in
+    ``rendition_fields`` and store their dimensions, size and placeholder
+    (see ``metadata.py``) when a new image is saved.
+    """
+
+    rendition_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # Dimensions and placeholders of new images are computed once, here.
+        fields = new_image_fields(self)
+        if update_fields is not None:
+            fields = [field for field in fields if field in update_fields]
+            update_fields = set(update_fields).union(
+                *(metadata_fields(field) for field in fields)
+            )
+        if fields:
+            set_image_metadata([self], fields)
+        return super().save(*args, update_fields=update_fields, **kwargs)
+
+    def rendition_url(self, field_name, size="thumb", fmt=None):
+        """Return the URL of the ``size`` rendition of ``field_name``."""
+        if field_name not in self.rendition_fields:
+            raise ValueError(f"{field_name!r} has no renditions")
+        return rendition_url(getattr(self, field_name), size, fmt)
+
+
 class User(AbstractUser):
     pass
 
@@ -34,11 +65,33 @@ class UserProfile(models.Model):
         return self.name
 
 
-class Comic(models.Model):
+class ComicQuerySet(models.QuerySet):
+    def localized(self, language):
+        """
+        Annotate ``localized_title`` and ``localized_summary`` in
+        ``language``, falling back to the comic's own title and summary when
+        there is no translation.
+        """
+        translations = ComicTranslation.objects.filter(
+            comic=OuterRef("pk"), language=language
+        )
+        return self.annotate(
+            localized_title=Coalesce(
+                Subquery(translations.values("translated_title")[:1]), "title"
+            ),
+            localized_summary=Coalesce(
+                Subquery(translations.values("translated_summary")[:1]), "summary"
+            ),
+        )
+
+
+class Comic(RenditionMixin, models.Model):
     """
     Model representing a comic series.
     """
 
+    objects = ComicQuerySet.as_manager()
+
     title = models.CharField(max_length=200, help_text=_("Enter a comic title"))
 
     vertical_cover = models.ImageField(
@@ -67,6 +120,54 @@ class Comic(models.Model):
         null=True,
     )
 
+    vertical_cover_width = models.PositiveIntegerField(
+        _("vertical cover width"), blank=True, null=True, editable=False
+    )
+
+    vertical_cover_height = models.PositiveIntegerField(
+        _("vertical cover height"), blank=True, null=True, editable=False
+    )
+
+    vertical_cover_size = models.PositiveIntegerField(
+        _("vertical cover file size"), blank=True, null=True, editable=False
+    )
+
+    vertical_cover_placeholder = models.TextField(
+        _("vertical cover placeholder"), blank=True, editable=False
+    )
+
+    horizontal_cover_width = models.PositiveIntegerField(
+        _("horizontal cover width"), blank=True, null=True, editable=False
+    )
+
+    horizontal_cover_height = models.PositiveIntegerField(
+        _("horizontal cover height"), blank=True, null=True, editable=False
+    )
+
+    horizontal_cover_size = models.PositiveIntegerField(
+        _("horizontal cover file size"), blank=True, null=True, editable=False
+    )
+
+    horizontal_cover_placeholder = models.TextField(
+        _("horizontal cover placeholder"), blank=True, editable=False
+    )
+
+    square_cover_width = models.PositiveIntegerField(
+        _("square cover width"), blank=True, null=True, editable=False
+    )
+
+    square_cover_height = models.PositiveIntegerField(
+        _("square cover height"), blank=True, null=True, editable=False
+    )
+
+    square_cover_size = models.PositiveIntegerField(
+        _("square cover file size"), blank=True, null=True, editable=False
+    )
+
+    square_cover_placeholder = models.TextField(
+        _("square cover placeholder"), blank=True, editable=False
+    )
+
     author = models.ManyToManyField("ComicAuthor", verbose_name=_("comic author"))
 
     read_count = models.PositiveIntegerField(_("read count"), default=0, editable=False)
@@ -115,6 +216,17 @@ class Comic(models.Model):
         help_text=_("Serializing status"),
     )
 
+    stitch_pages = models.BooleanField(
+        _("stitch pages into strips"),
+        default=False,
+        help_text=_(
+            "Serve the chapters of this vertical-scroll comic as a few tall "
+            "strips instead of one image per page"
+        ),
+    )
+
+    rendition_fields = ("vertical_cover", "horizontal_cover", "square_cover")
+
     def __str__(self):
         """String for representing the comic"""
         return f"{self.title} - {self.publisher}"
@@ -127,16 +239,33 @@ class Comic(models.Model):
         return ", ".join(author.pen_name for author in self.author.all()[:3])
 
     display_author.short_description = "Author"
+    display_author.admin_order_field = "first_author"
 
     def display_total_chapter(self):
+        """
+        Return the number of chapters, using the ``chapter_total`` annotation
+        when the comic was fetched with one.
+        """
+        if hasattr(self, "chapter_total"):
+            return self.chapter_total
         return self.comicchapter_set.all().count()
 
     display_total_chapter.short_description = "Total chapter"
+    display_total_chapter.admin_order_field = "chapter_total"
 
     def get_absolute_url(self):
         """Returns the URL to access a detail record for this comic series."""
         return reverse("comic-detail", kwargs={"pk": self.pk})
 
+    class Meta:
+        # Keyset pagination indexes of the catalog orders.
+        indexes = [
+            models.Index(
+                fields=["-published_date", "-id"], name="comic_published_idx"
+            ),
+            models.Index(fields=["-read_count", "-id"], name="comic_read_count_idx"),
+        ]
+
 
 class ComicAuthor(models.Model):
     pen_name = models.CharField(
@@ -180,6 +309,10 @@ class ComicTranslation(models.Model):
         """String for representing the comic translation"""
         return f"{self.language} - {self.comic}"
 
+    def get_absolute_url(self):
+        """Returns the URL to access the chapter list of this translation."""
+        return reverse("comic-translation-detail", kwargs={"pk": self.pk})
+
     def clean(self):
         if self.language == self.comic.default_language:
             raise ValidationError(
@@ -203,7 +336,7 @@ class ComicTranslation(models.Model):
         ]
 
 
-class ComicChapter(models.Model):
+class ComicChapter(RenditionMixin, models.Model):
     """
     Model representing a comic chapter.
     """
@@ -219,6 +352,22 @@ class ComicChapter(models.Model):
         width_field=None,
         max_length=None,
     )
+
+    cover_width = models.PositiveIntegerField(
+        _("chapter cover width"), blank=True, null=True, editable=False
+    )
+
+    cover_height = models.PositiveIntegerField(
+        _("chapter cover height"), blank=True, null=True, editable=False
+    )
+
+    cover_size = models.PositiveIntegerField(
+        _("chapter cover file size"), blank=True, null=True, editable=False
+    )
+
+    cover_placeholder = models.TextField(
+        _("chapter cover placeholder"), blank=True, editable=False
+    )
     title = models.CharField(_("chapter title"), max_length=200)
 
     chapter_number = models.PositiveSmallIntegerField(
@@ -238,10 +387,25 @@ class ComicChapter(models.Model):
         _("published date"), auto_now=False, auto_now_add=True
     )
 
+    modified_at = models.DateTimeField(
+        _("modified at"),
+        auto_now=True,
+        help_text=_("Last change to the chapter or any of its pages"),
+    )
+
+    rendition_fields = ("cover",)
+
     def __str__(self):
         """String for representing a comic chapter"""
         return _("Chapter ") + f"{self.chapter_number} - {self.comic}"
 
+    def get_absolute_url(self):
+        """Returns the URL to read this chapter."""
+        return reverse(
+            "chapter-reader",
+            kwargs={"pk": self.comic_id, "chapter_counter": self.chapter_counter},
+        )
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -292,9 +456,25 @@ class ComicChapterTranslation(models.Model):
 
     extra_chapter = models.BooleanField(_("extra chapter"), default=False)
 
+    modified_at = models.DateTimeField(
+        _("modified at"),
+        auto_now=True,
+        help_text=_("Last change to the chapter or any of its pages"),
+    )
+
     def __str__(self):
         return _("Chapter ") + f"{self.chapter_number} - {self.comic_translation}"
 
+    def get_absolute_url(self):
+        """Returns the URL to read this chapter translation."""
+        return reverse(
+            "chapter-translation-reader",
+            kwargs={
+                "pk": self.comic_translation_id,
+                "chapter_counter": self.chapter_counter,
+            },
+        )
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -312,7 +492,7 @@ class ComicChapterTranslation(models.Model):
         ]
 
 
-class ChapterPage(models.Model):
+class ChapterPage(RenditionMixin, models.Model):
     """Model representing the default language chapter page"""
 
     chapter = models.ForeignKey(
@@ -327,12 +507,31 @@ class ChapterPage(models.Model):
         max_length=None,
     )
 
+    page_image_width = models.PositiveIntegerField(
+        _("page image width"), blank=True, null=True, editable=False
+    )
+
+    page_image_height = models.PositiveIntegerField(
+        _("page image height"), blank=True, null=True, editable=False
+    )
+
+    page_image_size = models.PositiveIntegerField(
+        _("page image file size"), blank=True, null=True, editable=False
+    )
+
+    page_image_placeholder = models.TextField(
+        _("page image placeholder"), blank=True, editable=False
+    )
+
     page_number = models.PositiveSmallIntegerField(_("page number"), default=1)
 
+    rendition_fields = ("page_image",)
+
     def display_chapter_counter(self):
         return self.chapter.chapter_counter
 
     display_chapter_counter.short_description = "Chapter counter"
+    display_chapter_counter.admin_order_field = "chapter__chapter_counter"
 
     def __str__(self):
         return _("Page ") + f"{self.page_number} - {self.chapter}"
@@ -360,7 +559,7 @@ class ChapterPage(models.Model):
         return super().save(*args, **kwargs)
 
 
-class ChapterPageTranslation(models.Model):
+class ChapterPageTranslation(RenditionMixin, models.Model):
     """Model representing a chapter page translation"""
 
     chapter_translation = models.ForeignKey(
@@ -377,8 +576,26 @@ class ChapterPageTranslation(models.Model):
         max_length=None,
     )
 
+    page_image_width = models.PositiveIntegerField(
+        _("page image width"), blank=True, null=True, editable=False
+    )
+
+    page_image_height = models.PositiveIntegerField(
+        _("page image height"), blank=True, null=True, editable=False
+    )
+
+    page_image_size = models.PositiveIntegerField(
+        _("page image file size"), blank=True, null=True, editable=False
+    )
+
+    page_image_placeholder = models.TextField(
+        _("page image placeholder"), blank=True, editable=False
+    )
+
     page_number = models.PositiveSmallIntegerField(_("page number"), default=1)
 
+    rendition_fields = ("page_image",)
+
     def __str__(self):
         return _("Page ") + f"{self.page_number} - {self.chapter_translation}"
 
@@ -404,3 +621,235 @@ class ChapterPageTranslation(models.Model):
         self.full_clean()
         return super().save(*args, **kwargs)
 
+
+class ComicReadBucket(models.Model):
+    """Model representing the reads of a comic in one language during one day"""
+
+    comic = models.ForeignKey(
+        "Comic", verbose_name=_("comic"), on_delete=models.CASCADE
+    )
+
+    language = models.CharField(
+        _("language"), max_length=10, choices=settings.LANGUAGES
+    )
+
+    day = models.DateField(_("day"))
+
+    reads = models.PositiveIntegerField(_("reads"), default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.language} - {self.comic}"
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=["comic", "language", "day"],
+                name="unique_comic_read_bucket",
+            )
+        ]
+
+
+class PublisherReadBucket(models.Model):
+    """
+    Model representing the reads of a publisher's comic in one language
+    during one day
+    """
+
+    publisher = models.ForeignKey(
+        "UserProfile", verbose_name=_("publisher"), on_delete=models.CASCADE
+    )
+
+    comic = models.ForeignKey(
+        "Comic", verbose_name=_("comic"), on_delete=models.CASCADE
+    )
+
+    language = models.CharField(
+        _("language"), max_length=10, choices=settings.LANGUAGES
+    )
+
+    day = models.DateField(_("day"))
+
+    reads = models.PositiveIntegerField(_("reads"), default=0)
+
+    def __str__(self):
+        return f"{self.publisher} - {self.day} - {self.language} - {self.comic}"
+
+    class Meta:
+        # Publisher and day lead, so that the index of the constraint is the
+        # one the dashboard range scans.
+        constraints = [
+            UniqueConstraint(
+                fields=["publisher", "day", "comic", "language"],
+                name="unique_publisher_read_bucket",
+            )
+        ]
+
+
+class ComicTrend(models.Model):
+    """
+    Model representing the time-decayed popularity of a comic in one
+    language (or all of them) over one ranking period.
+    """
+
+    PERIODS = (
+        ("d", _("Daily")),
+        ("w", _("Weekly")),
+        ("a", _("All time")),
+    )
+
+    comic = models.ForeignKey(
+        "Comic", verbose_name=_("comic"), on_delete=models.CASCADE
+    )
+
+    language = models.CharField(
+        _("language"),
+        max_length=10,
+        blank=True,
+        help_text=_("Empty for the ranking across all languages"),
+    )
+
+    period = models.CharField(_("ranking period"), max_length=1, choices=PERIODS)
+
+    score = models.FloatField(
+        _("score"),
+        help_text=_("Logarithm of the decayed read count, scaled to a fixed epoch"),
+    )
+
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_period_display()} - {self.language} - {self.comic}"
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=["comic", "language", "period"],
+                name="unique_comic_trend",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["period", "language", "-score"], name="comic_trend_rank_idx"
+            )
+        ]
+
+
+class ChapterSequence(models.Model):
+    """
+    Model representing the next chapter counter and chapter number to hand
+    out for a comic or a comic translation
+    """
+
+    comic = models.OneToOneField(
+        "Comic",
+        verbose_name=_("comic"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+
+    comic_translation = models.OneToOneField(
+        "ComicTranslation",
+        verbose_name=_("comic translation"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+
+    next_counter = models.PositiveIntegerField(_("next chapter counter"), default=1)
+
+    next_number = models.PositiveIntegerField(_("next chapter number"), default=1)
+
+    def __str__(self):
+        return f"{self.comic or self.comic_translation}: {self.next_counter}"
+
+    class Meta:
+        constraints = [
+            CheckConstraint(
+                check=(Q(comic__isnull=True) & Q(comic_translation__isnull=False))
+                | (Q(comic__isnull=False) & Q(comic_translation__isnull=True)),
+                name="chapter_sequence_has_one_parent",
+            ),
+        ]
+
+
+class MediaBlob(models.Model):
+    """
+    Model representing a file of the content-addressed storage, shared by
+    every upload of the same content
+    """
+
+    digest = models.CharField(_("SHA-256 digest"), max_length=64, unique=True)
+
+    name = models.CharField(_("storage name"), max_length=100)
+
+    size = models.PositiveBigIntegerField(_("size in bytes"))
+
+    references = models.PositiveIntegerField(
+        _("references"),
+        default=0,
+        help_text=_("Number of saves that returned this file"),
+    )
+
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ChapterStrip(models.Model):
+    """
+    Model representing the vertical strips stitched from the pages of a
+    chapter or a translated chapter
+    """
+
+    chapter = models.OneToOneField(
+        "ComicChapter",
+        verbose_name=_("comic chapter"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+
+    chapter_translation = models.OneToOneField(
+        "ComicChapterTranslation",
+        verbose_name=_("comic chapter translation"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+
+    version = models.CharField(
+        _("version"),
+        max_length=64,
+        db_index=True,
+        help_text=_("Hash of the pages and of the strip settings"),
+    )
+
+    chapter_modified_at = models.DateTimeField(
+        _("chapter modified at"),
+        help_text=_("Modification time of the chapter the strips were made for"),
+    )
+
+    width = models.PositiveIntegerField(_("width"))
+
+    segments = models.JSONField(
+        _("segments"),
+        default=list,
+        help_text=_(
+            "Storage name and height of each strip, with the page number, "
+            "offset and height of its pages"
+        ),
+    )
+
+    def __str__(self):
+        return f"{self.chapter or self.chapter_translation}: {len(self.segments)}"
+
+    class Meta:
+        constraints = [
+            CheckConstraint(
+                check=(Q(chapter__isnull=True) & Q(chapter_translation__isnull=False))
+                | (Q(chapter__isnull=False) & Q(chapter_translation__isnull=True)),
+                name="chapter_strip_has_one_chapter",
+            ),
+        ]
@@ -0,0 +1,321 @@
+"""
+Chapter-level operations on ``ChapterPage`` and ``ChapterPageTranslation``.
+
+``ChapterPage.save()`` runs ``full_clean()``, and ``clean()`` counts the
+chapter's pages every time, so adding pages one by one costs a couple of
+queries and a transaction per page. The functions here check the page
+sequence of a whole chapter once and write all rows together.
+
+Inserting, deleting and moving pages renumber every affected page with two
+set-based ``UPDATE`` statements (see ``_renumber``) rather than saving each
+row, whatever the number of pages. Every operation starts by touching the
+chapter, which takes its row lock (the write lock on SQLite), so concurrent
+operations on the same chapter run one after the other.
+"""
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    Max,
+    PositiveSmallIntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    ComicChapter,
+    ComicChapterTranslation,
+)
+from .coverage import invalidate_chapters
+from .manifests import chapter_manifests
+from .metadata import set_image_metadata
+from .renditions import schedule_renditions
+from .storage import release_blobs
+from .strips import schedule_stitching, with_stitch_pages
+
+# While renumbering, pages are first lifted above this offset so that no
+# intermediate number collides with another page on the unique constraint.
+# Lifted numbers still fit in a PositiveSmallIntegerField.
+RENUMBER_OFFSET = 16384
+
+
+def natural_sort_key(name):
+    """Sort key that orders ``page2.png`` before ``page10.png``."""
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", str(name))
+    ]
+
+
+def touch_chapters(model, pks):
+    """
+    Bump ``modified_at`` of the ``model`` chapters in ``pks`` after their
+    pages changed, so cached and conditional responses are invalidated, drop
+    the cached translation coverage of their comics, and build their page
+    manifests and stitch their strips again once the transaction commits.
+    """
+    model._base_manager.filter(pk__in=pks).update(modified_at=timezone.now())
+    invalidate_chapters(model, pks)
+    pks = list(pks)
+    transaction.on_commit(lambda: _refresh_chapters(model, pks))
+
+
+def _refresh_chapters(model, pks):
+    """Build the page manifests and stitch the strips of touched chapters."""
+    chapters = list(
+        with_stitch_pages(model._base_manager.filter(pk__in=pks)).only("modified_at")
+    )
+    # Cached manifests are not built again, when a chapter is touched more
+    # than once in a transaction.
+    chapter_manifests(model, chapters)
+    schedule_stitching(
+        model, [chapter.pk for chapter in chapters if chapter.stitch_pages]
+    )
+
+
+def bulk_create_chapter_pages(chapter, images):
+    """
+    Append ``images`` to ``chapter`` as new ``ChapterPage`` rows.
+
+    Pages are numbered in the order given, after the existing pages.
+    """
+    return _bulk_create_pages(ChapterPage, "chapter", chapter, images)
+
+
+def bulk_create_chapter_page_translations(chapter_translation, images):
+    """
+    Append ``images`` to ``chapter_translation`` as new
+    ``ChapterPageTranslation`` rows.
+    """
+    return _bulk_create_pages(
+        ChapterPageTranslation, "chapter_translation", chapter_translation, images
+    )
+
+
+def _page_options(chapter):
+    """Return the page model and its chapter field name for ``chapter``."""
+    if isinstance(chapter, ComicChapter):
+        return ChapterPage, "chapter"
+    if isinstance(chapter, ComicChapterTranslation):
+        return ChapterPageTranslation, "chapter_translation"
+    raise TypeError(f"{chapter!r} has no pages")
+
+
+def chapter_pages(chapter):
+    """Return the pages of ``chapter`` in page order."""
+    model, parent_field = _page_options(chapter)
+    return model.objects.filter(**{parent_field: chapter}).order_by("page_number")
+
+
+def insert_pages(chapter, images, position=None):
+    """
+    Insert ``images`` as new pages of ``chapter``, a ``ComicChapter`` or a
+    ``ComicChapterTranslation``, starting at page number ``position``.
+
+    Pages from ``position`` on move back to make room, and the images are
+    appended when ``position`` is ``None``.
+    """
+    model, parent_field = _page_options(chapter)
+    return _bulk_create_pages(model, parent_field, chapter, images, position)
+
+
+def delete_pages(chapter, page_numbers):
+    """
+    Delete the pages numbered ``page_numbers`` of ``chapter`` and close the
+    gaps they leave. Return the number of deleted pages.
+    """
+    model, parent_field = _page_options(chapter)
+    numbers = sorted(set(page_numbers))
+    if not numbers:
+        return 0
+    with transaction.atomic():
+        total = _lock_and_count_pages(model, parent_field, chapter)
+        _check_page_numbers(numbers, total)
+        pages = model.objects.filter(**{parent_field: chapter})
+        removed = pages.filter(page_number__in=numbers)
+        names = list(removed.values_list("page_image", flat=True))
+        # QuerySet.delete() would load every page and send post_delete for
+        # each, as pages have receivers, and these touch the chapter and
+        # release the file of the page one by one. _raw_delete() is the
+        # single DELETE that delete() runs when no signal is connected. The
+        # chapter is already touched above and the blobs are released below,
+        # so skipping the signals loses nothing.
+        removed._raw_delete(removed.db)
+        storage = model._meta.get_field("page_image").storage
+        transaction.on_commit(lambda: release_blobs(storage, names))
+        # The pages between two deleted ones move forward by the number of
+        # pages deleted before them.
+        whens = [
+            _shifted(first + 1, last - 1, -deleted)
+            for deleted, (first, last) in enumerate(
+                zip(numbers, numbers[1:] + [total + 1]), start=1
+            )
+            if last - first > 1
+        ]
+        if whens:
+            _renumber(pages, Q(page_number__gt=numbers[0]), whens)
+    return len(numbers)
+
+
+def move_page(chapter, page_number, new_page_number):
+    """
+    Move page ``page_number`` of ``chapter`` to ``new_page_number``, shifting
+    the pages in between by one.
+    """
+    model, parent_field = _page_options(chapter)
+    with transaction.atomic():
+        total = _lock_and_count_pages(model, parent_field, chapter)
+        _check_page_numbers([page_number, new_page_number], total)
+        if page_number == new_page_number:
+            return
+        if page_number < new_page_number:
+            shifted = _shifted(page_number + 1, new_page_number, -1)
+        else:
+            shifted = _shifted(new_page_number, page_number - 1, 1)
+        moved = When(
+            page_number=page_number + RENUMBER_OFFSET, then=Value(new_page_number)
+        )
+        _renumber(
+            model.objects.filter(**{parent_field: chapter}),
+            Q(
+                page_number__range=(
+                    min(page_number, new_page_number),
+                    max(page_number, new_page_number),
+                )
+            ),
+            [moved, shifted],
+        )
+
+
+def reorder_pages(chapter, page_pks):
+    """
+    Renumber the pages of ``chapter`` from 1 in the order of ``page_pks``,
+    which must list every page of the chapter exactly once.
+    """
+    model, parent_field = _page_options(chapter)
+    page_pks = list(page_pks)
+    with transaction.atomic():
+        touch_chapters(type(chapter), [chapter.pk])
+        pages = model.objects.filter(**{parent_field: chapter})
+        existing = set(pages.values_list("pk", flat=True))
+        if len(page_pks) != len(existing) or set(page_pks) != existing:
+            raise ValidationError(
+                _("The new order must list every page of the chapter exactly once")
+            )
+        _renumber(
+            pages,
+            Q(),
+            [
+                When(pk=pk, then=Value(number))
+                for number, pk in enumerate(page_pks, start=1)
+            ],
+        )
+
+
+def _shifted(first, last, delta):
+    """``When`` moving the lifted pages ``first`` to ``last`` by ``delta``."""
+    return When(
+        page_number__range=(first + RENUMBER_OFFSET, last + RENUMBER_OFFSET),
+        then=F("page_number") - RENUMBER_OFFSET + delta,
+    )
+
+
+def _renumber(pages, affected, whens):
+    """
+    Renumber the pages of the ``pages`` queryset matching ``affected``.
+
+    The first ``UPDATE`` lifts them above ``RENUMBER_OFFSET``, the second
+    gives them the number of the first matching ``whens``, which test the
+    lifted numbers. Pages no ``When`` matches get their number back.
+    """
+    pages.filter(affected).update(page_number=F("page_number") + RENUMBER_OFFSET)
+    pages.filter(page_number__gte=RENUMBER_OFFSET).update(
+        page_number=Case(
+            *whens,
+            default=F("page_number") - RENUMBER_OFFSET,
+            output_field=PositiveSmallIntegerField(),
+        )
+    )
+
+
+def _check_page_numbers(numbers, total):
+    for number in numbers:
+        if not 1 <= number <= total:
+            raise ValidationError(
+                {
+                    "page_number": _("Page %(number)d does not exist")
+                    % {"number": number}
+                }
+            )
+
+
+def _bulk_create_pages(model, parent_field, parent, images, position=None):
+    images = list(images)
+    if not images:
+        raise ValidationError(_("At least one page image is required"))
+    with transaction.atomic():
+        total = _lock_and_count_pages(model, parent_field, parent)
+        if total + len(images) >= RENUMBER_OFFSET:
+            raise ValidationError(_("A chapter can not have that many pages"))
+        if position is None:
+            position = total + 1
+        elif not 1 <= position <= total + 1:
+            raise ValidationError(
+                {
+                    "page_number": _(
+                        "Pages can only be inserted from page 1 to %(last)d"
+                    )
+                    % {"last": total + 1}
+                }
+            )
+        elif position <= total:
+            _renumber(
+                model.objects.filter(**{parent_field: parent}),
+                Q(page_number__gte=position),
+                [_shifted(position, total, len(images))],
+            )
+        pages = [
+            model(**{parent_field: parent}, page_image=image, page_number=number)
+            for number, image in enumerate(images, start=position)
+        ]
+        # bulk_create() does not call save(), so compute the metadata of all
+        # the pages at once here.
+        set_image_metadata(pages, ["page_image"])
+        # bulk_create() still calls FileField.pre_save(), which stores the
+        # uploaded files before the rows are inserted.
+        pages = model.objects.bulk_create(pages)
+        # bulk_create() does not send post_save, so schedule renditions here.
+        fieldfiles = [page.page_image for page in pages]
+        transaction.on_commit(lambda: schedule_renditions(fieldfiles))
+    return pages
+
+
+def _lock_and_count_pages(model, parent_field, parent):
+    """
+    Touch ``parent``, which locks it until the end of the transaction, and
+    return its number of pages after checking they are numbered 1 to N.
+    """
+    touch_chapters(type(parent), [parent.pk])
+    existing = model.objects.filter(**{parent_field: parent}).aggregate(
+        total=Count("pk"), last=Max("page_number")
+    )
+    if (existing["last"] or 0) != existing["total"]:
+        raise ValidationError(
+            {
+                "page_number": _(
+                    "Existing pages are not numbered consecutively, "
+                    "reorder them first"
+                )
+            }
+        )
+    return existing["total"]
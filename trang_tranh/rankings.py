@@ -0,0 +1,123 @@
+"""
+Trending and popular rankings with exponential time decay.
+
+Reads are recorded into daily ``ComicReadBucket`` rows and folded into one
+``ComicTrend`` row per (comic, language, period). A read at time ``t`` is
+worth ``exp(decay * (t - EPOCH))`` where ``decay = ln 2 / half-life``, and
+``score`` stores the logarithm of the sum. Older reads therefore count for
+less than recent ones while stored scores never have to be rewritten as
+time passes: rankings are ordered by ``score`` directly, which is a single
+query on the ``(period, language, -score)`` index. The all-time period has
+no decay, its score is the logarithm of the total read count.
+"""
+
+import math
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .conf import get_setting
+from .models import ComicReadBucket, ComicTrend
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# Language of the rankings across every language.
+ALL_LANGUAGES = ""
+
+
+def decay_rate(period):
+    half_life = get_setting("RANKING_HALF_LIVES")[period]
+    if half_life is None:
+        return 0.0
+    return math.log(2) / half_life.total_seconds()
+
+
+def log_weight(period, reads, when):
+    """Logarithm of the weight of ``reads`` reads at ``when``."""
+    return math.log(reads) + decay_rate(period) * (when - EPOCH).total_seconds()
+
+
+def _logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed_reads(trend, when=None):
+    """Return the decayed read count that ``trend.score`` stands for at ``when``."""
+    when = when or timezone.now()
+    elapsed = (when - EPOCH).total_seconds()
+    return math.exp(trend.score - decay_rate(trend.period) * elapsed)
+
+
+def record_reads(reads, when=None):
+    """
+    Record ``reads``, a ``{(comic_id, language): count}`` mapping, at
+    ``when`` (now by default) and update every ranking incrementally.
+    """
+    reads = {key: n for key, n in reads.items() if n > 0}
+    if not reads:
+        return
+    when = when or timezone.now()
+
+    by_ranking = Counter()
+    for (comic_id, language), n in reads.items():
+        by_ranking[comic_id, language] += n
+        by_ranking[comic_id, ALL_LANGUAGES] += n
+    periods = [period for period, _name in ComicTrend.PERIODS]
+
+    with transaction.atomic():
+        # The upsert takes the write lock first, so the read-modify-write of
+        # the trends below can not interleave with another flush.
+        _add_to_buckets(
+            reads, connection.ops.adapt_datefield_value(timezone.localdate(when))
+        )
+        trends = {
+            (trend.comic_id, trend.language, trend.period): trend
+            for trend in ComicTrend.objects.select_for_update().filter(
+                comic_id__in={comic_id for comic_id, _language in by_ranking},
+                language__in={language for _comic_id, language in by_ranking},
+            )
+        }
+        changed, created = [], []
+        for (comic_id, language), n in by_ranking.items():
+            for period in periods:
+                weight = log_weight(period, n, when)
+                trend = trends.get((comic_id, language, period))
+                if trend is None:
+                    created.append(
+                        ComicTrend(
+                            comic_id=comic_id,
+                            language=language,
+                            period=period,
+                            score=weight,
+                        )
+                    )
+                else:
+                    trend.score = _logaddexp(trend.score, weight)
+                    trend.updated_at = when
+                    changed.append(trend)
+        ComicTrend.objects.bulk_update(changed, ["score", "updated_at"])
+        ComicTrend.objects.bulk_create(created)
+
+
+def _add_to_buckets(reads, day):
+    table = connection.ops.quote_name(ComicReadBucket._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (comic_id, language, day, reads) "
+            "VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (comic_id, language, day) "
+            f"DO UPDATE SET reads = {table}.reads + excluded.reads",
+            [(comic_id, language, day, n) for (comic_id, language), n in reads.items()],
+        )
+
+
+def top_comics(period="w", language=ALL_LANGUAGES, limit=10):
+    """Return the ``limit`` best ranked ``ComicTrend`` rows with their comic."""
+    return list(
+        ComicTrend.objects.filter(period=period, language=language)
+        .select_related("comic")
+        .order_by("-score")[:limit]
+    )
@@ -0,0 +1,271 @@
+"""
+Removal of a comic, a comic translation or a chapter with everything under it.
+
+Every foreign key between comics, translations, chapters and pages is
+``PROTECT``, so a comic can only be deleted after its translated pages,
+translated chapters, translations, pages and chapters, in that order.
+``remove()`` deletes them bottom-up, ``REMOVAL_BATCH_SIZE`` rows at a time
+in primary key order. Each batch is a primary key range delete in its own
+short transaction, so the write lock is released between batches.
+
+The rows under the removed object are deleted without being loaded as model
+instances or sending signals, so what the signal handlers would do is done
+per batch instead: the search index is updated and the files of the rows
+are released (see ``storage.release_names``) in the background thread pool
+once the batch is committed. The removed object itself is deleted last with
+``Model.delete()``, which takes care of its other relations and signals. Its
+blobs are released by the ``post_delete`` handler, its other files go through
+``release_names`` like those of the batches.
+
+``manage.py remove_content`` runs removals in the foreground. The admin
+actions run them in the background with ``start_removal`` and record their
+progress in the cache.
+"""
+
+import logging
+import uuid
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import connection, models, transaction
+
+from .conf import get_setting
+from .coverage import invalidate_comics
+from .localization import invalidate_comic
+from .models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    ChapterSequence,
+    ChapterStrip,
+    Comic,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+)
+from .search import unindex_objects
+from .storage import ContentAddressedStorage, release_names
+from .workers import background_pool
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "trang_tranh:removal:"
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+REMOVABLE_MODELS = (Comic, ComicTranslation, ComicChapter, ComicChapterTranslation)
+
+# Models with a search document, unindexed as their rows are deleted.
+INDEXED_MODELS = (ComicTranslation, ComicChapter, ComicChapterTranslation)
+
+
+def _levels(obj):
+    """Return the ``(model, filters)`` of the rows under ``obj``, bottom-up."""
+    if isinstance(obj, Comic):
+        return [
+            (
+                ChapterPageTranslation,
+                {"chapter_translation__comic_translation__comic": obj},
+            ),
+            (ComicChapterTranslation, {"comic_translation__comic": obj}),
+            (ComicTranslation, {"comic": obj}),
+            (ChapterPage, {"chapter__comic": obj}),
+            (ComicChapter, {"comic": obj}),
+        ]
+    if isinstance(obj, ComicTranslation):
+        return [
+            (
+                ChapterPageTranslation,
+                {"chapter_translation__comic_translation": obj},
+            ),
+            (ComicChapterTranslation, {"comic_translation": obj}),
+        ]
+    if isinstance(obj, ComicChapter):
+        return [(ChapterPage, {"chapter": obj})]
+    if isinstance(obj, ComicChapterTranslation):
+        return [(ChapterPageTranslation, {"chapter_translation": obj})]
+    raise TypeError(f"{obj!r} can not be removed")
+
+
+def _comic_id(obj):
+    if isinstance(obj, Comic):
+        return obj.pk
+    if isinstance(obj, (ComicTranslation, ComicChapter)):
+        return obj.comic_id
+    return obj.comic_translation.comic_id
+
+
+def _file_fields(model):
+    return [
+        field for field in model._meta.fields if isinstance(field, models.FileField)
+    ]
+
+
+def _release_later(names_by_storage, futures):
+    """Release the files of a batch in the background once it is committed."""
+
+    def submit():
+        for storage, names in names_by_storage.items():
+            futures.append(background_pool().submit(_release, storage, names))
+
+    if names_by_storage:
+        transaction.on_commit(submit)
+
+
+def _release(storage, names):
+    try:
+        release_names(storage, names)
+    except Exception:
+        logger.exception("Failed to release %d removed files", len(names))
+    finally:
+        # Each worker thread has a database connection of its own.
+        connection.close()
+    return len(names)
+
+
+def _delete_batch(model, queryset, last_pk, batch_size, futures):
+    """
+    Delete the next ``batch_size`` rows of ``queryset`` after ``last_pk``
+    and return their primary keys.
+    """
+    fields = _file_fields(model)
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", *[field.attname for field in fields])[:batch_size]
+        )
+        if not rows:
+            return []
+        pks = [row[0] for row in rows]
+        # The single DELETE that QuerySet.delete() runs when no signal is
+        # connected. delete() would load the rows and send their signals one
+        # by one, and the relations and files they handle are dealt with
+        # below for the whole batch instead.
+        queryset.filter(pk__range=(pks[0], pks[-1]))._raw_delete(queryset.db)
+        if model is ComicTranslation:
+            ChapterSequence.objects.filter(comic_translation__in=pks).delete()
+        elif model is ComicChapter:
+            ChapterStrip.objects.filter(chapter__in=pks).delete()
+        elif model is ComicChapterTranslation:
+            ChapterStrip.objects.filter(chapter_translation__in=pks).delete()
+        if model in INDEXED_MODELS:
+            unindex_objects(model, pks)
+        names = defaultdict(list)
+        for i, field in enumerate(fields, start=1):
+            names[field.storage].extend(row[i] for row in rows if row[i])
+        _release_later(names, futures)
+    return pks
+
+
+def remove(obj, batch_size=None, progress=None):
+    """
+    Delete ``obj``, a comic, a comic translation, a chapter or a translated
+    chapter, and every row under it, bottom-up and in batches.
+
+    ``progress(model, count)`` is called after each batch with the number
+    of ``model`` rows deleted so far. Return a ``Counter`` of the rows
+    deleted per model label, and the futures of the background jobs
+    releasing the files.
+    """
+    batch_size = batch_size or get_setting("REMOVAL_BATCH_SIZE")
+    comic_id = _comic_id(obj)
+    deleted = Counter()
+    futures = []
+    for model, filters in _levels(obj):
+        queryset = model._base_manager.filter(**filters)
+        last_pk = 0
+        while True:
+            pks = _delete_batch(model, queryset, last_pk, batch_size, futures)
+            if not pks:
+                break
+            last_pk = pks[-1]
+            deleted[model._meta.label] += len(pks)
+            if progress:
+                progress(model, deleted[model._meta.label])
+    names = defaultdict(list)
+    for field in _file_fields(type(obj)):
+        name = getattr(obj, field.attname).name
+        # post_delete already releases the blobs.
+        if name and not isinstance(field.storage, ContentAddressedStorage):
+            names[field.storage].append(name)
+    with transaction.atomic():
+        obj.delete()
+        _release_later(names, futures)
+        # Left to the signal handlers of the rows deleted above.
+        invalidate_comics([comic_id])
+    invalidate_comic(comic_id)
+    deleted[obj._meta.label] += 1
+    if progress:
+        progress(type(obj), 1)
+    return deleted, futures
+
+
+def _cache_key(job_id):
+    return f"{CACHE_PREFIX}{job_id}"
+
+
+def removal_progress(job_id):
+    """
+    Return the progress of the background removal ``job_id``: its
+    ``state`` (``"queued"``, ``"running"``, ``"done"`` or ``"failed"``),
+    the number of ``objects`` to remove, how many are ``removed`` and the
+    ``rows`` deleted so far per model label. ``None`` for unknown jobs.
+    """
+    return cache.get(_cache_key(job_id))
+
+
+def _set_progress(job_id, state):
+    cache.set(_cache_key(job_id), state, PROGRESS_TIMEOUT)
+
+
+def start_removal(objects, batch_size=None):
+    """
+    Remove ``objects`` one after the other in the background thread pool,
+    once the current transaction commits. Return the id of the job, whose
+    progress ``removal_progress`` returns.
+    """
+    targets = [(type(obj), obj.pk) for obj in objects]
+    for model, _pk in targets:
+        if model not in REMOVABLE_MODELS:
+            raise TypeError(f"{model.__name__} objects can not be removed")
+    job_id = uuid.uuid4().hex
+    _set_progress(
+        job_id, {"state": "queued", "objects": len(targets), "removed": 0, "rows": {}}
+    )
+    transaction.on_commit(
+        lambda: background_pool().submit(_run_removal, job_id, targets, batch_size)
+    )
+    return job_id
+
+
+def _run_removal(job_id, targets, batch_size):
+    state = removal_progress(job_id) or {
+        "objects": len(targets),
+        "removed": 0,
+        "rows": {},
+    }
+    state["state"] = "running"
+    done = Counter()
+
+    def progress(model, count):
+        rows = done.copy()
+        rows[model._meta.label] += count
+        state["rows"] = dict(rows)
+        _set_progress(job_id, state)
+
+    try:
+        for model, pk in targets:
+            obj = model._base_manager.filter(pk=pk).first()
+            if obj is not None:
+                deleted, _futures = remove(obj, batch_size, progress)
+                done.update(deleted)
+            state["removed"] += 1
+            state["rows"] = dict(done)
+            _set_progress(job_id, state)
+    except Exception:
+        logger.exception("Removal %s failed", job_id)
+        state["state"] = "failed"
+    else:
+        state["state"] = "done"
+    finally:
+        connection.close()
+    _set_progress(job_id, state)
@@ -0,0 +1,255 @@
+"""
+Responsive renditions of covers and page images.
+
+Originals are often multi-megabyte uploads. Renditions are resized WebP/JPEG
+copies stored under ``RENDITION_ROOT/<aa>/<sha256>/<size>.<ext>``, keyed by
+the content hash of the original, so identical uploads share renditions and
+a replaced image never serves a stale one. They are generated in the shared
+process pool, either in the background right after an upload or on the
+first request for a size that does not exist yet.
+"""
+
+import hashlib
+import io
+import logging
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .conf import get_setting
+from .storage import blob_digest
+from .workers import background_pool, pool_map
+
+logger = logging.getLogger(__name__)
+
+# Rendition format name -> (Pillow format, file extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+HASH_CACHE_PREFIX = "trang_tranh:content-hash:"
+SCHEDULED_CACHE_PREFIX = "trang_tranh:rendering:"
+SCHEDULED_TIMEOUT = 10 * 60
+CHUNK_SIZE = 64 * 1024
+
+
+def render_renditions(source, targets, quality):
+    """
+    Return the renditions of the image ``source`` (a path or bytes) for each
+    ``(width, fmt)`` of ``targets``, or ``None`` when it can not be decoded.
+
+    Runs in a worker process: the original is read and decoded there, once
+    for all its renditions. Images narrower than a width are re-encoded at
+    their own size, never scaled up.
+    """
+    try:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+        return [render_image(image, width, fmt, quality) for width, fmt in targets]
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def render_image(image, width, fmt, quality):
+    """Return the decoded ``image`` encoded as ``fmt`` and scaled down to ``width``."""
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    image = flatten(image, keep_alpha=fmt == "webp")
+    output = io.BytesIO()
+    image.save(output, FORMATS[fmt][0], quality=quality)
+    return output.getvalue()
+
+
+def flatten(image, keep_alpha):
+    if image.mode in ("RGB", "L") or (keep_alpha and image.mode == "RGBA"):
+        return image
+    image = image.convert("RGBA")
+    if keep_alpha:
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def _hash_cache_key(fieldfile):
+    """
+    Cache key of the digest of ``fieldfile``, ``None`` when the storage has
+    no modification times.
+    """
+    storage, name = fieldfile.storage, fieldfile.name
+    try:
+        # A name is given out again once its file is deleted, so the digest
+        # is only reused for the same name, size and modification time.
+        return "%s%s:%d:%s" % (
+            HASH_CACHE_PREFIX,
+            name,
+            storage.size(name),
+            storage.get_modified_time(name).timestamp(),
+        )
+    except NotImplementedError:
+        return None
+
+
+def content_hash(fieldfile, cached_only=False):
+    """
+    Return the SHA-256 hex digest of the file behind ``fieldfile``. With
+    ``cached_only``, return ``None`` rather than read the file.
+    """
+    digest = blob_digest(fieldfile.name)
+    if digest is not None:
+        # Blobs are named after their digest.
+        return digest
+    key = _hash_cache_key(fieldfile)
+    digest = cache.get(key) if key else None
+    if digest is None and not cached_only:
+        digest = hashlib.sha256()
+        with fieldfile.storage.open(fieldfile.name, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        if key:
+            cache.set(key, digest, None)
+    return digest
+
+
+def rendition_name(digest, size, fmt):
+    return "%s/%s/%s/%s.%s" % (
+        get_setting("RENDITION_ROOT"),
+        digest[:2],
+        digest,
+        size,
+        FORMATS[fmt][1],
+    )
+
+
+def generate_renditions(fieldfiles, sizes=None, formats=None):
+    """
+    Make sure every ``sizes`` x ``formats`` rendition of ``fieldfiles``
+    exists, rendering the missing ones in parallel.
+
+    Return a ``{(original name, size, fmt): rendition name}`` dict. Files
+    that can not be read are logged and left out.
+    """
+    all_sizes = get_setting("RENDITION_SIZES")
+    sizes = list(all_sizes) if sizes is None else list(sizes)
+    formats = (
+        list(get_setting("RENDITION_FORMATS")) if formats is None else list(formats)
+    )
+    quality = get_setting("RENDITION_QUALITY")
+
+    names = {}
+    jobs = []
+    for fieldfile in fieldfiles:
+        if not fieldfile:
+            continue
+        try:
+            digest = content_hash(fieldfile)
+        except OSError:
+            logger.warning("Can not read %s to render it", fieldfile.name)
+            continue
+        missing = []
+        for size in sizes:
+            for fmt in formats:
+                name = rendition_name(digest, size, fmt)
+                names[fieldfile.name, size, fmt] = name
+                if not fieldfile.storage.exists(name):
+                    missing.append((name, size, fmt))
+        if missing:
+            jobs.append((fieldfile, missing))
+
+    if not jobs:
+        return names
+
+    targets = [
+        [(all_sizes[size], fmt) for _name, size, fmt in missing]
+        for _fieldfile, missing in jobs
+    ]
+    results = pool_map(
+        render_renditions,
+        [_source(fieldfile) for fieldfile, _missing in jobs],
+        targets,
+        [quality] * len(jobs),
+    )
+    for (fieldfile, missing), rendered in zip(jobs, results):
+        if rendered is None:
+            logger.warning("Can not render %s", fieldfile.name)
+            failed = {name for name, _size, _fmt in missing}
+            names = {key: value for key, value in names.items() if value not in failed}
+            continue
+        for (name, _size, _fmt), data in zip(missing, rendered):
+            store_once(fieldfile.storage, name, data)
+    return names
+
+
+def _source(fieldfile):
+    """The path of ``fieldfile`` for the worker to read, or its bytes."""
+    try:
+        return fieldfile.storage.path(fieldfile.name)
+    except NotImplementedError:
+        with fieldfile.storage.open(fieldfile.name, "rb") as f:
+            return f.read()
+
+
+def store_once(storage, name, data):
+    if storage.exists(name):
+        return
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Another worker stored the same rendition in the meantime.
+        storage.delete(saved)
+
+
+def rendition_url(fieldfile, size="thumb", fmt=None, lazy=False):
+    """
+    Return the URL of the ``size`` rendition of ``fieldfile``, rendering it
+    first if needed. Fall back to the original when it can not be rendered.
+
+    With ``lazy``, nothing is read or rendered: a rendition that is not
+    ready is rendered in the background and the original is returned.
+    """
+    if not fieldfile:
+        return ""
+    fmt = fmt or get_setting("RENDITION_FORMATS")[0]
+    if lazy:
+        return _lazy_rendition_url(fieldfile, size, fmt)
+    name = generate_renditions([fieldfile], [size], [fmt]).get(
+        (fieldfile.name, size, fmt)
+    )
+    if name is None:
+        return fieldfile.url
+    return fieldfile.storage.url(name)
+
+
+def _lazy_rendition_url(fieldfile, size, fmt):
+    try:
+        digest = content_hash(fieldfile, cached_only=True)
+    except OSError:
+        digest = None
+    if digest is not None:
+        name = rendition_name(digest, size, fmt)
+        if fieldfile.storage.exists(name):
+            return fieldfile.storage.url(name)
+    key = "%s%s:%s:%s" % (SCHEDULED_CACHE_PREFIX, fieldfile.name, size, fmt)
+    # Every page view would schedule the same rendition otherwise.
+    if cache.add(key, True, SCHEDULED_TIMEOUT):
+        background_pool().submit(_generate_in_background, [fieldfile], [size], [fmt])
+    return fieldfile.url
+
+
+def schedule_renditions(fieldfiles):
+    """Generate every rendition of ``fieldfiles`` in the background."""
+    fieldfiles = [fieldfile for fieldfile in fieldfiles if fieldfile]
+    if fieldfiles and get_setting("RENDITIONS_EAGER"):
+        background_pool().submit(_generate_in_background, fieldfiles)
+
+
+def _generate_in_background(fieldfiles, sizes=None, formats=None):
+    try:
+        generate_renditions(fieldfiles, sizes, formats)
+    except Exception:
+        logger.exception("Failed to generate renditions")
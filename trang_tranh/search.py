@@ -0,0 +1,223 @@
+"""
+Full-text search index on SQLite FTS5.
+
+``icontains`` lookups turn into ``LIKE '%x%'`` full table scans and can not
+rank results. The ``trang_tranh_searchindex`` FTS5 table (created by
+migration 0005) holds one document per comic, comic translation, chapter,
+chapter translation and author. Each document's ``rowid`` encodes its kind
+and primary key, so a single document is replaced or removed by rowid. The
+signal handlers in ``signals.py`` keep the index in sync and
+``manage.py rebuild_search_index`` rebuilds it from scratch.
+"""
+
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from .models import (
+    Comic,
+    ComicAuthor,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+)
+
+TABLE = "trang_tranh_searchindex"
+
+# Models indexed, in rowid kind code order. Never reorder, only append.
+KINDS = (Comic, ComicTranslation, ComicChapter, ComicChapterTranslation, ComicAuthor)
+KIND_BITS = 3
+
+# bm25() weights of the title and body columns.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+# Results in the requested language (or language neutral ones, such as
+# authors) rank this many times higher.
+LANGUAGE_BOOST = 2.0
+
+SearchResult = namedtuple(
+    "SearchResult", "model object_id comic_id language title score"
+)
+
+
+def search_available():
+    return connection.vendor == "sqlite"
+
+
+def _rowid(model, pk):
+    return (pk << KIND_BITS) | KINDS.index(model)
+
+
+def _document(instance):
+    """Return the ``(comic_id, language, title, body)`` indexed for an object."""
+    if isinstance(instance, Comic):
+        return instance.pk, instance.default_language, instance.title, instance.summary
+    if isinstance(instance, ComicTranslation):
+        return (
+            instance.comic_id,
+            instance.language,
+            instance.translated_title,
+            instance.translated_summary,
+        )
+    if isinstance(instance, ComicChapter):
+        return instance.comic_id, instance.comic.default_language, instance.title, ""
+    if isinstance(instance, ComicChapterTranslation):
+        return (
+            instance.comic_translation.comic_id,
+            instance.comic_translation.language,
+            instance.translated_title,
+            "",
+        )
+    if isinstance(instance, ComicAuthor):
+        return None, "", instance.pen_name, ""
+    raise TypeError(f"{instance!r} is not indexed")
+
+
+def _indexed_querysets():
+    return [
+        Comic.objects.all(),
+        ComicTranslation.objects.all(),
+        ComicChapter.objects.select_related("comic"),
+        ComicChapterTranslation.objects.select_related("comic_translation"),
+        ComicAuthor.objects.all(),
+    ]
+
+
+def index_objects(instances):
+    """Add or replace the documents of ``instances``."""
+    rows = [
+        (_rowid(type(instance), instance.pk), *_document(instance))
+        for instance in instances
+    ]
+    if not rows or not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows]
+        )
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, comic_id, language, title, body) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def update_object(instance):
+    """
+    Replace the document of a saved ``instance`` if it changed. When the
+    comic or language of a comic or comic translation changed, the documents
+    of its chapters, which are indexed in that language, are replaced too.
+    """
+    if not search_available():
+        return
+    document = _document(instance)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT comic_id, language, title, body FROM {TABLE} WHERE rowid = %s",
+            [_rowid(type(instance), instance.pk)],
+        )
+        indexed = cursor.fetchone()
+    if indexed is not None and tuple(indexed) == document:
+        return
+    documents = [instance]
+    if indexed is not None and tuple(indexed[:2]) != document[:2]:
+        if isinstance(instance, Comic):
+            documents += instance.comicchapter_set.select_related("comic")
+        elif isinstance(instance, ComicTranslation):
+            documents += instance.comicchaptertranslation_set.select_related(
+                "comic_translation"
+            )
+    index_objects(documents)
+
+
+def unindex_object(model, pk):
+    unindex_objects(model, [pk])
+
+
+def unindex_objects(model, pks):
+    if pks and search_available():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE rowid = %s",
+                [(_rowid(model, pk),) for pk in pks],
+            )
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole index and return the number of documents."""
+    if not search_available():
+        raise ImproperlyConfigured("The search index requires SQLite with FTS5")
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    for queryset in _indexed_querysets():
+        batch = []
+        for instance in queryset.iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                index_objects(batch)
+                total += len(batch)
+                batch = []
+        index_objects(batch)
+        total += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query matching documents that contain every
+    word, as a prefix, so that user input can never be an FTS5 syntax error.
+    """
+    words = query.split()
+    return " ".join('"%s"*' % word.replace('"', '""') for word in words)
+
+
+def search(query, models=None, language=None, limit=20):
+    """
+    Return ranked ``SearchResult``s for ``query``, best first.
+
+    ``models`` restricts the kinds of documents searched and ``language``
+    ranks documents in that language higher. ``limit=None`` returns every
+    match.
+    """
+    expression = match_expression(query)
+    if not expression or not search_available():
+        return []
+    models = KINDS if models is None else models
+    kind_codes = [KINDS.index(model) for model in models]
+    sql = (
+        f"SELECT rowid, comic_id, language, title, "
+        f"bm25({TABLE}, 0.0, 0.0, %s, %s) * CASE WHEN language IN (%s, '') "
+        f"THEN %s ELSE 1.0 END AS score "
+        f"FROM {TABLE} WHERE {TABLE} MATCH %s "
+        f"AND (rowid & %s) IN ({', '.join(['%s'] * len(kind_codes))}) "
+        f"ORDER BY score"
+    )
+    params = [
+        TITLE_WEIGHT,
+        BODY_WEIGHT,
+        language or "",
+        LANGUAGE_BOOST if language else 1.0,
+        expression,
+        (1 << KIND_BITS) - 1,
+        *kind_codes,
+    ]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            SearchResult(
+                KINDS[rowid & ((1 << KIND_BITS) - 1)],
+                rowid >> KIND_BITS,
+                comic_id,
+                language,
+                title,
+                score,
+            )
+            for rowid, comic_id, language, title, score in cursor.fetchall()
+        ]
@@ -0,0 +1,141 @@
+"""
+Race-free allocation of chapter counters and chapter numbers.
+
+Chapters are unique per (comic, chapter_counter) and (comic, chapter_number),
+so computing "last + 1" before inserting lets two concurrent uploaders pick
+the same value. Each comic and comic translation instead has a
+``ChapterSequence`` row holding the next free counter and number. Values are
+allocated by incrementing that row with a single ``UPDATE ... SET next =
+next + n`` and reading it back in the same transaction: the update takes
+the row (or, on SQLite, the database) write lock, so concurrent allocations
+are serialized by the database and never hand out the same value twice.
+
+Sequences are created lazily from the last existing chapter, and the
+``post_save`` handler in ``signals.py`` moves them past chapters saved with
+explicit values (see ``advance``), so that the values of chapters created in
+the admin are not handed out again.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+
+from .models import (
+    ChapterSequence,
+    Comic,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+)
+
+
+def _parent_options(parent):
+    """Return the chapter model and the parent field name of ``parent``."""
+    if isinstance(parent, Comic):
+        return ComicChapter, "comic"
+    if isinstance(parent, ComicTranslation):
+        return ComicChapterTranslation, "comic_translation"
+    raise TypeError(f"{parent!r} has no chapters")
+
+
+def _create_sequence(parent):
+    model, parent_field = _parent_options(parent)
+    last = model.objects.filter(**{parent_field: parent}).aggregate(
+        counter=Max("chapter_counter"), number=Max("chapter_number")
+    )
+    try:
+        with transaction.atomic():
+            ChapterSequence.objects.create(
+                **{parent_field: parent},
+                next_counter=(last["counter"] or 0) + 1,
+                next_number=(last["number"] or 0) + 1,
+            )
+    except IntegrityError:
+        # Created concurrently, the other allocation's values are as good.
+        pass
+
+
+def allocate(parent, counters=1, numbers=1):
+    """
+    Allocate ``counters`` consecutive chapter counters and ``numbers``
+    consecutive chapter numbers of ``parent``, a ``Comic`` or a
+    ``ComicTranslation``.
+
+    Return the ``(counters, numbers)`` ranges. Inside a transaction the
+    sequence row stays locked until it ends, and the allocation is rolled
+    back with it; allocating outside of one commits right away, so values
+    left unused only leave a gap.
+    """
+    _model, parent_field = _parent_options(parent)
+    sequence = ChapterSequence.objects.filter(**{parent_field: parent})
+    with transaction.atomic():
+        increment = {
+            "next_counter": F("next_counter") + counters,
+            "next_number": F("next_number") + numbers,
+        }
+        if not sequence.update(**increment):
+            _create_sequence(parent)
+            sequence.update(**increment)
+        next_counter, next_number = sequence.values_list(
+            "next_counter", "next_number"
+        ).get()
+    return (
+        range(next_counter - counters, next_counter),
+        range(next_number - numbers, next_number),
+    )
+
+
+def reserve_chapters(parent, count, numbered=True):
+    """
+    Reserve the counters, and unless ``numbered`` is false the numbers, of
+    ``count`` new chapters of ``parent`` at once, for bulk imports.
+
+    Return a list of ``(chapter_counter, chapter_number)`` pairs, where the
+    chapter number is ``None`` for extra chapters.
+    """
+    counters, numbers = allocate(parent, count, count if numbered else 0)
+    if not numbered:
+        numbers = [None] * count
+    return list(zip(counters, numbers))
+
+
+def advance(chapter):
+    """
+    Move the sequence of the comic or comic translation of ``chapter`` past
+    its chapter counter and number, for chapters saved with explicit values.
+    """
+    if isinstance(chapter, ComicChapter):
+        sequence = ChapterSequence.objects.filter(comic_id=chapter.comic_id)
+    else:
+        sequence = ChapterSequence.objects.filter(
+            comic_translation_id=chapter.comic_translation_id
+        )
+    sequence.update(
+        next_counter=Greatest(F("next_counter"), chapter.chapter_counter + 1),
+        next_number=Greatest(F("next_number"), (chapter.chapter_number or 0) + 1),
+    )
+
+
+def publish_chapter(parent, **fields):
+    """
+    Create and return a new chapter of ``parent``.
+
+    A ``Comic`` gets a ``ComicChapter`` and a ``ComicTranslation`` a
+    ``ComicChapterTranslation``. The chapter counter and, unless it is an
+    extra chapter, the chapter number are allocated from the sequence when
+    not given in ``fields``, so concurrent publishing never conflicts and
+    never has to be retried.
+    """
+    model, parent_field = _parent_options(parent)
+    if fields.get("extra_chapter"):
+        fields["chapter_number"] = None
+    with transaction.atomic():
+        needs_counter = "chapter_counter" not in fields
+        needs_number = "chapter_number" not in fields
+        if needs_counter or needs_number:
+            counters, numbers = allocate(parent, int(needs_counter), int(needs_number))
+            if needs_counter:
+                fields["chapter_counter"] = counters[0]
+            if needs_number:
+                fields["chapter_number"] = numbers[0]
+        return model.objects.create(**{parent_field: parent}, **fields)
@@ -0,0 +1,125 @@
+from django.db import models, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    Comic,
+    ComicAuthor,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+    UserProfile,
+)
+from .analytics import record_flushed_reads
+from .counters import read_counts_flushed
+from .coverage import invalidate_comics, invalidate_translations
+from .db import configure_connection
+from .instrumentation import instrument_connection
+from .localization import invalidate_comic
+from .pages import touch_chapters
+from .renditions import schedule_renditions
+from .search import unindex_object, update_object
+from .sequences import advance
+from .storage import release_files
+
+
+@receiver(post_save, sender=Comic)
+@receiver(post_save, sender=ComicChapter)
+@receiver(post_save, sender=ChapterPage)
+@receiver(post_save, sender=ChapterPageTranslation)
+def generate_renditions_on_save(sender, instance, update_fields=None, **kwargs):
+    """Render the images of a saved object once the transaction commits."""
+    fields = sender.rendition_fields
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    fieldfiles = [getattr(instance, field) for field in fields]
+    transaction.on_commit(lambda: schedule_renditions(fieldfiles))
+
+
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=Comic)
+@receiver(post_delete, sender=ComicChapter)
+@receiver(post_delete, sender=ChapterPage)
+@receiver(post_delete, sender=ChapterPageTranslation)
+def release_deleted_files(sender, instance, **kwargs):
+    """Release the files of a deleted object once the transaction commits."""
+    fieldfiles = [
+        getattr(instance, field.name)
+        for field in sender._meta.fields
+        if isinstance(field, models.FileField)
+    ]
+    transaction.on_commit(lambda: release_files(fieldfiles))
+
+
+@receiver(post_save, sender=ChapterPage)
+@receiver(post_delete, sender=ChapterPage)
+def touch_chapter_on_page_change(sender, instance, **kwargs):
+    touch_chapters(ComicChapter, [instance.chapter_id])
+
+
+@receiver(post_save, sender=ChapterPageTranslation)
+@receiver(post_delete, sender=ChapterPageTranslation)
+def touch_chapter_translation_on_page_change(sender, instance, **kwargs):
+    touch_chapters(ComicChapterTranslation, [instance.chapter_translation_id])
+
+
+@receiver(post_save, sender=Comic)
+@receiver(post_delete, sender=Comic)
+def invalidate_localized_comic(sender, instance, **kwargs):
+    invalidate_comic(instance.pk)
+
+
+@receiver(post_save, sender=ComicTranslation)
+@receiver(post_delete, sender=ComicTranslation)
+def invalidate_localized_comic_translation(sender, instance, **kwargs):
+    invalidate_comic(instance.comic_id, [instance.language])
+
+
+@receiver(post_save, sender=ComicChapter)
+@receiver(post_delete, sender=ComicChapter)
+@receiver(post_save, sender=ComicTranslation)
+@receiver(post_delete, sender=ComicTranslation)
+def invalidate_comic_coverage(sender, instance, **kwargs):
+    invalidate_comics([instance.comic_id])
+
+
+@receiver(post_save, sender=ComicChapterTranslation)
+@receiver(post_delete, sender=ComicChapterTranslation)
+def invalidate_translation_coverage(sender, instance, **kwargs):
+    invalidate_translations([instance.comic_translation_id])
+
+
+@receiver(post_save, sender=ComicChapter)
+@receiver(post_save, sender=ComicChapterTranslation)
+def advance_chapter_sequence(sender, instance, **kwargs):
+    advance(instance)
+
+
+@receiver(post_save, sender=Comic)
+@receiver(post_save, sender=ComicTranslation)
+@receiver(post_save, sender=ComicChapter)
+@receiver(post_save, sender=ComicChapterTranslation)
+@receiver(post_save, sender=ComicAuthor)
+def update_search_index(sender, instance, **kwargs):
+    update_object(instance)
+
+
+@receiver(post_delete, sender=Comic)
+@receiver(post_delete, sender=ComicTranslation)
+@receiver(post_delete, sender=ComicChapter)
+@receiver(post_delete, sender=ComicChapterTranslation)
+@receiver(post_delete, sender=ComicAuthor)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_object(sender, instance.pk)
+
+
+read_counts_flushed.connect(record_flushed_reads)
+
+
+@receiver(connection_created)
+def configure_new_connection(sender, connection, **kwargs):
+    configure_connection(connection)
+    instrument_connection(connection)
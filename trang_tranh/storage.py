@@ -0,0 +1,330 @@
+"""
+Content-addressed storage of uploaded images.
+
+The same image is often uploaded many times: identical covers, credits pages
+repeated in every chapter, translated pages without any text. With
+``ContentAddressedStorage`` as the default storage, an upload is hashed while
+it is streamed to a temporary file and stored once as
+``blobs/<aa>/<sha256>.<ext>``, whatever name it was uploaded under, so every
+copy shares the file (and, being content-hashed, its year-long caching in
+``media.serve_media``).
+
+A ``MediaBlob`` row per blob counts the saves that returned its name. The
+count is changed and the file moved in or removed while the row is locked,
+so a save and a delete of the same blob never interleave. ``delete()`` only
+removes the file once the last reference is released and no file field
+still points to it. The ``post_delete`` handler in ``signals.py`` releases
+the blobs of deleted objects (with other storages nothing changes and files
+are kept as before, except by ``removal.remove()``), and
+``manage.py dedupe_media`` moves an existing media tree into blobs. The
+old blob of a replaced image is never released: ``manage.py gc_media``
+recounts the references from the file fields and collects the blobs that
+no row holds any more.
+
+Names under ``RENDITION_ROOT`` and ``STRIP_ROOT`` are already keyed by the
+content hash of their originals and are stored as they are.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.utils.deconstruct import deconstructible
+
+from .conf import get_setting
+
+BLOB_ROOT = "blobs"
+BLOB_NAME_RE = re.compile(r"^%s/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$" % BLOB_ROOT)
+EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(digest, extension=""):
+    return f"{BLOB_ROOT}/{digest[:2]}/{digest}{extension}"
+
+
+def blob_digest(name):
+    """Return the SHA-256 digest of a blob name, ``None`` for other names."""
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+def _extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return extension if EXTENSION_RE.match(extension) else ""
+
+
+def _blobs():
+    # Imported here: models imports renditions, which imports this module.
+    from .models import MediaBlob
+
+    return MediaBlob.objects
+
+
+@deconstructible(path="trang_tranh.storage.ContentAddressedStorage")
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` storing each distinct content once."""
+
+    def stored_as_named(self, name):
+        return name.startswith(
+            (get_setting("RENDITION_ROOT") + "/", get_setting("STRIP_ROOT") + "/")
+        )
+
+    def get_available_name(self, name, max_length=None):
+        if self.stored_as_named(name):
+            return super().get_available_name(name, max_length)
+        # The name is replaced by the blob name anyway.
+        return name
+
+    def _save(self, name, content):
+        if self.stored_as_named(name):
+            return super()._save(name, content)
+        directory = self.path(BLOB_ROOT)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            digest, size = hashlib.sha256(), 0
+            with os.fdopen(fd, "wb") as temp:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            return self.add_reference(
+                digest.hexdigest(), _extension(name), size, temp_path
+            )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def add_reference(self, digest, extension, size, path, references=1):
+        """
+        Add ``references`` to the blob of ``digest`` and return its name.
+
+        If the blob file does not exist yet, the file at ``path`` (a path on
+        the same file system) is moved in its place, otherwise it is left
+        alone.
+        """
+        blobs = _blobs().filter(digest=digest)
+        with transaction.atomic():
+            if blobs.update(references=F("references") + references):
+                name = blobs.values_list("name", flat=True).get()
+            else:
+                name = blob_name(digest, extension)
+                try:
+                    with transaction.atomic():
+                        _blobs().create(
+                            digest=digest, name=name, size=size, references=references
+                        )
+                except IntegrityError:
+                    # Created concurrently, count the references on that one.
+                    blobs.update(references=F("references") + references)
+                    name = blobs.values_list("name", flat=True).get()
+            full_path = self.path(name)
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            else:
+                # Kept by ``manage.py gc_media`` for its grace period, until
+                # the row holding the new reference is committed.
+                os.utime(full_path)
+        return name
+
+    def delete(self, name):
+        """
+        Release a reference to the blob ``name`` and remove its file when it
+        was the last one. Other names are deleted right away.
+        """
+        digest = blob_digest(name)
+        if digest is None:
+            return super().delete(name)
+        blobs = _blobs().filter(digest=digest)
+        with transaction.atomic():
+            blobs.filter(references__gt=0).update(references=F("references") - 1)
+            if blobs.filter(references__gt=0).exists() or is_referenced(name):
+                return
+            blobs.delete()
+            super().delete(name)
+
+
+def file_fields():
+    """Return the ``(model, field name)`` of every file field of the app."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config("trang_tranh").get_models()
+        for field in model._meta.fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def is_referenced(name):
+    """Whether any file field still holds the file ``name``."""
+    return any(
+        model._base_manager.filter(**{field: name}).exists()
+        for model, field in file_fields()
+    )
+
+
+def referenced_names(names):
+    """Return the names among ``names`` that a file field still holds."""
+    names = set(names)
+    found = set()
+    for model, field in file_fields():
+        found.update(
+            model._base_manager.filter(**{f"{field}__in": names}).values_list(
+                field, flat=True
+            )
+        )
+    return found
+
+
+def recount_references():
+    """
+    Set the ``references`` of every blob to the number of rows whose file
+    fields hold it, and return the number of blobs changed. Replacing the
+    image of a saved row does not release its old blob, so the counts only
+    drift upwards otherwise.
+    """
+    counts = Counter()
+    for model, field in file_fields():
+        rows = (
+            model._base_manager.filter(**{f"{field}__startswith": BLOB_ROOT + "/"})
+            .values_list(field)
+            .annotate(rows=Count("pk"))
+        )
+        for name, count in rows:
+            counts[name] += count
+    changed = defaultdict(list)
+    for pk, name, references in _blobs().values_list("pk", "name", "references"):
+        if counts[name] != references:
+            changed[counts[name]].append(pk)
+    for references, pks in changed.items():
+        _blobs().filter(pk__in=pks).update(references=references)
+    return sum(len(pks) for pks in changed.values())
+
+
+def release_names(storage, names):
+    """
+    Release the files ``names`` of rows deleted by ``removal.remove()``, one
+    name per row that held it. A blob loses one reference per name, other
+    files are deleted once no file field holds them any more.
+    """
+    names = [name for name in names if name]
+    if isinstance(storage, ContentAddressedStorage):
+        for name in names:
+            storage.delete(name)
+        return
+    for name in set(names) - referenced_names(names):
+        storage.delete(name)
+
+
+def release_files(fieldfiles):
+    """Release the blobs of the deleted ``fieldfiles``."""
+    for fieldfile in fieldfiles:
+        if fieldfile:
+            release_blobs(fieldfile.storage, [fieldfile.name])
+
+
+def release_blobs(storage, names):
+    """
+    Release the blobs ``names`` of deleted rows, one name per row that held
+    it. With other storages, the files are kept.
+    """
+    if isinstance(storage, ContentAddressedStorage):
+        for name in names:
+            if name:
+                storage.delete(name)
+
+
+def _file_digest(storage, name):
+    digest = hashlib.sha256()
+    with storage.open(name, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe(storage=None, dry_run=False, log=None):
+    """
+    Move every file held by a file field but not stored as a blob yet into
+    its blob, point the fields to the blob and delete the duplicates.
+
+    Return a ``Counter`` of ``files`` (distinct names moved), ``blobs``
+    (distinct contents), ``missing`` (names without a file) and ``freed``
+    (bytes of the deleted duplicates). With ``dry_run``, nothing is changed
+    and the counts are what a real run would do.
+    """
+    from .models import (
+        ChapterPage,
+        ChapterPageTranslation,
+        ComicChapter,
+        ComicChapterTranslation,
+    )
+    from .pages import touch_chapters
+
+    storage = storage or default_storage
+    if not isinstance(storage, ContentAddressedStorage):
+        raise TypeError("The default storage is not a ContentAddressedStorage")
+
+    # name -> number of rows holding it, and the fields holding it.
+    references = Counter()
+    holders = defaultdict(list)
+    for model, field in file_fields():
+        rows = (
+            model._base_manager.exclude(**{field: ""})
+            .exclude(**{f"{field}__isnull": True})
+            .exclude(**{f"{field}__startswith": BLOB_ROOT + "/"})
+            .values_list(field)
+            .annotate(rows=Count("pk"))
+        )
+        for name, count in rows:
+            references[name] += count
+            holders[name].append((model, field))
+
+    stats = Counter()
+    seen = set(_blobs().values_list("digest", flat=True))
+    touched = defaultdict(set)
+    for name in sorted(references):
+        if not storage.exists(name):
+            stats["missing"] += 1
+            if log:
+                log(f"Missing file: {name}")
+            continue
+        digest, size = _file_digest(storage, name), storage.size(name)
+        stats["files"] += 1
+        if digest in seen:
+            stats["freed"] += size
+        else:
+            seen.add(digest)
+            stats["blobs"] += 1
+        if dry_run:
+            continue
+        with transaction.atomic():
+            new_name = storage.add_reference(
+                digest, _extension(name), size, storage.path(name), references[name]
+            )
+            for model, field in holders[name]:
+                rows = model._base_manager.filter(**{field: name})
+                if model is ChapterPage:
+                    touched[ComicChapter].update(
+                        rows.values_list("chapter_id", flat=True)
+                    )
+                elif model is ChapterPageTranslation:
+                    touched[ComicChapterTranslation].update(
+                        rows.values_list("chapter_translation_id", flat=True)
+                    )
+                rows.update(**{field: new_name})
+        # Left in place when it was moved into a new blob.
+        if storage.exists(name):
+            os.remove(storage.path(name))
+    # Cached readers still point at the old page names.
+    for model, pks in touched.items():
+        touch_chapters(model, pks)
+    return stats
@@ -0,0 +1,279 @@
+"""
+Vertical strips stitched from the pages of a chapter.
+
+A vertical-scroll reader fetches every page separately, often more than a
+hundred requests per chapter. For comics with ``stitch_pages`` set, the
+pages of each chapter and translated chapter are scaled to ``STRIP_WIDTH``
+and stitched, in order, into a few strips of at most ``STRIP_MAX_HEIGHT``
+pixels (a page taller than that is a strip of its own). The chapter's
+``ChapterStrip`` row lists the strips with the offset and height of each of
+their pages, so that the reader can still map a scroll position to a page.
+
+Strips are stored under ``STRIP_ROOT`` and named after ``version``, a hash
+of the content of the pages in order and of the strip settings, so the same
+pages are never stitched twice and a changed chapter never gets stale
+strips. The row also records the ``modified_at`` of the chapter it was made
+for: as every page change bumps it (see ``pages.touch_chapters``), stale
+strips are noticed from the chapter row alone. They are stitched again in
+the background after page changes (with ``RENDITIONS_EAGER``) or when a
+stale chapter is read, and the chapter is served page by page meanwhile.
+
+Pages are laid out from their stored dimensions (see ``metadata.py``), so
+chapters with a page whose dimensions are unknown are not stitched. Strips
+are encoded in the first ``RENDITION_FORMATS``, except a page too tall for
+it (WebP stops at 16383 pixels), which is a JPEG strip of its own. Chapters
+that can not be stitched are not tried again until their pages change.
+"""
+
+import hashlib
+import io
+import json
+import logging
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .conf import get_setting
+from .models import ChapterStrip, ComicChapter, ComicChapterTranslation
+from .renditions import FORMATS, content_hash, flatten, store_once
+from .workers import background_pool, pool_map
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED_CACHE_PREFIX = "trang_tranh:stitching:"
+SCHEDULED_TIMEOUT = 10 * 60
+
+# Strips stitched at a time, which bounds the page images held in memory.
+PARALLEL_STRIPS = 4
+
+# Tallest image each format can encode, in pixels.
+MAX_HEIGHTS = {"webp": 16383, "jpeg": 65535}
+
+
+def _options(model):
+    """Return the page relation, strip field and comic path of a chapter model."""
+    if model is ComicChapter:
+        return "chapterpage_set", "chapter", "comic"
+    if model is ComicChapterTranslation:
+        return (
+            "chapterpagetranslation_set",
+            "chapter_translation",
+            "comic_translation__comic",
+        )
+    raise TypeError(f"{model.__name__} has no strips")
+
+
+def plan_strips(heights, max_height):
+    """
+    Split pages of ``heights`` into runs of consecutive pages at most
+    ``max_height`` high, and return the page indexes of each run.
+    """
+    strips, current, height = [], [], 0
+    for index, page_height in enumerate(heights):
+        if current and height + page_height > max_height:
+            strips.append(current)
+            current, height = [], 0
+        current.append(index)
+        height += page_height
+    if current:
+        strips.append(current)
+    return strips
+
+
+def stitch_images(images, width, heights, fmt, quality):
+    """
+    Return the images ``images`` scaled to ``width`` x ``heights`` and
+    stacked into one ``fmt`` image, or ``None`` when one can not be decoded.
+
+    Runs in a worker process, so it only deals with bytes.
+    """
+    strip = Image.new("RGB", (width, sum(heights)), "white")
+    top = 0
+    output = io.BytesIO()
+    try:
+        for data, height in zip(images, heights):
+            with Image.open(io.BytesIO(data)) as original:
+                image = ImageOps.exif_transpose(original)
+            image = flatten(image, keep_alpha=False).convert("RGB")
+            strip.paste(image.resize((width, height), Image.LANCZOS), (0, top))
+            top += height
+        strip.save(output, FORMATS[fmt][0], quality=quality)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return output.getvalue()
+
+
+def strip_name(version, index, fmt):
+    return "%s/%s/%s/%d.%s" % (
+        get_setting("STRIP_ROOT"),
+        version[:2],
+        version,
+        index,
+        FORMATS[fmt][1],
+    )
+
+
+def stitch_chapter(chapter):
+    """
+    Stitch the strips of ``chapter`` that do not exist yet, record them in
+    its ``ChapterStrip`` and return it. Return ``None`` when the chapter
+    has no pages or a page can not be read or laid out.
+    """
+    model = type(chapter)
+    relation, strip_field, _comic_path = _options(model)
+    # Read first: pages changed while stitching make the strips stale.
+    modified_at = (
+        model._base_manager.filter(pk=chapter.pk)
+        .values_list("modified_at", flat=True)
+        .get()
+    )
+    pages = list(
+        getattr(chapter, relation)
+        .only("page_number", "page_image", "page_image_width", "page_image_height")
+        .order_by("page_number")
+    )
+    if not pages or not all(
+        page.page_image and page.page_image_width and page.page_image_height
+        for page in pages
+    ):
+        return None
+    width = get_setting("STRIP_WIDTH")
+    fmt = get_setting("RENDITION_FORMATS")[0]
+    max_height = min(get_setting("STRIP_MAX_HEIGHT"), MAX_HEIGHTS[fmt])
+    quality = get_setting("RENDITION_QUALITY")
+    try:
+        digests = [content_hash(page.page_image) for page in pages]
+    except OSError:
+        logger.warning("Can not read the pages of %r to stitch them", chapter)
+        return None
+    version = hashlib.sha256(
+        json.dumps([width, max_height, fmt, quality, digests]).encode()
+    ).hexdigest()
+    heights = [
+        max(1, round(page.page_image_height * width / page.page_image_width))
+        for page in pages
+    ]
+
+    storage = default_storage
+    segments, jobs = [], []
+    for index, run in enumerate(plan_strips(heights, max_height)):
+        offsets, top = [], 0
+        for i in run:
+            offsets.append([pages[i].page_number, top, heights[i]])
+            top += heights[i]
+        # A single page too tall for the format is stitched in a taller one.
+        strip_fmt = next((f for f in (fmt, *FORMATS) if top <= MAX_HEIGHTS[f]), None)
+        if strip_fmt is None:
+            logger.warning(
+                "Page %d of %r is too tall to stitch",
+                pages[run[0]].page_number,
+                chapter,
+            )
+            return None
+        name = strip_name(version, index, strip_fmt)
+        segments.append({"name": name, "height": top, "pages": offsets})
+        if not storage.exists(name):
+            jobs.append((name, run, strip_fmt))
+
+    for start in range(0, len(jobs), PARALLEL_STRIPS):
+        chunk = jobs[start : start + PARALLEL_STRIPS]
+        results = pool_map(
+            stitch_images,
+            [[_read(pages[i].page_image) for i in run] for _name, run, _fmt in chunk],
+            [width] * len(chunk),
+            [[heights[i] for i in run] for _name, run, _fmt in chunk],
+            [strip_fmt for _name, _run, strip_fmt in chunk],
+            [quality] * len(chunk),
+        )
+        for (name, _run, _fmt), data in zip(chunk, results):
+            if data is None:
+                logger.warning("Can not stitch the pages of %r", chapter)
+                return None
+            store_once(storage, name, data)
+
+    strip, _created = ChapterStrip.objects.update_or_create(
+        **{strip_field: chapter},
+        defaults={
+            "version": version,
+            "chapter_modified_at": modified_at,
+            "width": width,
+            "segments": segments,
+        },
+    )
+    return strip
+
+
+def _read(fieldfile):
+    with fieldfile.storage.open(fieldfile.name, "rb") as f:
+        return f.read()
+
+
+def reader_strips(strip):
+    """Return the segments of ``strip`` with the URL of their image."""
+    return [
+        {
+            **segment,
+            "url": default_storage.url(segment["name"]),
+            "width": strip.width,
+            "first_page": segment["pages"][0][0],
+            "last_page": segment["pages"][-1][0],
+            "offsets": json.dumps(segment["pages"]),
+        }
+        for segment in strip.segments
+    ]
+
+
+def _scheduled_key(chapter):
+    return "%s%s:%s:%s" % (
+        SCHEDULED_CACHE_PREFIX,
+        chapter._meta.label,
+        chapter.pk,
+        chapter.modified_at.timestamp(),
+    )
+
+
+def current_strips(chapter, comic):
+    """
+    Return the ``ChapterStrip`` of ``chapter``, fetched with it, if
+    ``comic`` stitches its pages and the strips are up to date. Otherwise
+    schedule the stitching and return ``None``.
+    """
+    if not comic.stitch_pages:
+        return None
+    strip = getattr(chapter, "chapterstrip", None)
+    if strip is not None and strip.chapter_modified_at == chapter.modified_at:
+        return strip
+    # Every reader of a stale chapter would schedule it otherwise.
+    if cache.add(_scheduled_key(chapter), True, SCHEDULED_TIMEOUT):
+        background_pool().submit(_stitch_in_background, type(chapter), [chapter.pk])
+    return None
+
+
+def with_stitch_pages(queryset):
+    """Annotate chapters with the ``stitch_pages`` flag of their comic."""
+    _relation, _strip_field, comic_path = _options(queryset.model)
+    return queryset.annotate(stitch_pages=F(f"{comic_path}__stitch_pages"))
+
+
+def schedule_stitching(model, pks):
+    """
+    Stitch the strips of the ``model`` chapters ``pks``, whose comics stitch
+    their pages, in the background with ``RENDITIONS_EAGER``.
+    """
+    pks = list(pks)
+    if pks and get_setting("RENDITIONS_EAGER"):
+        background_pool().submit(_stitch_in_background, model, pks)
+
+
+def _stitch_in_background(model, pks):
+    for chapter in model._base_manager.filter(pk__in=pks):
+        try:
+            strip = stitch_chapter(chapter)
+        except Exception:
+            logger.exception("Failed to stitch %r", chapter)
+            continue
+        if strip is None:
+            # Not tried again by readers until the pages change.
+            cache.set(_scheduled_key(chapter), True, None)
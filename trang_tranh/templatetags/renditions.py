@@ -0,0 +1,30 @@
+from django import template
+
+from ..renditions import rendition_url
+
+register = template.Library()
+
+
+@register.filter
+def rendition(fieldfile, spec="thumb"):
+    """
+    Return the URL of a resized rendition of an image field.
+
+    ``spec`` is a rendition size, optionally followed by a format::
+
+        {{ comic.vertical_cover|rendition:"thumb" }}
+        {{ page.page_image|rendition:"large:jpeg" }}
+    """
+    size, _, fmt = spec.partition(":")
+    return rendition_url(fieldfile, size, fmt or None)
+
+
+@register.filter
+def lazy_rendition(fieldfile, spec="thumb"):
+    """
+    Like ``rendition``, but never renders in the request: the original is
+    returned until the rendition is ready, which is rendered in the
+    background.
+    """
+    size, _, fmt = spec.partition(":")
+    return rendition_url(fieldfile, size, fmt or None, lazy=True)
@@ -1,3 +1,2227 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router, transaction
+from django.db.models import Max
+from django.template import Context, Template
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import admin
+from .analytics import publisher_reads, record_publisher_reads
+from .benchmarks import suite as benchmark_suite
+from .benchmarks.dataset import DatasetSize, generate
+from .cleanup import collect_garbage
+from .counters import ReadCounterBuffer, read_counter, read_counts_flushed
+from .coverage import comic_coverage
+from .cursors import CursorPaginator, InvalidCursor
+from .db import read_from_replica, replica_reads
+from .instrumentation import (
+    COUNTERS,
+    RequestStats,
+    record,
+    request_statistics,
+    reset as reset_request_stats,
+)
+from .localization import localize_comics
+from .manifests import chapter_manifests, versioned_manifest
+from .models import (
+    ChapterPage,
+    ChapterPageTranslation,
+    Comic,
+    ComicAuthor,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicReadBucket,
+    ComicTranslation,
+    MediaBlob,
+    PublisherReadBucket,
+    User,
+    UserProfile,
+)
+from .pages import (
+    bulk_create_chapter_page_translations,
+    bulk_create_chapter_pages,
+    delete_pages,
+    insert_pages,
+    move_page,
+    reorder_pages,
+    touch_chapters,
+)
+from .rankings import decayed_reads, record_reads, top_comics
+from .removal import remove, removal_progress
+from .renditions import content_hash, generate_renditions, rendition_name
+from .search import rebuild_index, search
+from .sequences import publish_chapter, reserve_chapters
+from .storage import blob_digest
+from .strips import _stitch_in_background, plan_strips, stitch_chapter
+from .workers import pool_map
 
 # Create your tests here.
+
+
+def make_image(name="page.png", size=(8, 12), color="white"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class TemporaryMediaMixin:
+    """Point MEDIA_ROOT at a temporary directory for the test case."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+def create_comic(title="Comic", publisher=None, **kwargs):
+    if publisher is None:
+        user = User.objects.create(username=f"publisher-{User.objects.count()}")
+        publisher = UserProfile.objects.create(user=user, name="Publisher", bio="")
+    kwargs.setdefault("vertical_cover", "comic-covers/vertical/cover.png")
+    kwargs.setdefault("horizontal_cover", "comic-covers/horizontal/cover.png")
+    return Comic.objects.create(title=title, publisher=publisher, **kwargs)
+
+
+def create_chapter(comic, counter=1, **kwargs):
+    kwargs.setdefault("cover", "chapter-covers/cover.png")
+    kwargs.setdefault("chapter_number", counter)
+    return ComicChapter.objects.create(
+        comic=comic, chapter_counter=counter, title=f"Chapter {counter}", **kwargs
+    )
+
+
+class ReadCounterBufferTests(TestCase):
+    def setUp(self):
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2)]
+        self.translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=self.translation, translated_title="Chuong 1"
+        )
+        self.buffer = ReadCounterBuffer(flush_interval=0)
+
+    def test_increments_are_buffered_until_flush(self):
+        self.buffer.increment(ComicChapter, self.chapters[0].pk)
+        self.buffer.increment(ComicChapter, self.chapters[0].pk)
+        self.chapters[0].refresh_from_db()
+        self.assertEqual(self.chapters[0].read_count, 0)
+
+        self.buffer.flush()
+        self.chapters[0].refresh_from_db()
+        self.assertEqual(self.chapters[0].read_count, 2)
+        self.assertEqual(self.buffer.pending(), {})
+
+    def test_flush_groups_rows_by_increment(self):
+        for chapter in self.chapters:
+            self.buffer.increment(ComicChapter, chapter.pk, 3)
+        self.buffer.increment(ComicChapterTranslation, self.chapter_translation.pk)
+        self.buffer.increment(Comic, self.comic.pk, 7)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.buffer.flush()
+
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+
+        self.assertEqual(
+            list(
+                ComicChapter.objects.order_by("pk").values_list("read_count", flat=True)
+            ),
+            [3, 3],
+        )
+        self.chapter_translation.refresh_from_db()
+        self.assertEqual(self.chapter_translation.read_count, 1)
+        self.comic.refresh_from_db()
+        self.assertEqual(self.comic.read_count, 7)
+
+    def test_flush_sends_signal_with_written_counts(self):
+        received = []
+
+        def receiver(sender, counts, **kwargs):
+            received.append(counts)
+
+        read_counts_flushed.connect(receiver)
+        self.addCleanup(read_counts_flushed.disconnect, receiver)
+        self.buffer.increment(Comic, self.comic.pk, 2)
+        self.buffer.flush()
+        self.buffer.flush()
+
+        self.assertEqual(received, [{Comic: {self.comic.pk: 2}}])
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser("admin", "", "password")
+        self.client.force_login(self.admin_user)
+        self.authors = [
+            ComicAuthor.objects.create(pen_name=f"Author {i}") for i in range(3)
+        ]
+
+    def add_comic(self):
+        comic = create_comic(title=f"Comic {Comic.objects.count()}")
+        comic.author.set(self.authors)
+        chapter = create_chapter(comic)
+        create_chapter(comic, 2)
+        ChapterPage.objects.create(chapter=chapter, page_image="page-images/1.png")
+        return comic
+
+    def count_changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_comic()
+        few = self.count_changelist_queries(url)
+        for _ in range(4):
+            self.add_comic()
+        self.assertEqual(self.count_changelist_queries(url), few)
+
+    def test_comic_changelist(self):
+        self.assertConstantQueries(reverse("admin:trang_tranh_comic_changelist"))
+
+    def test_comic_changelist_sorted_by_annotations(self):
+        url = reverse("admin:trang_tranh_comic_changelist")
+        self.add_comic()
+        for ordering in ("2", "4", "-4"):
+            self.assertEqual(self.client.get(url, {"o": ordering}).status_code, 200)
+
+    def test_chapter_page_changelist(self):
+        self.assertConstantQueries(reverse("admin:trang_tranh_chapterpage_changelist"))
+
+    def test_comic_chapter_changelist(self):
+        self.assertConstantQueries(reverse("admin:trang_tranh_comicchapter_changelist"))
+
+
+class BulkPageUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.chapter = create_chapter(create_comic())
+
+    def test_pages_are_numbered_after_existing_pages(self):
+        ChapterPage.objects.create(chapter=self.chapter, page_image=make_image())
+        bulk_create_chapter_pages(self.chapter, [make_image(), make_image()])
+        self.assertEqual(
+            list(
+                self.chapter.chapterpage_set.order_by("page_number").values_list(
+                    "page_number", flat=True
+                )
+            ),
+            [1, 2, 3],
+        )
+
+    def test_query_count_does_not_depend_on_page_count(self):
+        with CaptureQueriesContext(connection) as few:
+            bulk_create_chapter_pages(self.chapter, [make_image()])
+        with CaptureQueriesContext(connection) as many:
+            bulk_create_chapter_pages(
+                self.chapter, [make_image(f"{i}.png") for i in range(20)]
+            )
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(self.chapter.chapterpage_set.count(), 21)
+
+    def test_gaps_in_existing_pages_are_rejected(self):
+        ChapterPage.objects.bulk_create(
+            [ChapterPage(chapter=self.chapter, page_image="p.png", page_number=2)]
+        )
+        with self.assertRaises(ValidationError):
+            bulk_create_chapter_pages(self.chapter, [make_image()])
+
+    def test_translation_pages(self):
+        translation = ComicTranslation.objects.create(
+            comic=self.chapter.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=translation, translated_title="Chuong 1"
+        )
+        pages = bulk_create_chapter_page_translations(
+            chapter_translation, [make_image(), make_image()]
+        )
+        self.assertEqual([page.page_number for page in pages], [1, 2])
+        self.assertEqual(ChapterPageTranslation.objects.count(), 2)
+
+    def test_admin_upload_view_sorts_files_naturally(self):
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        url = reverse(
+            "admin:trang_tranh_comicchapter_upload_pages", args=[self.chapter.pk]
+        )
+        change_url = reverse(
+            "admin:trang_tranh_comicchapter_change", args=[self.chapter.pk]
+        )
+        self.assertContains(self.client.get(change_url), url)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(
+            url, {"images": [make_image("p10.png"), make_image("p2.png")]}
+        )
+        self.assertEqual(response.status_code, 302)
+        names = list(
+            self.chapter.chapterpage_set.order_by("page_number").values_list(
+                "page_image", flat=True
+            )
+        )
+        self.assertEqual(len(names), 2)
+        self.assertIn("p2", names[0])
+        self.assertIn("p10", names[1])
+
+
+@override_settings(TRANG_TRANH_WORKER_PROCESSES=0)
+class PageRenumberTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.chapter = create_chapter(create_comic())
+        ChapterPage.objects.bulk_create(
+            ChapterPage(chapter=self.chapter, page_image=f"p{n}.png", page_number=n)
+            for n in range(1, 7)
+        )
+
+    def page_order(self):
+        return [
+            os.path.splitext(os.path.basename(name))[0]
+            for name in self.chapter.chapterpage_set.order_by(
+                "page_number"
+            ).values_list("page_image", flat=True)
+        ]
+
+    def test_insert_shifts_later_pages(self):
+        insert_pages(self.chapter, [make_image("new.png")], position=3)
+        order = self.page_order()
+        self.assertEqual(order[:2] + order[3:], ["p1", "p2", "p3", "p4", "p5", "p6"])
+        self.assertTrue(order[2].startswith("new"))
+        self.assertEqual(
+            list(
+                self.chapter.chapterpage_set.order_by("page_number").values_list(
+                    "page_number", flat=True
+                )
+            ),
+            [1, 2, 3, 4, 5, 6, 7],
+        )
+
+    def test_delete_closes_gaps(self):
+        self.assertEqual(delete_pages(self.chapter, [2, 4, 5]), 3)
+        self.assertEqual(self.page_order(), ["p1", "p3", "p6"])
+        self.assertEqual(
+            self.chapter.chapterpage_set.aggregate(last=Max("page_number"))["last"], 3
+        )
+
+    def test_delete_is_constant_number_of_queries(self):
+        ChapterPage.objects.bulk_create(
+            ChapterPage(chapter=self.chapter, page_image=f"q{n}.png", page_number=n)
+            for n in range(7, 53)
+        )
+        with CaptureQueriesContext(connection) as one:
+            delete_pages(self.chapter, [1])
+        with CaptureQueriesContext(connection) as many:
+            delete_pages(self.chapter, range(1, 51))
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(self.chapter.chapterpage_set.count(), 1)
+
+    def test_move_page(self):
+        move_page(self.chapter, 2, 5)
+        self.assertEqual(self.page_order(), ["p1", "p3", "p4", "p5", "p2", "p6"])
+        move_page(self.chapter, 6, 1)
+        self.assertEqual(self.page_order(), ["p6", "p1", "p3", "p4", "p5", "p2"])
+
+    def test_reorder_is_constant_number_of_updates(self):
+        pks = list(
+            self.chapter.chapterpage_set.order_by("-page_number").values_list(
+                "pk", flat=True
+            )
+        )
+        with CaptureQueriesContext(connection) as queries:
+            reorder_pages(self.chapter, pks)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        # Touching the chapter and the two renumbering statements.
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.page_order(), ["p6", "p5", "p4", "p3", "p2", "p1"])
+        with self.assertRaises(ValidationError):
+            reorder_pages(self.chapter, pks[1:])
+
+    def test_admin_reorder_view(self):
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        url = reverse(
+            "admin:trang_tranh_comicchapter_reorder_pages", args=[self.chapter.pk]
+        )
+        # The test pages have no files, their thumbnails can not be rendered.
+        with mock.patch(
+            "trang_tranh.renditions.background_pool", return_value=InlineExecutor()
+        ), self.assertLogs("trang_tranh.renditions", "WARNING"):
+            response = self.client.get(url)
+        self.assertContains(response, 'src="/media/p1.png"')
+        data = {}
+        for page in self.chapter.chapterpage_set.all():
+            data[f"position-{page.pk}"] = 7 - page.page_number
+            if page.page_number == 1:
+                data[f"delete-{page.pk}"] = "on"
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.page_order(), ["p6", "p5", "p4", "p3", "p2"])
+
+
+@override_settings(
+    TRANG_TRANH_WORKER_PROCESSES=0,
+    TRANG_TRANH_RENDITION_SIZES={"thumb": 4, "large": 100},
+)
+class RenditionTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.chapter = create_chapter(create_comic())
+        self.page = ChapterPage.objects.create(
+            chapter=self.chapter, page_image=make_image(size=(8, 12))
+        )
+
+    def rendition_files(self):
+        root = os.path.join(self.media_root, "renditions")
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, name), root)
+            for dirpath, _, names in os.walk(root)
+            for name in names
+        )
+
+    def test_rendition_is_scaled_and_generated_once(self):
+        url = self.page.rendition_url("page_image", "thumb")
+        self.assertTrue(url.endswith("/thumb.webp"))
+        name = url[len(default_storage.base_url) :]
+        with default_storage.open(name) as f, Image.open(f) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (4, 6))
+
+        with mock.patch("trang_tranh.renditions.render_renditions") as render:
+            self.assertEqual(self.page.rendition_url("page_image", "thumb"), url)
+        render.assert_not_called()
+
+    def test_images_are_never_scaled_up(self):
+        url = self.page.rendition_url("page_image", "large", "jpeg")
+        with default_storage.open(url[len(default_storage.base_url) :]) as f:
+            with Image.open(f) as image:
+                self.assertEqual(image.format, "JPEG")
+                self.assertEqual(image.size, (8, 12))
+
+    def test_content_hash_follows_a_reused_name(self):
+        name = self.page.page_image.name
+        digest = content_hash(self.page.page_image)
+        default_storage.delete(name)
+        self.assertEqual(
+            default_storage.save(name, make_image(size=(9, 12), color="red")), name
+        )
+        self.assertNotEqual(content_hash(self.page.page_image), digest)
+
+    def test_identical_uploads_share_renditions(self):
+        other = ChapterPage.objects.create(
+            chapter=self.chapter, page_image=make_image(size=(8, 12)), page_number=2
+        )
+        self.assertNotEqual(other.page_image.name, self.page.page_image.name)
+        names = generate_renditions([self.page.page_image, other.page_image])
+        self.assertEqual(
+            names[self.page.page_image.name, "thumb", "webp"],
+            names[other.page_image.name, "thumb", "webp"],
+        )
+        self.assertEqual(len(self.rendition_files()), 4)
+
+    @override_settings(TRANG_TRANH_WORKER_PROCESSES=2)
+    def test_renditions_are_rendered_in_process_pool(self):
+        names = generate_renditions([self.page.page_image])
+        self.assertEqual(len(names), 4)
+        self.assertEqual(len(self.rendition_files()), 4)
+
+    def test_template_filter(self):
+        template = Template(
+            '{% load renditions %}{{ page.page_image|rendition:"thumb:jpeg" }}'
+        )
+        self.assertTrue(
+            template.render(Context({"page": self.page})).endswith("/thumb.jpg")
+        )
+
+    def test_lazy_template_filter_renders_in_the_background(self):
+        template = Template(
+            "{% load renditions %}{{ page.page_image|lazy_rendition:'thumb' }}"
+        )
+        context = Context({"page": self.page})
+        with mock.patch(
+            "trang_tranh.renditions.background_pool", return_value=InlineExecutor()
+        ):
+            self.assertEqual(template.render(context), self.page.page_image.url)
+        self.assertTrue(template.render(context).endswith("/thumb.webp"))
+
+    def test_unreadable_original_falls_back_to_original_url(self):
+        self.page.page_image.name = "page-images/missing.png"
+        with self.assertLogs("trang_tranh.renditions", "WARNING"):
+            url = self.page.rendition_url("page_image")
+        self.assertEqual(url, self.page.page_image.url)
+
+    def test_renditions_are_scheduled_after_upload(self):
+        with mock.patch("trang_tranh.signals.schedule_renditions") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chapter.cover = make_image("cover.png")
+                self.chapter.save()
+        schedule.assert_called_once_with([self.chapter.cover])
+
+
+@override_settings(TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None)
+class ReaderViewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2, 4)]
+        self.chapter = self.chapters[1]
+        bulk_create_chapter_pages(
+            self.chapter, [make_image(f"{i}.png") for i in range(5)]
+        )
+        self.url = self.chapter.get_absolute_url()
+
+    def test_reader_renders_pages_and_neighbours(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["pages"]), 5)
+        self.assertEqual(
+            response.context["previous_url"], self.chapters[0].get_absolute_url()
+        )
+        self.assertEqual(
+            response.context["next_url"], self.chapters[2].get_absolute_url()
+        )
+        links = response.headers["Link"].split(", ")
+        self.assertEqual(len(links), 4)
+        self.assertTrue(links[0].endswith("; rel=preload; as=image"))
+        self.assertEqual(
+            links[-1], f"<{self.chapters[2].get_absolute_url()}>; rel=prefetch"
+        )
+
+    def test_repeat_request_is_not_modified(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_page_change_invalidates_etag(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        page = self.chapter.chapterpage_set.get(page_number=5)
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=self.chapter.modified_at.replace(year=2099),
+        ):
+            page.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_reads_are_counted(self):
+        read_counter.flush()
+        etag = self.client.get(self.url).headers["ETag"]
+        # Revalidations are not counted.
+        self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            read_counter.pending(),
+            {ComicChapter: {self.chapter.pk: 1}, Comic: {self.comic.pk: 1}},
+        )
+        read_counter.flush()
+
+    def test_translation_reader(self):
+        translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=translation, translated_title="Chuong 1"
+        )
+        bulk_create_chapter_page_translations(chapter_translation, [make_image()])
+        response = self.client.get(chapter_translation.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Chuong 1")
+        self.assertIsNone(response.context["next_url"])
+
+    def test_comic_detail_lists_chapters(self):
+        self.comic.author.add(ComicAuthor.objects.create(pen_name="Dragonfly"))
+        with self.assertLogs("trang_tranh.renditions", "WARNING"):
+            response = self.client.get(self.comic.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Author: Dragonfly")
+        for chapter in self.chapters:
+            self.assertContains(response, chapter.get_absolute_url())
+
+
+class LocalizationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.comics = [create_comic(title=f"Comic {i}") for i in range(3)]
+        for comic in self.comics[:2]:
+            ComicTranslation.objects.create(
+                comic=comic,
+                language="vi",
+                translated_title=f"Truyen {comic.title}",
+                translated_summary="Tom tat",
+            )
+
+    def test_batch_is_resolved_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            comics = localize_comics(self.comics, "vi")
+        self.assertEqual(
+            [comic.localized_title for comic in comics],
+            ["Truyen Comic 0", "Truyen Comic 1", "Comic 2"],
+        )
+        with self.assertNumQueries(0):
+            localize_comics(self.comics, "vi")
+
+    def test_default_language_needs_no_query(self):
+        with self.assertNumQueries(0):
+            comics = localize_comics(self.comics, "en")
+        self.assertEqual(comics[0].localized_title, "Comic 0")
+
+    def test_translation_changes_invalidate_cache(self):
+        localize_comics(self.comics, "vi")
+        translation = ComicTranslation.objects.get(comic=self.comics[0])
+        translation.translated_title = "Moi"
+        translation.save()
+        ComicTranslation.objects.create(
+            comic=self.comics[2],
+            language="vi",
+            translated_title="Truyen moi",
+            translated_summary="Tom tat",
+        )
+        comics = localize_comics(self.comics, "vi")
+        self.assertEqual(comics[0].localized_title, "Moi")
+        self.assertEqual(comics[2].localized_title, "Truyen moi")
+
+        translation.delete()
+        self.assertEqual(
+            localize_comics(self.comics, "vi")[0].localized_title, "Comic 0"
+        )
+
+    def test_queryset_annotation(self):
+        titles = (
+            Comic.objects.localized("vi")
+            .order_by("pk")
+            .values_list("localized_title", flat=True)
+        )
+        self.assertEqual(list(titles), ["Truyen Comic 0", "Truyen Comic 1", "Comic 2"])
+
+    @override_settings(TRANG_TRANH_WORKER_PROCESSES=0)
+    def test_catalog_uses_active_language(self):
+        # Thumbnails are rendered in the background, the originals are
+        # linked meanwhile.
+        with mock.patch(
+            "trang_tranh.renditions.background_pool"
+        ), self.assertNumQueries(3):
+            response = self.client.get("/vi/")
+        self.assertContains(response, self.comics[0].vertical_cover.url)
+        self.assertContains(response, "Truyen Comic 0")
+        self.assertContains(response, "Comic 2")
+
+
+class MediaServingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.name = default_storage.save("page-images/page.png", make_image())
+        with default_storage.open(self.name) as f:
+            self.content = f.read()
+        self.url = default_storage.url(self.name)
+
+    def test_full_response(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertIn("max-age=3600", response.headers["Cache-Control"])
+
+    def test_byte_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[2:10])
+        self.assertEqual(
+            response.headers["Content-Range"], f"bytes 2-9/{len(self.content)}"
+        )
+        self.assertEqual(response.headers["Content-Length"], "8")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-4:])
+
+    def test_unsatisfiable_and_stale_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_request(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_traversal(self):
+        self.assertEqual(
+            self.client.get("/media/page-images/nope.png").status_code, 404
+        )
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/page-images").status_code, 404)
+
+    def test_content_hashed_files_are_immutable(self):
+        name = default_storage.save(
+            f"renditions/ab/{'ab' * 32}/thumb.webp", make_image()
+        )
+        response = self.client.get(default_storage.url(name))
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+
+    @override_settings(TRANG_TRANH_MEDIA_OFFLOAD="x-accel-redirect")
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response.headers["X-Accel-Redirect"], "/protected-media/" + self.name
+        )
+
+    @override_settings(TRANG_TRANH_MEDIA_OFFLOAD="x-sendfile")
+    def test_x_sendfile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.headers["X-Sendfile"], os.path.join(self.media_root, self.name)
+        )
+
+
+@override_settings(TRANG_TRANH_WORKER_PROCESSES=0)
+class ImportChapterTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.comic = create_comic()
+        self.archives = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archives)
+
+    def make_archive(self, name, pages, broken=()):
+        path = os.path.join(self.archives, name)
+        with zipfile.ZipFile(path, "w") as archive:
+            for page in pages:
+                data = b"not an image" if page in broken else make_image().read()
+                archive.writestr(f"chapter/{page}", data)
+            archive.writestr("__MACOSX/chapter/._p1.png", b"junk")
+            archive.writestr("chapter/info.txt", b"credits")
+        return path
+
+    def page_names(self, chapter, page_set="chapterpage_set"):
+        return [
+            os.path.basename(name)
+            for name in getattr(chapter, page_set)
+            .order_by("page_number")
+            .values_list("page_image", flat=True)
+        ]
+
+    def test_import_archive_in_natural_order(self):
+        path = self.make_archive("Chapter 1.cbz", ["p10.png", "p2.png", "p1.png"])
+        call_command("import_chapter", path, comic=self.comic.pk, stdout=io.StringIO())
+
+        chapter = ComicChapter.objects.get(comic=self.comic)
+        self.assertEqual(chapter.title, "Chapter 1")
+        self.assertEqual((chapter.chapter_counter, chapter.chapter_number), (1, 1))
+        self.assertTrue(chapter.cover.name.startswith("chapter-covers/p1"))
+        names = self.page_names(chapter)
+        self.assertEqual(len(names), 3)
+        for name, expected in zip(names, ("p1", "p2", "p10")):
+            self.assertTrue(name.startswith(expected + "."), name)
+
+    def test_broken_page_imports_nothing(self):
+        path = self.make_archive("c.cbz", ["p1.png", "p2.png"], broken=["p2.png"])
+        with self.assertRaisesMessage(CommandError, "chapter/p2.png"):
+            call_command("import_chapter", path, comic=self.comic.pk)
+        self.assertFalse(ComicChapter.objects.exists())
+
+    @override_settings(TRANG_TRANH_WORKER_PROCESSES=2)
+    def test_import_directory_into_translation(self):
+        translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.make_archive("ch10.zip", ["a.png"])
+        self.make_archive("ch2.cbz", ["a.png", "b.png"])
+        call_command(
+            "import_chapter",
+            self.archives,
+            translation=translation.pk,
+            stdout=io.StringIO(),
+        )
+        chapters = list(
+            ComicChapterTranslation.objects.order_by("chapter_counter").values_list(
+                "translated_title", "chapter_counter"
+            )
+        )
+        self.assertEqual(chapters, [("ch2", 1), ("ch10", 2)])
+        self.assertEqual(ChapterPageTranslation.objects.count(), 3)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.comic = create_comic(title="Dragon Quest", summary="A long journey")
+        self.other = create_comic(title="Ocean Tales", summary="Dragons at sea")
+        self.translation = ComicTranslation.objects.create(
+            comic=self.other,
+            language="vi",
+            translated_title="Chuyện biển",
+            translated_summary="Rồng trên biển",
+        )
+        self.chapter = create_chapter(self.comic)
+        self.chapter.title = "The dragon awakens"
+        self.chapter.save()
+        self.author = ComicAuthor.objects.create(pen_name="Dragonfly")
+
+    def test_results_are_ranked_and_typed(self):
+        results = search("dragon")
+        self.assertEqual(
+            {(result.model, result.object_id) for result in results},
+            {
+                (Comic, self.comic.pk),
+                (Comic, self.other.pk),
+                (ComicChapter, self.chapter.pk),
+                (ComicAuthor, self.author.pk),
+            },
+        )
+        # A title match weighs more than a summary match.
+        comics = [result.object_id for result in results if result.model is Comic]
+        self.assertEqual(comics, [self.comic.pk, self.other.pk])
+
+    def test_diacritics_and_language(self):
+        results = search("chuyen bien", language="vi")
+        self.assertEqual(
+            [(r.model, r.object_id) for r in results],
+            [(ComicTranslation, self.translation.pk)],
+        )
+        self.assertEqual(results[0].comic_id, self.other.pk)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.chapter.title = "Quiet morning"
+        self.chapter.save()
+        self.assertFalse(search("awakens"))
+        self.assertTrue(search("quiet", models=[ComicChapter]))
+        self.author.delete()
+        self.assertFalse(search("dragonfly"))
+
+    def test_chapters_follow_only_language_changes(self):
+        def index_writes(queries):
+            return [q for q in queries if "INTO trang_tranh_searchindex" in q["sql"]]
+
+        self.comic.read_count = 10
+        with CaptureQueriesContext(connection) as queries:
+            self.comic.save()
+        self.assertEqual(index_writes(queries), [])
+
+        self.comic.summary = "A short trip"
+        with CaptureQueriesContext(connection) as queries:
+            self.comic.save()
+        self.assertEqual(len(index_writes(queries)), 1)
+
+        self.comic.default_language = "vi"
+        self.comic.save()
+        (result,) = search("awakens", models=[ComicChapter])
+        self.assertEqual(result.language, "vi")
+
+    def test_syntax_is_never_an_error(self):
+        self.assertEqual(search('"dragon OR (NEAR'), [])
+        self.assertEqual(search("   "), [])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM trang_tranh_searchindex")
+        self.assertFalse(search("dragon"))
+        self.assertEqual(rebuild_index(batch_size=2), 5)
+        self.assertEqual(len(search("dragon")), 4)
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        response = self.client.get(
+            reverse("admin:trang_tranh_comic_changelist"), {"q": "bien"}
+        )
+        self.assertEqual(list(response.context["cl"].result_list), [self.other])
+
+    def test_public_search_endpoint(self):
+        response = self.client.get("/en/search/", {"q": "dragon", "limit": 2})
+        self.assertEqual(len(response.json()["results"]), 2)
+        response = self.client.get("/en/search/", {"q": "dragon quest"})
+        results = response.json()["results"]
+        self.assertEqual(results[0]["type"], "comic")
+        self.assertEqual(results[0]["url"], self.comic.get_absolute_url())
+        response = self.client.get("/en/search/", {"q": "awakens"})
+        self.assertEqual(
+            response.json()["results"][0]["url"], self.chapter.get_absolute_url()
+        )
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        self.old_hit = create_comic(title="Old hit")
+        self.new_hit = create_comic(title="New hit")
+        self.now = timezone.now()
+
+    def ranking(self, period, language=""):
+        return [trend.comic for trend in top_comics(period, language)]
+
+    def test_decay_separates_trending_from_popular(self):
+        record_reads({(self.old_hit.pk, "en"): 10}, when=self.now - timedelta(days=14))
+        record_reads({(self.new_hit.pk, "en"): 4}, when=self.now)
+
+        self.assertEqual(self.ranking("a"), [self.old_hit, self.new_hit])
+        self.assertEqual(self.ranking("w"), [self.new_hit, self.old_hit])
+        self.assertEqual(self.ranking("d", "en"), [self.new_hit, self.old_hit])
+
+        weekly = top_comics("w")
+        self.assertAlmostEqual(decayed_reads(weekly[0], self.now), 4)
+        self.assertAlmostEqual(decayed_reads(weekly[1], self.now), 2.5)
+
+    def test_updates_are_incremental_and_per_language(self):
+        record_reads({(self.old_hit.pk, "en"): 2, (self.old_hit.pk, "vi"): 1}, self.now)
+        record_reads({(self.old_hit.pk, "vi"): 3}, self.now)
+
+        all_time = {
+            trend.language: decayed_reads(trend, self.now)
+            for trend in self.old_hit.comictrend_set.filter(period="a")
+        }
+        self.assertEqual(set(all_time), {"", "en", "vi"})
+        self.assertAlmostEqual(all_time[""], 6)
+        self.assertAlmostEqual(all_time["vi"], 4)
+        self.assertEqual(
+            ComicReadBucket.objects.get(comic=self.old_hit, language="vi").reads, 4
+        )
+
+    def test_ranking_is_one_query(self):
+        record_reads({(self.old_hit.pk, "en"): 1}, self.now)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ranking("w")[0].title, "Old hit")
+
+    def test_flushed_reads_feed_rankings(self):
+        chapter = create_chapter(self.new_hit)
+        buffer = ReadCounterBuffer(flush_interval=0)
+        buffer.increment(ComicChapter, chapter.pk, 5)
+        buffer.increment(Comic, self.new_hit.pk, 5)
+        buffer.flush()
+        self.assertEqual(self.ranking("w", "en"), [self.new_hit])
+        self.assertEqual(
+            ComicReadBucket.objects.get(comic=self.new_hit, language="en").reads, 5
+        )
+
+
+class ChapterSequenceTests(TestCase):
+    def setUp(self):
+        self.comic = create_comic()
+        create_chapter(self.comic, counter=1)
+        create_chapter(self.comic, counter=2)
+
+    def publish(self, **fields):
+        return publish_chapter(
+            self.comic, title="New", cover="chapter-covers/cover.png", **fields
+        )
+
+    def test_publish_continues_after_existing_chapters(self):
+        chapter = self.publish()
+        self.assertEqual((chapter.chapter_counter, chapter.chapter_number), (3, 3))
+        extra = self.publish(extra_chapter=True)
+        self.assertEqual((extra.chapter_counter, extra.chapter_number), (4, None))
+        chapter = self.publish()
+        self.assertEqual((chapter.chapter_counter, chapter.chapter_number), (5, 4))
+
+    def test_reserved_and_explicit_values_are_not_handed_out_again(self):
+        self.assertEqual(reserve_chapters(self.comic, 2), [(3, 3), (4, 4)])
+        self.assertEqual(
+            reserve_chapters(self.comic, 2, numbered=False), [(5, None), (6, None)]
+        )
+        create_chapter(self.comic, counter=10)
+        chapter = self.publish()
+        self.assertEqual((chapter.chapter_counter, chapter.chapter_number), (11, 11))
+
+    def test_translation_sequences_are_separate(self):
+        translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        chapter = publish_chapter(translation, translated_title="Chuong")
+        self.assertIsInstance(chapter, ComicChapterTranslation)
+        self.assertEqual((chapter.chapter_counter, chapter.chapter_number), (1, 1))
+
+
+class DatabaseConnectionTests(TestCase):
+    def test_pragmas_are_set_on_new_connections(self):
+        path = os.path.join(tempfile.mkdtemp(), "db.sqlite3")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        wrapper = type(connections["default"])(
+            dict(connection.settings_dict, NAME=path), alias="pragma-test"
+        )
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {pragma}")
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(
+            pragmas, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000}
+        )
+
+
+@override_settings(TRANG_TRANH_DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_replica_only_inside_replica_reads(self):
+        self.assertEqual(router.db_for_read(Comic), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Comic), "replica")
+            self.assertEqual(router.db_for_write(Comic), "default")
+        self.assertEqual(router.db_for_read(Comic), "default")
+
+    def test_reads_inside_a_transaction_stay_on_primary(self):
+        with replica_reads(), mock.patch.object(connection, "in_atomic_block", True):
+            self.assertEqual(router.db_for_read(Comic), "default")
+
+    def test_decorator_only_routes_safe_requests(self):
+        view = read_from_replica(lambda request: router.db_for_read(Comic))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get("/")), "replica")
+        self.assertEqual(view(factory.post("/")), "default")
+
+
+@override_settings(
+    TRANG_TRANH_DATABASE_REPLICAS=["replica"], TRANG_TRANH_RENDITIONS_EAGER=False
+)
+class ReplicaDatabaseTests(TransactionTestCase):
+    # Not a TestCase: reads made inside a transaction stay on the primary.
+    databases = {"default", "replica"}
+
+    def test_view_reads_from_replica_and_writes_to_default(self):
+        create_comic("Dragon")
+
+        @read_from_replica
+        def view(request):
+            comic = Comic.objects.get()
+            comic.title = "Phoenix"
+            comic.save()
+            return comic
+
+        def comic_statements(queries):
+            return [
+                q["sql"].split()[0]
+                for q in queries.captured_queries
+                if '"trang_tranh_comic"' in q["sql"]
+            ]
+
+        with CaptureQueriesContext(
+            connections["default"]
+        ) as primary, CaptureQueriesContext(connections["replica"]) as replica:
+            comic = view(RequestFactory().get("/"))
+        self.assertEqual(comic_statements(replica), ["SELECT"])
+        self.assertEqual(comic_statements(primary), ["UPDATE"])
+        self.assertEqual(comic._state.db, "default")
+        self.assertEqual(Comic.objects.get().title, "Phoenix")
+
+
+@override_settings(
+    ROOT_URLCONF="trangtranhdemo.asgi_urls",
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class AsyncViewTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.comic = create_comic("Dragon")
+        self.comic.author.add(ComicAuthor.objects.create(pen_name="Dragonfly"))
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2)]
+        bulk_create_chapter_pages(
+            self.chapters[0], [make_image(f"{i}.png") for i in range(5)]
+        )
+        ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Rong",
+            translated_summary="Tom tat",
+        )
+
+    async def test_reader_streams_pages_in_order(self):
+        url = self.chapters[0].get_absolute_url()
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        html = body.decode()
+        pages = [page async for page in self.chapters[0].chapterpage_set.all()]
+        positions = [html.index(page.page_image.url) for page in pages]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotIn("trang-tranh:pages", html)
+        self.assertIn(self.chapters[1].get_absolute_url(), html)
+        self.assertEqual(len(response.headers["Link"].split(", ")), 4)
+
+        response = await self.async_client.get(
+            url, headers={"if-none-match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            (await sync_to_async(read_counter.pending)())[ComicChapter],
+            {self.chapters[0].pk: 1},
+        )
+        await sync_to_async(read_counter.flush)()
+
+    async def test_comic_detail_is_localized(self):
+        # The test covers have no files, their renditions can not be rendered.
+        with self.assertLogs("trang_tranh.renditions", "WARNING"):
+            response = await self.async_client.get("/vi/comics/%d/" % self.comic.pk)
+        self.assertContains(response, "<h1>Rong</h1>", html=True)
+        self.assertContains(response, "Dragonfly")
+        self.assertContains(response, self.chapters[1].get_absolute_url())
+        response = await self.async_client.get("/en/comics/0/")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(TRANG_TRANH_INSTRUMENTATION_SAMPLE_RATE=1)
+    async def test_queries_are_counted_in_server_timing(self):
+        response = await self.async_client.get(self.chapters[1].get_absolute_url())
+        # The chapter and its first pages; the streamed pages are read later.
+        self.assertIn('desc="2 queries"', response.headers["Server-Timing"])
+        await sync_to_async(read_counter.flush)()
+
+    async def test_catalog_and_unsafe_methods(self):
+        with mock.patch("trang_tranh.renditions.background_pool"):
+            response = await self.async_client.get("/en/")
+        self.assertContains(response, "Dragon")
+        response = await self.async_client.post("/en/")
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(
+    TRANG_TRANH_INSTRUMENTATION_SAMPLE_RATE=0,
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class BenchmarkTests(TemporaryMediaMixin, TestCase):
+    size = DatasetSize(comics=4, authors=3, publishers=2, chapters_per_comic=2)
+
+    def generate(self, seed):
+        with transaction.atomic():
+            counts = generate(self.size, seed=seed)
+            titles = list(Comic.objects.order_by("pk").values_list("title", flat=True))
+            transaction.set_rollback(True)
+        return counts, titles
+
+    def test_dataset_is_deterministic(self):
+        counts, titles = self.generate(seed=1)
+        self.assertEqual(counts["trang_tranh.ChapterPage"], 4 * 2 * 20)
+        self.assertEqual(counts["trang_tranh.ComicTranslation"], 2)
+        self.assertEqual(counts["trang_tranh.ChapterPageTranslation"], 2 * 2 * 20)
+        self.assertEqual(self.generate(seed=1)[1], titles)
+        self.assertNotEqual(self.generate(seed=2)[1], titles)
+
+    def test_suite_records_time_and_queries(self):
+        generate(self.size)
+        results = benchmark_suite.run(["reader", "page-validation"], repeat=1)
+        self.assertEqual(results["reader"]["queries"], 2)
+        self.assertGreater(results["page-validation"]["seconds"], 0)
+        read_counter.flush()
+
+    def test_baseline_covers_every_benchmark_on_the_default_dataset(self):
+        with open(benchmark_suite.BASELINE) as f:
+            baseline = json.load(f)
+        self.assertEqual(set(baseline["benchmarks"]), set(benchmark_suite.BENCHMARKS))
+        self.assertEqual(baseline["dataset"], {**DatasetSize().as_dict(), "seed": 0})
+
+    def test_compare_reports_regressions(self):
+        baseline = {"benchmarks": {"catalog": {"seconds": 0.010, "queries": 3}}}
+        same = {"benchmarks": {"catalog": {"seconds": 0.012, "queries": 3}}}
+        slower = {"benchmarks": {"catalog": {"seconds": 0.020, "queries": 4}}}
+        self.assertEqual(benchmark_suite.compare(same, baseline), [])
+        self.assertEqual(len(benchmark_suite.compare(slower, baseline)), 2)
+
+
+@override_settings(
+    TRANG_TRANH_INSTRUMENTATION_SAMPLE_RATE=1,
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        reset_request_stats()
+        self.addCleanup(reset_request_stats)
+        self.addCleanup(read_counter.flush)
+        self.chapter = create_chapter(create_comic())
+        self.url = self.chapter.get_absolute_url()
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(";")[0], metric)
+            for metric in response.headers["Server-Timing"].split(", ")
+        )
+
+    def test_server_timing_and_statistics(self):
+        metrics = self.server_timing(self.client.get(self.url))
+        self.assertEqual(set(metrics), {"total", "view", "db"})
+        self.assertIn('desc="2 queries"', metrics["db"])
+        self.client.get(self.url)
+        stats = request_statistics()["chapter-reader"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["mean_queries"], 2)
+        self.assertEqual(sum(stats["histogram"].values()), 2)
+
+        out = io.StringIO()
+        call_command("request_stats", stdout=out)
+        self.assertIn("chapter-reader", out.getvalue())
+
+    def test_slowest_statements_and_stats_are_for_staff_only(self):
+        stats_url = reverse("request-stats")
+        self.assertEqual(self.client.get(stats_url).status_code, 302)
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        response = self.client.get(self.url)
+        # The reader does not load the user.
+        self.assertNotIn("sql;dur=", response.headers["Server-Timing"])
+        response = self.client.get(reverse("admin:index"))
+        self.assertIn("sql;dur=", response.headers["Server-Timing"])
+        self.assertIn("chapter-reader", self.client.get(stats_url).json()["views"])
+
+    def test_recording_only_increments_counters(self):
+        stats = RequestStats()
+        stats.finish()
+        record("chapter-reader", stats)
+        with mock.patch("trang_tranh.instrumentation.cache", wraps=cache) as mocked:
+            record("chapter-reader", stats)
+        self.assertEqual(
+            [call[0] for call in mocked.method_calls], ["incr"] * (len(COUNTERS) + 1)
+        )
+        self.assertEqual(request_statistics()["chapter-reader"]["count"], 2)
+
+    @override_settings(TRANG_TRANH_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertEqual(request_statistics(), {})
+
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "trang_tranh.storage.ContentAddressedStorage"},
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    },
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.chapter = create_chapter(create_comic())
+
+    def blob_files(self):
+        root = os.path.join(self.media_root, "blobs")
+        return [
+            name
+            for _dirpath, _dirnames, names in os.walk(root)
+            for name in names
+            if not name.startswith(".")
+        ]
+
+    def test_identical_uploads_share_one_blob(self):
+        page = ChapterPage.objects.create(chapter=self.chapter, page_image=make_image())
+        translation = ChapterPageTranslation.objects.create(
+            chapter_translation=ComicChapterTranslation.objects.create(
+                comic_translation=ComicTranslation.objects.create(
+                    comic=self.chapter.comic,
+                    language="vi",
+                    translated_title="Truyen",
+                    translated_summary="Tom tat",
+                ),
+                translated_title="Chuong 1",
+            ),
+            page_image=make_image("other-name.PNG"),
+        )
+        self.assertRegex(page.page_image.name, r"^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(translation.page_image.name, page.page_image.name)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(MediaBlob.objects.get().references, 2)
+        self.assertEqual(content_hash(page.page_image), MediaBlob.objects.get().digest)
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        pages = bulk_create_chapter_pages(self.chapter, [make_image(), make_image()])
+        name = pages[0].page_image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_pages(self.chapter, [1])
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get().references, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_pages(self.chapter, [1])
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_referenced_blob_is_kept(self):
+        page = ChapterPage.objects.create(chapter=self.chapter, page_image=make_image())
+        # A second row pointing at the name without saving a file.
+        ChapterPage.objects.create(
+            chapter=self.chapter, page_image=page.page_image.name, page_number=2
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            page.delete()
+        self.assertTrue(default_storage.exists(page.page_image.name))
+
+    def test_renditions_keep_their_names(self):
+        page = ChapterPage.objects.create(chapter=self.chapter, page_image=make_image())
+        url = page.rendition_url("page_image", "thumb")
+        self.assertIn("/renditions/", url)
+        self.assertTrue(url.endswith("/thumb.webp"))
+
+    def test_dedupe_media(self):
+        for name in ("page-images/a.png", "page-images/b.png", "chapter-covers/c.png"):
+            os.makedirs(
+                os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True
+            )
+            with open(os.path.join(self.media_root, name), "wb") as f:
+                f.write(make_image().read())
+        ChapterPage.objects.create(chapter=self.chapter, page_image="page-images/a.png")
+        ChapterPage.objects.create(
+            chapter=self.chapter, page_image="page-images/b.png", page_number=2
+        )
+        self.chapter.cover = "chapter-covers/c.png"
+        self.chapter.save()
+
+        out = io.StringIO()
+        call_command("dedupe_media", dry_run=True, stdout=out, stderr=io.StringIO())
+        self.assertIn("Would move 3 files into 1 new blobs", out.getvalue())
+        self.assertEqual(self.blob_files(), [])
+
+        out = io.StringIO()
+        call_command("dedupe_media", stdout=out, stderr=io.StringIO())
+        self.assertIn("Moved 3 files into 1 new blobs", out.getvalue())
+        self.chapter.refresh_from_db()
+        names = set(ChapterPage.objects.values_list("page_image", flat=True)) | {
+            self.chapter.cover.name
+        }
+        self.assertEqual(len(names), 1)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, "page-images/a.png"))
+        )
+        self.assertEqual(MediaBlob.objects.get().references, 3)
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        }
+    )
+    def test_dedupe_media_requires_content_addressed_storage(self):
+        with self.assertRaisesMessage(CommandError, "ContentAddressedStorage"):
+            call_command("dedupe_media")
+
+
+@override_settings(
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class ImageMetadataTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.chapter = create_chapter(create_comic())
+
+    def test_metadata_is_computed_at_upload(self):
+        image = make_image(size=(30, 60))
+        page = ChapterPage.objects.create(chapter=self.chapter, page_image=image)
+        page.refresh_from_db()
+        self.assertEqual((page.page_image_width, page.page_image_height), (30, 60))
+        self.assertEqual(page.page_image_size, image.size)
+        self.assertTrue(page.page_image_placeholder.startswith("data:image/jpeg;"))
+
+        self.chapter.cover = make_image("cover.png", size=(40, 20))
+        self.chapter.save(update_fields=["cover"])
+        self.chapter.refresh_from_db()
+        self.assertEqual(
+            (self.chapter.cover_width, self.chapter.cover_height), (40, 20)
+        )
+
+    def test_bulk_upload_and_reader(self):
+        bulk_create_chapter_pages(
+            self.chapter, [make_image(size=(30, 60)), make_image(size=(20, 10))]
+        )
+        response = self.client.get(self.chapter.get_absolute_url())
+        self.assertContains(response, 'width="30" height="60"')
+        self.assertContains(response, 'width="20" height="10"')
+        self.assertContains(response, "background: url(data:image/jpeg;base64,")
+
+    def test_uploads_are_decoded_in_bounded_chunks(self):
+        sizes = [(30, 60), (20, 10), (10, 40)]
+        with mock.patch("trang_tranh.metadata.PARALLEL_IMAGES", 2), mock.patch(
+            "trang_tranh.metadata.pool_map", wraps=pool_map
+        ) as mocked:
+            pages = bulk_create_chapter_pages(
+                self.chapter, [make_image(size=size) for size in sizes]
+            )
+        self.assertEqual([len(call.args[1]) for call in mocked.call_args_list], [2, 1])
+        self.assertEqual(
+            [(page.page_image_width, page.page_image_height) for page in pages], sizes
+        )
+
+    def test_backfill_command(self):
+        pages = bulk_create_chapter_pages(
+            self.chapter, [make_image(size=(30, 60)), make_image(size=(20, 10))]
+        )
+        ChapterPage.objects.update(page_image_width=None, page_image_placeholder="")
+        self.chapter.cover = default_storage.save(
+            "chapter-covers/cover.png", make_image(size=(40, 20))
+        )
+        ComicChapter.objects.filter(pk=self.chapter.pk).update(cover=self.chapter.cover)
+
+        with self.assertLogs("trang_tranh.metadata", "WARNING"):
+            call_command("backfill_image_metadata", batch_size=1, stdout=io.StringIO())
+        self.assertEqual(
+            list(
+                ChapterPage.objects.order_by("page_number").values_list(
+                    "page_image_width", "page_image_height"
+                )
+            ),
+            [(30, 60), (20, 10)],
+        )
+        self.assertNotEqual(
+            ChapterPage.objects.get(pk=pages[0].pk).page_image_placeholder, ""
+        )
+        self.chapter.refresh_from_db()
+        self.assertEqual(self.chapter.cover_width, 40)
+
+
+@override_settings(
+    TRANG_TRANH_CATALOG_PAGE_SIZE=2,
+    TRANG_TRANH_CHAPTER_LIST_PAGE_SIZE=2,
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class CursorPaginationTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in range(1, 6)]
+        self.paginator = CursorPaginator(
+            ComicChapter.objects.all(), ("chapter_counter",), 2
+        )
+
+    def counters(self, page):
+        return [chapter.chapter_counter for chapter in page]
+
+    def test_pages_follow_the_cursor_without_offset(self):
+        page = self.paginator.page()
+        self.assertEqual(self.counters(page), [1, 2])
+        self.assertFalse(page.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            second = self.paginator.page(page.next_cursor)
+        self.assertNotIn("OFFSET", queries[0]["sql"])
+        self.assertEqual(self.counters(second), [3, 4])
+
+        # A chapter published mid-scroll neither repeats nor skips entries.
+        ComicChapter.objects.filter(chapter_counter=1).delete()
+        create_chapter(self.comic, 6)
+        third = self.paginator.page(second.next_cursor)
+        self.assertEqual(self.counters(third), [5, 6])
+        self.assertFalse(third.has_next())
+
+        previous = self.paginator.page(third.previous_cursor)
+        self.assertEqual(self.counters(previous), [3, 4])
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+        self.assertEqual(
+            self.counters(self.paginator.page(previous.previous_cursor)), [2]
+        )
+
+    def test_mixed_directions(self):
+        paginator = CursorPaginator(
+            ComicChapter.objects.all(), ("-extra_chapter", "chapter_counter"), 2
+        )
+        ComicChapter.objects.filter(chapter_counter__in=[2, 4]).update(
+            extra_chapter=True, chapter_number=None
+        )
+        page, seen = paginator.page(), []
+        while True:
+            seen += self.counters(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, [2, 4, 1, 3, 5])
+
+    def test_tampered_cursors_are_rejected(self):
+        cursor = self.paginator.page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(cursor[:-1] + ("A" if cursor[-1] != "A" else "B"))
+        other = CursorPaginator(ComicChapter.objects.all(), ("-chapter_counter",), 2)
+        with self.assertRaises(InvalidCursor):
+            other.page(cursor)
+        self.assertEqual(self.counters(self.paginator.get_page("garbage")), [1, 2])
+
+    def test_catalog_and_chapter_lists(self):
+        for title, reads in (("Second", 5), ("Third", 1)):
+            create_comic(title, read_count=reads)
+        with self.assertLogs("trang_tranh.renditions", "WARNING"), mock.patch(
+            "trang_tranh.renditions.background_pool"
+        ):
+            response = self.client.get(reverse("catalog"), {"sort": "popular"})
+            self.assertEqual(
+                [comic.title for comic in response.context["comics"]],
+                ["Second", "Third"],
+            )
+            page = response.context["page_obj"]
+            response = self.client.get(
+                reverse("catalog"), {"sort": "popular", "cursor": page.next_cursor}
+            )
+            self.assertEqual(
+                [comic.title for comic in response.context["comics"]], ["Comic"]
+            )
+
+            response = self.client.get(self.comic.get_absolute_url())
+            self.assertEqual(self.counters(response.context["comic"].chapters), [1, 2])
+            self.assertContains(response, 'rel="next"')
+
+        translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        for counter in (1, 2, 3):
+            ComicChapterTranslation.objects.create(
+                comic_translation=translation,
+                chapter_counter=counter,
+                chapter_number=counter,
+                translated_title=f"Chuong {counter}",
+            )
+        response = self.client.get(translation.get_absolute_url())
+        page = response.context["chapters_page"]
+        self.assertEqual(self.counters(page), [1, 2])
+        response = self.client.get(
+            translation.get_absolute_url(), {"cursor": page.next_cursor}
+        )
+        self.assertContains(response, "Chuong 3")
+
+    def test_admin_page_changelist(self):
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        ChapterPage.objects.bulk_create(
+            ChapterPage(chapter=chapter, page_image="page-images/p.png", page_number=1)
+            for chapter in self.chapters
+        )
+        url = reverse("admin:trang_tranh_chapterpage_changelist")
+        with mock.patch.object(admin.ChapterPageAdmin, "list_per_page", 2):
+            response = self.client.get(url)
+            result_list = response.context["cl"].result_list
+            self.assertEqual(
+                [page.chapter_id for page in result_list],
+                [chapter.pk for chapter in self.chapters[:2]],
+            )
+            response = self.client.get(url + response.context["cl"].next_page_query)
+        self.assertEqual(
+            [page.chapter_id for page in response.context["cl"].result_list],
+            [chapter.pk for chapter in self.chapters[2:4]],
+        )
+        self.assertContains(response, "2 chapter pages on this page")
+
+
+@override_settings(TRANG_TRANH_RENDITIONS_EAGER=False, TRANG_TRANH_WORKER_PROCESSES=0)
+class TranslationCoverageTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2, 3)]
+        for chapter in self.chapters[:2]:
+            bulk_create_chapter_pages(chapter, [make_image(), make_image()])
+        self.translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.chapter_translations = [
+            ComicChapterTranslation.objects.create(
+                comic_translation=self.translation,
+                chapter_counter=counter,
+                chapter_number=counter,
+                translated_title=f"Chuong {counter}",
+            )
+            for counter in (1, 2, 7)
+        ]
+        bulk_create_chapter_page_translations(
+            self.chapter_translations[0], [make_image(), make_image()]
+        )
+        bulk_create_chapter_page_translations(
+            self.chapter_translations[1], [make_image()]
+        )
+
+    def test_report_is_computed_in_grouped_queries_and_cached(self):
+        with self.assertNumQueries(3):
+            (report,) = comic_coverage([self.comic.pk])[self.comic.pk]
+        self.assertEqual(report["chapters"], 3)
+        self.assertEqual(report["translated_chapters"], 2)
+        self.assertEqual(report["complete_chapters"], 1)
+        self.assertAlmostEqual(report["completeness"], 1 / 3)
+        self.assertEqual(
+            report["missing"], [{"chapter_counter": 3, "chapter_number": 3}]
+        )
+        self.assertEqual(
+            report["page_mismatches"],
+            [
+                {
+                    "chapter_counter": 2,
+                    "chapter_number": 2,
+                    "pages": 2,
+                    "translated_pages": 1,
+                }
+            ],
+        )
+        self.assertEqual(report["orphans"], [7])
+        with self.assertNumQueries(0):
+            comic_coverage([self.comic.pk])
+
+    def test_page_changes_invalidate_the_comic(self):
+        other = create_comic("Other")
+        comic_coverage()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_create_chapter_page_translations(
+                self.chapter_translations[1], [make_image()]
+            )
+        # Only the changed comic is computed again.
+        with self.assertNumQueries(4):
+            reports = comic_coverage()
+        self.assertEqual(reports[self.comic.pk][0]["complete_chapters"], 2)
+        self.assertEqual(reports[other.pk], [])
+
+    def test_whole_catalog_is_computed_in_batches(self):
+        others = [create_comic(f"Other {i}") for i in range(2)]
+        with mock.patch("trang_tranh.coverage.BATCH_SIZE", 2):
+            # The comic ids, then three queries per batch of two comics.
+            with self.assertNumQueries(7):
+                reports = comic_coverage()
+        self.assertEqual(reports[self.comic.pk][0]["orphans"], [7])
+        self.assertEqual([reports[other.pk] for other in others], [[], []])
+
+    def test_json_endpoint_and_admin_view(self):
+        url = "/en/stats/coverage/"
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_superuser("admin", "", "pw"))
+        response = self.client.get(url, {"comic": self.comic.pk})
+        self.assertEqual(response.json()["translations"][0]["orphans"], [7])
+        response = self.client.get(
+            url, {"comic": self.comic.pk}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {"comic": "x"}).status_code, 400)
+
+        response = self.client.get(
+            reverse("admin:trang_tranh_comictranslation_coverage")
+        )
+        self.assertContains(response, "1 / 3")
+        self.assertContains(response, "2: 1 of 2 pages")
+
+
+@override_settings(TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None)
+class PublisherAnalyticsTests(TestCase):
+    def setUp(self):
+        self.comic = create_comic(title="First")
+        self.publisher = self.comic.publisher
+        self.other = create_comic(title="Second", publisher=self.publisher)
+        self.chapter = create_chapter(self.comic)
+        translation = ComicTranslation.objects.create(
+            comic=self.other,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=translation, translated_title="Chuong 1"
+        )
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+
+    def test_flushed_reads_are_rolled_up_per_publisher_day_comic_and_language(self):
+        buffer = ReadCounterBuffer(flush_interval=0)
+        buffer.increment(ComicChapter, self.chapter.pk, 3)
+        buffer.increment(ComicChapterTranslation, self.chapter_translation.pk, 2)
+        buffer.flush()
+        buffer.increment(ComicChapter, self.chapter.pk, 1)
+        buffer.flush()
+        self.assertEqual(
+            set(
+                PublisherReadBucket.objects.values_list(
+                    "publisher_id", "day", "comic_id", "language", "reads"
+                )
+            ),
+            {
+                (self.publisher.pk, self.today, self.comic.pk, "en", 4),
+                (self.publisher.pk, self.today, self.other.pk, "vi", 2),
+            },
+        )
+        # The rankings are still fed by the same flush.
+        self.assertEqual(
+            ComicReadBucket.objects.get(comic=self.comic, language="en").reads, 4
+        )
+
+    def test_dashboard_reads_a_range_of_buckets(self):
+        key = (self.publisher.pk, self.comic.pk, "en")
+        record_publisher_reads({key: 5}, self.now)
+        record_publisher_reads({key: 7}, self.now - timedelta(days=29))
+        record_publisher_reads({key: 100}, self.now - timedelta(days=30))
+        record_publisher_reads({(self.publisher.pk, self.other.pk, "vi"): 6}, self.now)
+
+        with CaptureQueriesContext(connection) as queries:
+            comics, daily = publisher_reads(self.publisher.pk, 30, self.today)
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn("publisherreadbucket", query["sql"])
+            self.assertNotIn("chapter", query["sql"])
+        self.assertEqual(
+            [(comic["title"], comic["reads"]) for comic in comics],
+            [("First", 12), ("Second", 6)],
+        )
+        self.assertEqual(comics[1]["languages"], {"vi": 6})
+        self.assertEqual(len(daily), 30)
+        self.assertEqual(daily[0], (self.today - timedelta(days=29), 7))
+        self.assertEqual(daily[-1], (self.today, 11))
+
+    def test_dashboard_is_limited_to_staff_and_the_publisher(self):
+        record_publisher_reads({(self.publisher.pk, self.comic.pk, "en"): 5}, self.now)
+        url = f"/en/publishers/{self.publisher.pk}/dashboard/"
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create(username="someone"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.publisher.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "First")
+        self.assertEqual(response.context["total"], 5)
+
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class InlineExecutor:
+    """Executor running the submitted jobs right away, in the calling thread."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@override_settings(
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+@mock.patch("trang_tranh.removal.background_pool", return_value=InlineExecutor())
+class RemovalTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        # The jobs close the connection of their thread, which is the one of
+        # the test here.
+        patcher = mock.patch("trang_tranh.removal.connection")
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2)]
+        self.pages = [
+            page
+            for chapter in self.chapters
+            for page in bulk_create_chapter_pages(
+                chapter, [make_image(), make_image(), make_image()]
+            )
+        ]
+        self.translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=self.translation, translated_title="Chuong 1"
+        )
+        self.translated_pages = bulk_create_chapter_page_translations(
+            self.chapter_translation, [make_image(), make_image()]
+        )
+
+    def exists(self, page):
+        return default_storage.exists(page.page_image.name)
+
+    def test_comic_is_removed_bottom_up_in_batches(self, background_pool):
+        # Another comic holding the same file keeps it.
+        kept = ChapterPage.objects.create(
+            chapter=create_chapter(create_comic(title="Other")),
+            page_image=self.pages[0].page_image.name,
+        )
+        covers = [
+            default_storage.save(f"comic-covers/{field}/removed.png", make_image())
+            for field in ("vertical", "horizontal")
+        ]
+        Comic.objects.filter(pk=self.comic.pk).update(
+            vertical_cover=covers[0], horizontal_cover=covers[1]
+        )
+        self.comic.refresh_from_db()
+        batches = []
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted, futures = remove(
+                self.comic,
+                batch_size=2,
+                progress=lambda model, count: batches.append((model.__name__, count)),
+            )
+
+        self.assertEqual(
+            batches,
+            [
+                ("ChapterPageTranslation", 2),
+                ("ComicChapterTranslation", 1),
+                ("ComicTranslation", 1),
+                ("ChapterPage", 2),
+                ("ChapterPage", 4),
+                ("ChapterPage", 6),
+                ("ComicChapter", 2),
+                ("Comic", 1),
+            ],
+        )
+        self.assertEqual(deleted["trang_tranh.ChapterPage"], 6)
+        self.assertFalse(Comic.objects.filter(pk=self.comic.pk).exists())
+        self.assertFalse(ComicTranslation.objects.filter(comic=self.comic).exists())
+        self.assertFalse(search("Chuong", models=[ComicChapterTranslation]))
+        self.assertEqual(sum(future.result() for future in futures), 12)
+        self.assertFalse(any(default_storage.exists(name) for name in covers))
+        self.assertTrue(self.exists(kept))
+        self.assertFalse(any(self.exists(page) for page in self.pages[1:]))
+        self.assertFalse(any(self.exists(page) for page in self.translated_pages))
+
+    def test_deleted_rows_keep_their_files_outside_of_removals(self, background_pool):
+        page = self.translated_pages[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            page.delete()
+        self.assertTrue(self.exists(page))
+
+    def test_command_removes_a_chapter(self, background_pool):
+        output = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "remove_content",
+                "chapter",
+                str(self.chapters[0].pk),
+                batch_size=2,
+                stdout=output,
+            )
+        self.assertIn("3 chapter pages deleted", output.getvalue())
+        self.assertIn(": 4 rows", output.getvalue())
+        self.assertEqual(
+            list(ComicChapter.objects.filter(comic=self.comic)), [self.chapters[1]]
+        )
+        self.assertFalse(any(self.exists(page) for page in self.pages[:3]))
+        self.assertTrue(all(self.exists(page) for page in self.pages[3:]))
+
+        with self.assertRaises(CommandError):
+            call_command("remove_content", "chapter", "0", stdout=output)
+
+    def test_admin_action_removes_in_the_background(self, background_pool):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "password")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:trang_tranh_comictranslation_changelist"),
+                {
+                    "action": "remove_with_contents",
+                    "_selected_action": [self.translation.pk],
+                },
+                follow=True,
+            )
+        (message,) = response.context["messages"]
+        job_id = str(message).split("/removals/")[1].split("/")[0]
+        self.assertEqual(
+            removal_progress(job_id),
+            {
+                "state": "done",
+                "objects": 1,
+                "removed": 1,
+                "rows": {
+                    "trang_tranh.ChapterPageTranslation": 2,
+                    "trang_tranh.ComicChapterTranslation": 1,
+                    "trang_tranh.ComicTranslation": 1,
+                },
+            },
+        )
+        response = self.client.get(
+            reverse("admin:trang_tranh_comictranslation_removal", args=[job_id])
+        )
+        self.assertEqual(response.json()["state"], "done")
+        self.assertTrue(self.connection.close.called)
+        self.assertTrue(Comic.objects.filter(pk=self.comic.pk).exists())
+        self.assertFalse(any(self.exists(page) for page in self.translated_pages))
+
+
+@override_settings(
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class MediaGarbageCollectionTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        # Files of the other tests outlive their rolled back rows.
+        for entry in os.scandir(self.media_root):
+            shutil.rmtree(entry.path)
+
+    def write(self, name, age=timedelta(days=2), data=b"orphan"):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.age(name, age)
+        return name
+
+    def age(self, name, age):
+        mtime = (timezone.now() - age).timestamp()
+        os.utime(os.path.join(self.media_root, name), (mtime, mtime))
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_orphans_older_than_the_grace_period_are_deleted(self):
+        (page,) = bulk_create_chapter_pages(
+            create_chapter(create_comic()), [make_image()]
+        )
+        self.age(page.page_image.name, timedelta(days=2))
+        orphan = self.write("page-images/replaced.png")
+        cover = self.write("comic-covers/vertical/old.png", data=b"old cover")
+        recent = self.write("page-images/uploading.png", age=timedelta(minutes=5))
+
+        results = collect_garbage(dry_run=True, jobs=1)
+        self.assertEqual(results["page-images"]["orphans"], 1)
+        self.assertEqual(results["page-images"]["recent"], 1)
+        self.assertEqual(results["comic-covers"]["freed"], len(b"old cover"))
+        # The originals are not blobs, so renditions can not be checked.
+        self.assertEqual(results["renditions"]["skipped"], 1)
+        self.assertTrue(self.exists(orphan))
+
+        output = io.StringIO()
+        call_command("gc_media", jobs=1, stdout=output)
+        self.assertIn("Deleted 2 orphaned files, reclaiming 15", output.getvalue())
+        self.assertFalse(self.exists(orphan))
+        self.assertFalse(self.exists(cover))
+        self.assertTrue(self.exists(recent))
+        self.assertTrue(self.exists(page.page_image.name))
+
+    def test_directories_are_checked_in_batches(self):
+        comic = create_comic()
+        chapter = create_chapter(comic)
+        pages = bulk_create_chapter_pages(chapter, [make_image() for _i in range(4)])
+        for page in pages:
+            self.age(page.page_image.name, timedelta(days=2))
+        for i in range(4):
+            self.write(f"page-images/orphan-{i}.png")
+        with CaptureQueriesContext(connection) as queries:
+            results = collect_garbage(batch_size=4, jobs=1)
+        self.assertEqual(results["page-images"]["files"], 8)
+        self.assertEqual(results["page-images"]["orphans"], 4)
+        # One lookup per file field for each of the 2 batches of page
+        # images, instead of one per file.
+        page_lookups = [
+            query
+            for query in queries
+            if "page-images/" in query["sql"] and " IN (" in query["sql"]
+        ]
+        self.assertEqual(len(page_lookups), 2 * 7)
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "trang_tranh.storage.ContentAddressedStorage"},
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        }
+    )
+    def test_blobs_and_renditions_follow_the_blob_table(self):
+        name = default_storage.save("cover.png", make_image())
+        comic = create_comic(
+            vertical_cover=name, horizontal_cover=name, square_cover=name
+        )
+        create_chapter(comic, cover=name)
+        self.age(name, timedelta(days=2))
+        live_digest = blob_digest(name)
+        dead_digest = "f" * 64
+        live = self.write(rendition_name(live_digest, "thumb", "webp"))
+        dead = self.write(rendition_name(dead_digest, "thumb", "webp"))
+        stray_blob = self.write(f"blobs/ff/{dead_digest}.png")
+        upload = self.write("blobs/.upload-1234")
+
+        results = collect_garbage(jobs=1)
+        self.assertEqual(results["renditions"]["orphans"], 1)
+        self.assertEqual(results["blobs"]["orphans"], 2)
+        self.assertTrue(self.exists(name))
+        self.assertTrue(self.exists(live))
+        for orphan in (dead, stray_blob, upload):
+            self.assertFalse(self.exists(orphan))
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "trang_tranh.storage.ContentAddressedStorage"},
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        }
+    )
+    def test_replaced_blobs_are_collected(self):
+        old = default_storage.save("old.png", make_image(color="red"))
+        comic = create_comic(vertical_cover=old)
+        self.age(old, timedelta(days=2))
+        comic.vertical_cover = make_image(color="blue")
+        comic.save()
+        new = comic.vertical_cover.name
+        self.age(new, timedelta(days=2))
+        # Replacing the cover did not release the old blob.
+        self.assertEqual(MediaBlob.objects.get(name=old).references, 1)
+
+        collect_garbage(jobs=1)
+        self.assertFalse(self.exists(old))
+        self.assertFalse(MediaBlob.objects.filter(name=old).exists())
+        self.assertTrue(self.exists(new))
+        self.assertEqual(MediaBlob.objects.get(name=new).references, 1)
+
+
+@override_settings(
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+    TRANG_TRANH_STRIP_WIDTH=16,
+    TRANG_TRANH_STRIP_MAX_HEIGHT=50,
+)
+class ChapterStripTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.comic = create_comic(stitch_pages=True)
+        self.chapter = create_chapter(self.comic)
+        bulk_create_chapter_pages(
+            self.chapter,
+            [
+                make_image(size=(8, 12), color="red"),
+                make_image(size=(8, 12), color="lime"),
+                make_image(size=(8, 4), color="blue"),
+            ],
+        )
+        self.url = f"/en/comics/{self.comic.pk}/chapters/1/"
+
+    def test_plan_keeps_pages_whole(self):
+        self.assertEqual(plan_strips([30, 30, 10, 80, 5], 50), [[0], [1, 2], [3], [4]])
+        self.assertEqual(plan_strips([], 50), [])
+
+    def test_pages_are_stitched_with_their_offsets(self):
+        strip = stitch_chapter(self.chapter)
+        self.assertEqual(
+            [(segment["height"], segment["pages"]) for segment in strip.segments],
+            [(48, [[1, 0, 24], [2, 24, 24]]), (8, [[3, 0, 8]])],
+        )
+        with default_storage.open(strip.segments[0]["name"]) as f:
+            image = Image.open(f)
+            image.load()
+        self.assertEqual(image.size, (16, 48))
+        red, green, _blue = image.convert("RGB").getpixel((8, 36))
+        self.assertGreater(green, 200)
+        self.assertLess(red, 50)
+
+        # The same pages give the same strips, which are not stitched again.
+        with mock.patch("trang_tranh.strips.pool_map") as pool_map:
+            self.assertEqual(stitch_chapter(self.chapter).version, strip.version)
+        pool_map.assert_not_called()
+
+    def test_pages_too_tall_for_webp_are_stitched_as_jpeg(self):
+        chapter = create_chapter(self.comic, 2)
+        bulk_create_chapter_pages(
+            chapter, [make_image(size=(8, 20)), make_image(size=(8, 4))]
+        )
+        with mock.patch.dict("trang_tranh.strips.MAX_HEIGHTS", {"webp": 30}):
+            strip = stitch_chapter(chapter)
+        self.assertEqual(
+            [os.path.splitext(segment["name"])[1] for segment in strip.segments],
+            [".jpg", ".webp"],
+        )
+        with default_storage.open(strip.segments[0]["name"]) as f:
+            with Image.open(f) as image:
+                self.assertEqual((image.format, image.size), ("JPEG", (16, 40)))
+
+    @override_settings(TRANG_TRANH_RENDITIONS_EAGER=True)
+    def test_only_comics_stitching_their_pages_are_scheduled(self):
+        other = create_chapter(create_comic(title="Other"))
+        with mock.patch("trang_tranh.strips.background_pool") as background_pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                touch_chapters(ComicChapter, [self.chapter.pk, other.pk])
+        background_pool().submit.assert_called_once_with(
+            _stitch_in_background, ComicChapter, [self.chapter.pk]
+        )
+
+    def test_reader_serves_strips_once_they_are_up_to_date(self):
+        with mock.patch(
+            "trang_tranh.strips.background_pool", return_value=InlineExecutor()
+        ):
+            # Stale: served page by page while the strips are stitched.
+            response = self.client.get(self.url)
+            self.assertContains(response, 'alt="Page 3"')
+            self.assertNotContains(response, "data-pages")
+
+            response = self.client.get(self.url)
+            self.assertContains(response, 'data-pages="[[1, 0, 24], [2, 24, 24]]"')
+            self.assertNotContains(response, 'alt="Page 3"')
+            self.assertIn("/strips/", response.headers["Link"])
+
+            # Any page change makes them stale again.
+            insert_pages(self.chapter, [make_image()], 1)
+            response = self.client.get(self.url)
+            self.assertContains(response, 'alt="Page 4"')
+
+
+@override_settings(
+    TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL=None,
+    TRANG_TRANH_RENDITIONS_EAGER=False,
+    TRANG_TRANH_WORKER_PROCESSES=0,
+)
+class ChapterManifestTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.comic = create_comic()
+        self.chapters = [create_chapter(self.comic, counter) for counter in (1, 2)]
+        bulk_create_chapter_pages(
+            self.chapters[0], [make_image(size=(8, 12)), make_image(size=(10, 4))]
+        )
+        bulk_create_chapter_pages(self.chapters[1], [make_image()])
+        self.translation = ComicTranslation.objects.create(
+            comic=self.comic,
+            language="vi",
+            translated_title="Truyen",
+            translated_summary="Tom tat",
+        )
+        self.chapter_translation = ComicChapterTranslation.objects.create(
+            comic_translation=self.translation,
+            chapter_counter=1,
+            chapter_number=1,
+            translated_title="Chuong 1",
+        )
+        bulk_create_chapter_page_translations(
+            self.chapter_translation, [make_image(size=(6, 9))]
+        )
+
+    def fresh(self, chapter):
+        return type(chapter).objects.get(pk=chapter.pk)
+
+    def test_manifests_are_built_in_one_query_and_cached(self):
+        chapters = [self.fresh(chapter) for chapter in self.chapters]
+        with self.assertNumQueries(1):
+            manifests = chapter_manifests(ComicChapter, chapters)
+        manifest = manifests[self.chapters[0].pk]
+        self.assertEqual(
+            manifest["columns"], ["page", "url", "width", "height", "size"]
+        )
+        self.assertEqual(
+            [
+                [page, width, height]
+                for page, _url, width, height, _size in manifest["pages"]
+            ],
+            [[1, 8, 12], [2, 10, 4]],
+        )
+        self.assertTrue(manifest["pages"][0][1].startswith("/media/"))
+        self.assertGreater(manifest["pages"][0][4], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(chapter_manifests(ComicChapter, chapters), manifests)
+
+        # A page change gives a new version; the old one is still served.
+        version = manifest["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            insert_pages(self.chapters[0], [make_image()], 1)
+        chapter = self.fresh(self.chapters[0])
+        with self.assertNumQueries(0):
+            (current,) = chapter_manifests(ComicChapter, [chapter]).values()
+        self.assertNotEqual(current["version"], version)
+        self.assertEqual(len(current["pages"]), 3)
+        self.assertEqual(
+            versioned_manifest(ComicChapter, self.chapters[0].pk, version), manifest
+        )
+        cache.clear()
+        self.assertIsNone(
+            versioned_manifest(ComicChapter, self.chapters[0].pk, version)
+        )
+
+    def test_chapter_endpoint_includes_the_next_chapter(self):
+        url = f"/en/comics/{self.comic.pk}/chapters/1/manifest/"
+        response = self.client.get(url)
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        data = response.json()
+        self.assertEqual(data["chapter"]["id"], self.chapters[0].pk)
+        self.assertEqual(len(data["chapter"]["pages"]), 2)
+        self.assertEqual(data["next"]["chapter_counter"], 2)
+        self.assertEqual(len(data["next"]["pages"]), 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(f"/en/comics/{self.comic.pk}/chapters/2/manifest/")
+        self.assertIsNone(response.json()["next"])
+        response = self.client.get(f"/en/comics/{self.comic.pk}/chapters/3/manifest/")
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(
+            f"/en/translations/{self.translation.pk}/chapters/1/manifest/"
+        )
+        chapter = response.json()["chapter"]
+        self.assertEqual(chapter["pages"][0][2:4], [6, 9])
+
+        # The versioned URL is cached for good.
+        response = self.client.get(chapter["url"])
+        self.assertEqual(
+            response.headers["Cache-Control"],
+            "public, max-age=31536000, immutable",
+        )
+        self.assertEqual(response.json()["version"], chapter["version"])
+        response = self.client.get(
+            f"/en/manifests/chapter-translations/{self.chapter_translation.pk}/0/"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_endpoint(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                "/en/manifests/",
+                {
+                    "chapter": [self.chapters[0].pk, self.chapters[1].pk, 999],
+                    "chapter_translation": [self.chapter_translation.pk],
+                },
+            )
+        data = response.json()
+        self.assertEqual(
+            sorted(data["chapters"]),
+            [str(self.chapters[0].pk), str(self.chapters[1].pk)],
+        )
+        self.assertEqual(
+            len(
+                data["chapter_translations"][str(self.chapter_translation.pk)]["pages"]
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.client.get("/en/manifests/", {"chapter": "x"}).status_code, 400
+        )
+        with override_settings(TRANG_TRANH_MANIFEST_BATCH_SIZE=2):
+            response = self.client.get(
+                "/en/manifests/", {"chapter": [1, 2], "chapter_translation": [1]}
+            )
+        self.assertEqual(response.status_code, 400)
@@ -2,5 +2,50 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    
+    path("", views.catalog, name="catalog"),
+    path("search/", views.search_comics, name="search"),
+    path("stats/requests/", views.request_stats, name="request-stats"),
+    path("stats/coverage/", views.translation_coverage, name="translation-coverage"),
+    path(
+        "publishers/<int:pk>/dashboard/",
+        views.publisher_dashboard,
+        name="publisher-dashboard",
+    ),
+    path("comics/<int:pk>/", views.ComicDetailView.as_view(), name="comic-detail"),
+    path(
+        "translations/<int:pk>/",
+        views.ComicTranslationDetailView.as_view(),
+        name="comic-translation-detail",
+    ),
+    path(
+        "comics/<int:pk>/chapters/<int:chapter_counter>/",
+        views.chapter_reader,
+        name="chapter-reader",
+    ),
+    path(
+        "translations/<int:pk>/chapters/<int:chapter_counter>/",
+        views.chapter_translation_reader,
+        name="chapter-translation-reader",
+    ),
+    path(
+        "comics/<int:pk>/chapters/<int:chapter_counter>/manifest/",
+        views.chapter_manifest,
+        name="chapter-manifest",
+    ),
+    path(
+        "translations/<int:pk>/chapters/<int:chapter_counter>/manifest/",
+        views.chapter_translation_manifest,
+        name="chapter-translation-manifest",
+    ),
+    path("manifests/", views.chapter_manifests_batch, name="chapter-manifests"),
+    path(
+        "manifests/chapters/<int:pk>/<slug:version>/",
+        views.chapter_manifest_version,
+        name="chapter-manifest-version",
+    ),
+    path(
+        "manifests/chapter-translations/<int:pk>/<slug:version>/",
+        views.chapter_translation_manifest_version,
+        name="chapter-translation-manifest-version",
+    ),
 ]
@@ -1,3 +1,538 @@
-from django.shortcuts import render
+import json
+from hashlib import sha256
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from django.views.decorators.http import require_safe
+from django.views.generic import DetailView
+
+from . import coverage
+from .analytics import publisher_reads
+from .conf import get_setting
+from .counters import record_chapter_read, record_chapter_translation_read
+from .cursors import CursorPaginator
+from .db import read_from_replica
+from .instrumentation import request_statistics
+from .localization import current_language, localize_comics
+from .manifests import chapter_manifests, versioned_manifest
+from .models import (
+    Comic,
+    ComicChapter,
+    ComicChapterTranslation,
+    ComicTranslation,
+    UserProfile,
+)
+from .rankings import top_comics
+from .search import search
+from .strips import current_strips, reader_strips
 
 # Create your views here.
+
+
+# Catalog orders selected with ``?sort=``, the first one is the default. Each
+# one is unique thanks to the primary key and has its own index.
+CATALOG_ORDERINGS = {
+    "new": ("-published_date", "-pk"),
+    "popular": ("-read_count", "-pk"),
+}
+
+# URL names of the versioned page manifests of each chapter model.
+MANIFEST_URL_NAMES = {
+    ComicChapter: "chapter-manifest-version",
+    ComicChapterTranslation: "chapter-translation-manifest-version",
+}
+
+# Query parameters of the batch manifest request, with their chapter model.
+MANIFEST_PARAMETERS = {
+    "chapter": ComicChapter,
+    "chapter_translation": ComicChapterTranslation,
+}
+
+
+def catalog_paginator(request):
+    """Return the catalog ``CursorPaginator`` and the sort order requested."""
+    sort = request.GET.get("sort")
+    if sort not in CATALOG_ORDERINGS:
+        sort = next(iter(CATALOG_ORDERINGS))
+    paginator = CursorPaginator(
+        Comic.objects.select_related("publisher"),
+        CATALOG_ORDERINGS[sort],
+        get_setting("CATALOG_PAGE_SIZE"),
+    )
+    return paginator, sort
+
+
+def chapter_list_paginator(queryset):
+    # The (comic, chapter_counter) and (comic_translation, chapter_counter)
+    # unique constraints are the indexes of the chapter lists.
+    return CursorPaginator(
+        queryset, ("chapter_counter",), get_setting("CHAPTER_LIST_PAGE_SIZE")
+    )
+
+
+@require_safe
+@read_from_replica
+def catalog(request):
+    """Newest or most read comics, with localized titles and thumbnail covers."""
+    paginator, sort = catalog_paginator(request)
+    page = paginator.get_page(request.GET.get("cursor"))
+    language = current_language()
+    comics = localize_comics(page, language)
+    trending = localize_comics(
+        [trend.comic for trend in top_comics("w", language)], language
+    )
+    return render(
+        request,
+        "trang_tranh/catalog.html",
+        {"page_obj": page, "sort": sort, "comics": comics, "trending": trending},
+    )
+
+
+@method_decorator(read_from_replica, name="dispatch")
+class ComicDetailView(DetailView):
+    """Comic page with its authors, translations and a page of its chapters."""
+
+    queryset = Comic.objects.select_related("publisher").prefetch_related(
+        Prefetch("author", to_attr="authors"),
+        Prefetch("comictranslation_set", to_attr="translations"),
+    )
+
+    def get_object(self, queryset=None):
+        comic = super().get_object(queryset)
+        localize_comics([comic])
+        return comic
+
+    def get_context_data(self, **kwargs):
+        page = chapter_list_paginator(self.object.comicchapter_set.all()).get_page(
+            self.request.GET.get("cursor")
+        )
+        self.object.chapters = page.object_list
+        return super().get_context_data(chapters_page=page, **kwargs)
+
+
+@method_decorator(read_from_replica, name="dispatch")
+class ComicTranslationDetailView(DetailView):
+    """Comic translation page with a page of its translated chapters."""
+
+    queryset = ComicTranslation.objects.select_related("comic")
+    template_name = "trang_tranh/comic_translation_detail.html"
+    context_object_name = "translation"
+
+    def get_context_data(self, **kwargs):
+        page = chapter_list_paginator(
+            self.object.comicchaptertranslation_set.all()
+        ).get_page(self.request.GET.get("cursor"))
+        return super().get_context_data(chapters_page=page, **kwargs)
+
+
+def with_neighbours(queryset, parent_field):
+    """
+    Annotate chapters with the ``previous_counter`` and ``next_counter`` of
+    the adjacent chapters sharing the same ``parent_field``.
+    """
+    siblings = queryset.model._base_manager.filter(
+        **{parent_field: OuterRef(parent_field)}
+    ).values("chapter_counter")
+    return queryset.annotate(
+        previous_counter=Subquery(
+            siblings.filter(chapter_counter__lt=OuterRef("chapter_counter")).order_by(
+                "-chapter_counter"
+            )[:1]
+        ),
+        next_counter=Subquery(
+            siblings.filter(chapter_counter__gt=OuterRef("chapter_counter")).order_by(
+                "chapter_counter"
+            )[:1]
+        ),
+    )
+
+
+@require_safe
+@read_from_replica
+def chapter_reader(request, pk, chapter_counter):
+    """Read a chapter of a comic in its default language."""
+    chapter = get_object_or_404(
+        with_neighbours(
+            ComicChapter.objects.select_related("comic__publisher", "chapterstrip"),
+            "comic",
+        ),
+        comic_id=pk,
+        chapter_counter=chapter_counter,
+    )
+    return _render_reader(
+        request,
+        chapter,
+        comic=chapter.comic,
+        title=chapter.title,
+        pages=chapter.chapterpage_set,
+        parent_pk=pk,
+        url_name="chapter-reader",
+        record_read=record_chapter_read,
+    )
+
+
+@require_safe
+@read_from_replica
+def chapter_translation_reader(request, pk, chapter_counter):
+    """Read a chapter of a comic translation."""
+    chapter = get_object_or_404(
+        with_neighbours(
+            ComicChapterTranslation.objects.select_related(
+                "comic_translation__comic__publisher", "chapterstrip"
+            ),
+            "comic_translation",
+        ),
+        comic_translation_id=pk,
+        chapter_counter=chapter_counter,
+    )
+    return _render_reader(
+        request,
+        chapter,
+        comic=chapter.comic_translation.comic,
+        title=chapter.translated_title,
+        pages=chapter.chapterpagetranslation_set,
+        parent_pk=pk,
+        url_name="chapter-translation-reader",
+        record_read=record_chapter_translation_read,
+    )
+
+
+def chapter_etag(chapter, comic, title, strip=None):
+    """
+    Strong ETag of a rendered chapter, served as pages or as ``strip``.
+
+    ``modified_at`` is bumped whenever a page of the chapter changes, so the
+    tag can be computed from the chapter row alone, before any page is
+    loaded.
+    """
+    parts = [
+        chapter._meta.label,
+        chapter.pk,
+        chapter.modified_at.isoformat(),
+        chapter.previous_counter,
+        chapter.next_counter,
+        comic.title,
+        title,
+        get_language(),
+        strip.version if strip else "",
+    ]
+    return quote_etag(sha256("|".join(map(str, parts)).encode()).hexdigest()[:32])
+
+
+def _render_reader(
+    request, chapter, comic, title, pages, parent_pk, url_name, record_read
+):
+    strip = current_strips(chapter, comic)
+    etag = chapter_etag(chapter, comic, title, strip)
+    last_modified = int(chapter.modified_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # A revalidation (304) is not a new read.
+        if request.method == "GET":
+            record_read(chapter)
+        if strip:
+            strips, pages = reader_strips(strip), []
+            urls = [segment["url"] for segment in strips]
+        else:
+            strips, pages = [], list(pages.order_by("page_number"))
+            urls = [page.page_image.url for page in pages]
+        previous_url, next_url = neighbour_urls(chapter, url_name, parent_pk)
+        response = render(
+            request,
+            "trang_tranh/chapter_reader.html",
+            {
+                "comic": comic,
+                "chapter": chapter,
+                "title": title,
+                "pages": pages,
+                "strips": strips,
+                "previous_url": previous_url,
+                "next_url": next_url,
+            },
+        )
+        links = preload_links(urls, next_url)
+        if links:
+            response.headers["Link"] = links
+
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    # Let clients keep the page but revalidate it, which is a cheap 304.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def neighbour_urls(chapter, url_name, parent_pk):
+    """URLs of the previous and next chapters, ``None`` when there are none."""
+    return [
+        (
+            None
+            if counter is None
+            else reverse(url_name, kwargs={"pk": parent_pk, "chapter_counter": counter})
+        )
+        for counter in (chapter.previous_counter, chapter.next_counter)
+    ]
+
+
+def preload_links(urls, next_url=None):
+    """
+    ``Link`` header value preloading the first images ``urls`` of a chapter
+    and the next chapter.
+    """
+    links = [
+        f"<{url}>; rel=preload; as=image"
+        for url in urls[: get_setting("READER_PRELOAD_PAGES")]
+    ]
+    if next_url:
+        links.append(f"<{next_url}>; rel=prefetch")
+    return ", ".join(links)
+
+
+@require_safe
+@read_from_replica
+def chapter_manifest(request, pk, chapter_counter):
+    """Page manifests of a chapter of a comic and of the next chapter."""
+    return _manifest_response(request, ComicChapter, "comic", pk, chapter_counter)
+
+
+@require_safe
+@read_from_replica
+def chapter_translation_manifest(request, pk, chapter_counter):
+    """Page manifests of a chapter of a comic translation and of the next one."""
+    return _manifest_response(
+        request, ComicChapterTranslation, "comic_translation", pk, chapter_counter
+    )
+
+
+def _manifest_entry(model, chapter, manifest):
+    return {
+        "id": chapter.pk,
+        "chapter_counter": chapter.chapter_counter,
+        "url": reverse(
+            MANIFEST_URL_NAMES[model],
+            kwargs={"pk": chapter.pk, "version": manifest["version"]},
+        ),
+        **manifest,
+    }
+
+
+def _manifests_json(request, data, versions):
+    """
+    JSON response of ``data``, made of the manifests ``versions``, that
+    clients revalidate with a cheap 304.
+    """
+    etag = quote_etag(
+        sha256("|".join([get_language(), *versions]).encode()).hexdigest()[:32]
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(data)
+    response.headers["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _manifest_response(request, model, parent_field, parent_pk, chapter_counter):
+    # The chapter and the next one, in one query.
+    chapters = list(
+        model.objects.filter(
+            **{parent_field: parent_pk, "chapter_counter__gte": chapter_counter}
+        )
+        .only("chapter_counter", "modified_at")
+        .order_by("chapter_counter")[:2]
+    )
+    if not chapters or chapters[0].chapter_counter != chapter_counter:
+        raise Http404("No chapter matches the given query.")
+    manifests = chapter_manifests(model, chapters)
+    entries = [
+        _manifest_entry(model, chapter, manifests[chapter.pk]) for chapter in chapters
+    ]
+    return _manifests_json(
+        request,
+        {"chapter": entries[0], "next": entries[1] if len(entries) > 1 else None},
+        [entry["version"] for entry in entries],
+    )
+
+
+@require_safe
+@read_from_replica
+def chapter_manifests_batch(request):
+    """
+    Page manifests of the chapters ``?chapter=`` and translated chapters
+    ``?chapter_translation=``, up to ``MANIFEST_BATCH_SIZE`` in all.
+    Unknown IDs are left out.
+    """
+    try:
+        requested = {
+            model: [int(pk) for pk in request.GET.getlist(parameter)]
+            for parameter, model in MANIFEST_PARAMETERS.items()
+        }
+    except ValueError:
+        return JsonResponse({"error": "Invalid chapter ID"}, status=400)
+    count = sum(len(pks) for pks in requested.values())
+    if count > get_setting("MANIFEST_BATCH_SIZE"):
+        return JsonResponse(
+            {
+                "error": "Too many chapters, at most %d"
+                % get_setting("MANIFEST_BATCH_SIZE")
+            },
+            status=400,
+        )
+    data, versions = {}, []
+    for parameter, model in MANIFEST_PARAMETERS.items():
+        chapters = []
+        if requested[model]:
+            chapters = (
+                model.objects.filter(pk__in=requested[model])
+                .only("chapter_counter", "modified_at")
+                .order_by("pk")
+            )
+        manifests = chapter_manifests(model, chapters)
+        data[parameter + "s"] = {
+            chapter.pk: _manifest_entry(model, chapter, manifests[chapter.pk])
+            for chapter in chapters
+        }
+        versions.extend(
+            f"{parameter}:{chapter.pk}:{manifests[chapter.pk]['version']}"
+            for chapter in chapters
+        )
+    return _manifests_json(request, data, versions)
+
+
+@require_safe
+@read_from_replica
+def chapter_manifest_version(request, pk, version):
+    """Version ``version`` of the page manifest of a chapter, cached forever."""
+    return _versioned_manifest_response(request, ComicChapter, pk, version)
+
+
+@require_safe
+@read_from_replica
+def chapter_translation_manifest_version(request, pk, version):
+    """Version ``version`` of the page manifest of a translated chapter."""
+    return _versioned_manifest_response(request, ComicChapterTranslation, pk, version)
+
+
+def _versioned_manifest_response(request, model, pk, version):
+    manifest = versioned_manifest(model, pk, version)
+    if manifest is None:
+        raise Http404("No such manifest version.")
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(manifest)
+    response.headers["ETag"] = etag
+    # A version never changes: clients and proxies keep it without asking.
+    patch_cache_control(
+        response, public=True, max_age=365 * 24 * 60 * 60, immutable=True
+    )
+    return response
+
+
+@require_safe
+def search_comics(request):
+    """
+    Ranked full-text search over comics, translations, chapters and authors,
+    preferring results in the active language.
+    """
+    query = request.GET.get("q", "")
+    try:
+        limit = min(int(request.GET.get("limit", 20)), 100)
+    except ValueError:
+        limit = 20
+    results = search(query, language=current_language(), limit=max(limit, 1))
+
+    # Chapter URLs need the chapter counter, fetched in one query per model.
+    chapters = {
+        model: model._base_manager.in_bulk(
+            [result.object_id for result in results if result.model is model]
+        )
+        for model in (ComicChapter, ComicChapterTranslation)
+    }
+
+    def url(result):
+        if result.model in chapters:
+            chapter = chapters[result.model].get(result.object_id)
+            return chapter.get_absolute_url() if chapter else None
+        if result.comic_id is not None:
+            return reverse("comic-detail", kwargs={"pk": result.comic_id})
+        return None
+
+    return JsonResponse(
+        {
+            "query": query,
+            "results": [
+                {
+                    "type": result.model._meta.model_name,
+                    "id": result.object_id,
+                    "comic_id": result.comic_id,
+                    "language": result.language,
+                    "title": result.title,
+                    "url": url(result),
+                    "score": result.score,
+                }
+                for result in results
+            ],
+        }
+    )
+
+
+@staff_member_required
+@require_safe
+def request_stats(request):
+    """Aggregated timings and query counts of the sampled requests per view."""
+    return JsonResponse({"views": request_statistics()})
+
+
+@staff_member_required
+@require_safe
+def translation_coverage(request):
+    """
+    Coverage of every comic translation, or of the comics given with
+    ``?comic=``, with an ETag so that pollers mostly get a 304.
+    """
+    try:
+        comic_ids = [int(pk) for pk in request.GET.getlist("comic")] or None
+    except ValueError:
+        return JsonResponse({"error": "Invalid comic ID"}, status=400)
+    data = json.dumps({"translations": coverage.translation_coverage(comic_ids)})
+    etag = quote_etag(sha256(data.encode()).hexdigest()[:32])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(data, content_type="application/json")
+    response.headers["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@require_safe
+def publisher_dashboard(request, pk):
+    """
+    Reads per comic of a publisher over the last ``PUBLISHER_DASHBOARD_DAYS``
+    days, for staff and the publisher's own user. Only the daily read
+    buckets are read, never the chapter tables.
+    """
+    publisher = get_object_or_404(UserProfile.objects.only("name", "user"), pk=pk)
+    if not request.user.is_staff and publisher.user_id != request.user.pk:
+        raise PermissionDenied
+    days = get_setting("PUBLISHER_DASHBOARD_DAYS")
+    comics, daily = publisher_reads(publisher.pk, days)
+    context = {
+        "publisher": publisher,
+        "days": days,
+        "comics": comics,
+        "daily": daily,
+        "total": sum(reads for _day, reads in daily),
+    }
+    response = render(request, "trang_tranh/publisher_dashboard.html", context)
+    patch_cache_control(response, private=True)
+    return response
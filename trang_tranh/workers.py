@@ -0,0 +1,64 @@
+"""
+Shared worker pools.
+
+CPU-bound image work (decoding, resizing, encoding) runs in a process pool so
+it does not hold the GIL of the web worker. Fire-and-forget jobs that must not
+block a request run in a small thread pool.
+"""
+
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .conf import get_setting
+
+_lock = threading.Lock()
+_process_pool = None
+_background_pool = None
+
+
+def process_pool():
+    """
+    Return the shared process pool, or ``None`` when
+    ``TRANG_TRANH_WORKER_PROCESSES`` is ``0`` and work should run inline.
+    """
+    global _process_pool
+    workers = get_setting("WORKER_PROCESSES")
+    if workers == 0:
+        return None
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+        return _process_pool
+
+
+def pool_map(fn, *iterables):
+    """Like ``map()``, but spread over the process pool when there is one."""
+    pool = process_pool()
+    if pool is None:
+        return list(map(fn, *iterables))
+    return list(pool.map(fn, *iterables))
+
+
+def background_pool():
+    """Return the shared thread pool for jobs that run outside the request."""
+    global _background_pool
+    with _lock:
+        if _background_pool is None:
+            _background_pool = ThreadPoolExecutor(
+                max_workers=get_setting("BACKGROUND_THREADS"),
+                thread_name_prefix="trang-tranh",
+            )
+        return _background_pool
+
+
+@atexit.register
+def shutdown():
+    global _process_pool, _background_pool
+    with _lock:
+        if _background_pool is not None:
+            _background_pool.shutdown(wait=True)
+            _background_pool = None
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True)
+            _process_pool = None
@@ -3,14 +3,30 @@ ASGI config for trangtranhdemo project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+ASGI requests are resolved with ``trangtranhdemo.asgi_urls``, which serves
+the async versions of the catalog, comic and reader views.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trangtranhdemo.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'trangtranhdemo.asgi_urls'
+
+
+class AsyncViewsASGIHandler(ASGIHandler):
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+
+django.setup(set_prefix=False)
+application = AsyncViewsASGIHandler()
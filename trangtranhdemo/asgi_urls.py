@@ -0,0 +1,7 @@
+"""
+URL configuration of ASGI requests: the project URLs with the async views of
+``trang_tranh.async_urls`` (see ``asgi.py``).
+"""
+from .urls import project_urlpatterns
+
+urlpatterns = project_urlpatterns('trang_tranh.async_urls')
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trang_tranh.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "django.middleware.locale.LocaleMiddleware",
@@ -80,9 +81,24 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Keep connections open between requests, checking them before reuse.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # A read-only replica, used once listed in TRANG_TRANH_DATABASE_REPLICAS
+    # below. Locally, a second connection to the same file stands in for one.
+    # Tests mirror the default test database.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['trang_tranh.db.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,6 +145,15 @@ MEDIA_URL = 'media/'
 
 MEDIA_ROOT = 'media/'
 
+# Store each distinct uploaded file once, under its content hash. Run
+# `manage.py dedupe_media` after switching to move the existing files.
+# STORAGES = {
+#     'default': {'BACKEND': 'trang_tranh.storage.ContentAddressedStorage'},
+#     'staticfiles': {
+#         'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+#     },
+# }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -136,4 +161,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Substituting a custom User model
 # https://docs.djangoproject.com/en/4.2/topics/auth/customizing/#substituting-a-custom-user-model
-AUTH_USER_MODEL = 'trang_tranh.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'trang_tranh.User'
+
+# Buffered read counters
+# read_count increments are collected in memory and written in bulk every
+# TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL seconds (None disables the flush thread).
+TRANG_TRANH_READ_COUNT_FLUSH_INTERVAL = 5
+
+# Read replicas
+# GET and HEAD requests of the catalog, comic and reader views read from one
+# of these database aliases, writes always go to 'default'.
+# TRANG_TRANH_DATABASE_REPLICAS = ['replica']
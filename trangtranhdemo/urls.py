@@ -20,14 +20,24 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path("i18n/", include("django.conf.urls.i18n")),
-]
+from trang_tranh.media import serve_media
 
-urlpatterns += i18n_patterns(
-    path('', include('trang_tranh.urls'))
-)
 
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+def project_urlpatterns(app_urlconf):
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+        path("i18n/", include("django.conf.urls.i18n")),
+    ]
+
+    urlpatterns += i18n_patterns(
+        path('', include(app_urlconf))
+    )
+
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    urlpatterns += [
+        path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", serve_media, name="media"),
+    ]
+    return urlpatterns
+
+
+urlpatterns = project_urlpatterns('trang_tranh.urls')